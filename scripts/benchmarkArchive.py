@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+
+from benchmarkModule import timeFunction, printStats
+from csvModule import columnarLogger
+from landmarkArchiveModule import landmarkArchive
+
+
+def generateLogs(directory, hours, rate, rng):
+    # Holistic and reid streams as logged by the nodes (without the face mesh, which only changes the disk size)
+    logger = columnarLogger(directory, chunkRows=1024, maxPendingChunks=64)
+    logger.addStream("holistic", [("pose_world", "float32", (33, 4)),
+                                  ("left_arm_length", "float32", ()),
+                                  ("right_arm_length", "float32", ()),
+                                  ("pointing_direction", "U32", ())])
+    logger.addStream("reid", [("id", "U32", ()),
+                              ("gender", "U16", ()),
+                              ("age_range", "U16", ()),
+                              ("box", "int32", (4,))])
+
+    frames = int(hours * 3600 * rate)
+    ids = ["H%d" % i for i in range(50)]
+    directions = ["left", "right"] + [None] * 8
+    for i in range(frames):
+        stamp = i / rate
+        logger.log("holistic", stamp,
+                   pose_world=rng.random((33, 4)) if i % 4 else None,
+                   left_arm_length=rng.uniform(0.3, 0.8),
+                   right_arm_length=rng.uniform(0.3, 0.8),
+                   pointing_direction=directions[i % len(directions)])
+        logger.log("reid", stamp, id=ids[rng.integers(len(ids))], gender="Male", age_range="(25-32)", box=(0, 10, 10, 0))
+    logger.close()
+    return frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Landmark archive benchmark: index build and queries over synthetic logs")
+    parser.add_argument("--hours", type=float, default=24.0, help="hours of logs at --rate frames per second")
+    parser.add_argument("--rate", type=float, default=10.0)
+    parser.add_argument("--directory", help="existing or new log directory (a temporary one is used and removed otherwise)")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    directory = args.directory or tempfile.mkdtemp(prefix="archive_")
+    try:
+        if not os.path.isdir(os.path.join(directory, "holistic")):
+            t = time.perf_counter()
+            frames = generateLogs(directory, args.hours, args.rate, np.random.default_rng(0))
+            print("%d frames logged in %.1f s" % (frames, time.perf_counter() - t))
+
+        t = time.perf_counter()
+        archive = landmarkArchive(directory)
+        print("Index build (first open)                 %.3f s" % (time.perf_counter() - t))
+        t = time.perf_counter()
+        archive = landmarkArchive(directory)
+        print("Open with saved indexes                  %.3f s" % (time.perf_counter() - t))
+
+        end = archive.rows("holistic") / args.rate
+        queries = {
+            "identity H3": lambda: archive.select("reid", {"id": "H3"}),
+            "identity H3, last hour": lambda: archive.select("reid", {"id": "H3"}, start=end - 3600),
+            "pointing left, arm > 0.7": lambda: archive.select("holistic", {"pointing_direction": "left"}, {"left_arm_length": (0.7, None)}),
+            "arm > 0.79 (no index)": lambda: archive.select("holistic", ranges={"left_arm_length": (0.79, None)}),
+            "pointing left + pose rows": lambda: archive.get("holistic", archive.select("holistic", {"pointing_direction": "left"}, start=end - 3600), ["stamp", "pose_world"]),
+            "10 min of pose (views)": lambda: archive.slices("holistic", "pose_world", end / 2, end / 2 + 600),
+        }
+        for name, query in queries.items():
+            printStats(name, timeFunction(query, repeat=args.repeat, warmup=1))
+    finally:
+        if args.directory is None:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
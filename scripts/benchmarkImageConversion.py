@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+import argparse
+import cv2
+import numpy as np
+from types import SimpleNamespace
+
+from benchmarkModule import timeFunction, printStats
+from imageConversionModule import imageDecoder
+
+
+def rawMsg(img, encoding):
+    # Same fields as sensor_msgs/Image, so the benchmark runs without ROS
+    h, w = img.shape[:2]
+    return SimpleNamespace(height=h, width=w, encoding=encoding, is_bigendian=0, step=img.strides[0], data=img.tobytes())
+
+
+def compressedMsg(img, fmt):
+    ok, buf = cv2.imencode('.' + fmt, img)
+    return SimpleNamespace(format=fmt, data=buf.tobytes())
+
+
+def syntheticFrame(width, height):
+    # Smooth gradients plus noise, closer to a camera frame than pure noise (which does not compress)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    rng = np.random.default_rng(0)
+    frame = np.stack([x + 0 * y, y + 0 * x, (x + y) / 2], axis=2) + rng.normal(0, 8, (height, width, 3))
+    return np.clip(frame, 0, 255).astype(np.uint8)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Image conversion benchmark (imageDecoder vs cv_bridge) for the common camera encodings")
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--repeat", type=int, default=100)
+    args = parser.parse_args()
+
+    frame = syntheticFrame(args.width, args.height)
+    msgs = [
+        ("bgr8", rawMsg(frame, "bgr8")),
+        ("rgb8", rawMsg(frame[:, :, ::-1].copy(), "rgb8")),
+        ("bgra8", rawMsg(cv2.cvtColor(frame, cv2.COLOR_BGR2BGRA), "bgra8")),
+        ("mono8", rawMsg(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), "mono8")),
+        ("jpeg", compressedMsg(frame, "jpg")),
+        ("png", compressedMsg(frame, "png")),
+    ]
+
+    try:
+        from cv_bridge import CvBridge
+        from sensor_msgs.msg import Image, CompressedImage
+        bridge = CvBridge()
+    except ImportError:
+        bridge = None
+        print("cv_bridge not available, only imageDecoder is timed")
+
+    decoder = imageDecoder()
+    writableDecoder = imageDecoder(writable=True)
+    for name, msg in msgs:
+        for scale in (1, 2, 4):
+            printStats("imageDecoder %s 1/%d" % (name, scale), timeFunction(lambda: decoder.decode(msg, scale), repeat=args.repeat))
+        printStats("imageDecoder %s writable" % name, timeFunction(lambda: writableDecoder.decode(msg), repeat=args.repeat))
+
+        if bridge is not None:
+            if hasattr(msg, 'format'):
+                rosMsg = CompressedImage(format=msg.format, data=msg.data)
+                fn = lambda: bridge.compressed_imgmsg_to_cv2(rosMsg, "bgr8")
+            else:
+                rosMsg = Image(height=msg.height, width=msg.width, encoding=msg.encoding, is_bigendian=0, step=msg.step, data=msg.data)
+                fn = lambda: bridge.imgmsg_to_cv2(rosMsg, "bgr8")
+            printStats("cv_bridge %s" % name, timeFunction(fn, repeat=args.repeat))
+
+
+if __name__ == '__main__':
+    main()
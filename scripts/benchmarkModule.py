@@ -0,0 +1,139 @@
+import datetime
+import json
+import os
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+
+def timeFunction(fn, repeat = 100, warmup = 3):
+    # Wall-clock latency of fn() in milliseconds
+    for _ in range(warmup):
+        fn()
+
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    return latencyStats(latencies)
+
+
+def timeStage(fn, inputs, warmup = 3):
+    # Wall-clock latency of fn(x) in milliseconds for each input, in order (stateful stages see a real sequence)
+    for x in inputs[:warmup]:
+        fn(x)
+
+    latencies = []
+    for x in inputs:
+        start = time.perf_counter()
+        fn(x)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    return latencyStats(latencies)
+
+
+def allocationStats(fn, inputs):
+    """
+    It measures the Python heap allocations (NumPy arrays included, native OpenCV buffers are not traced) of fn(x) for each input.
+
+    :return stats: (dict) Mean and max transient peak per call, and the memory still allocated after all the calls.
+    """
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        peaks = []
+        for x in inputs:
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            fn(x)
+            peaks.append(tracemalloc.get_traced_memory()[1] - current)
+        retained = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'alloc_peak_mean_bytes': float(np.mean(peaks)) if peaks != [] else 0.0,
+        'alloc_peak_max_bytes': int(max(peaks)) if peaks != [] else 0,
+        'alloc_retained_bytes': int(retained),
+    }
+
+
+def memoryStats():
+    # Resident set size high-water mark of the process, and current RSS when /proc is available
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    stats = {'rss_peak_bytes': int(maxrss if sys.platform == 'darwin' else maxrss * 1024)}
+    try:
+        with open('/proc/self/statm') as f:
+            stats['rss_current_bytes'] = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        pass
+    return stats
+
+
+def runInfo(args = None):
+    # Context of a run, saved with the results so runs on different machines or versions are not mixed up
+    import cv2
+    info = {
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'host': platform.node(),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpus': os.cpu_count(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'opencv_threads': cv2.getNumThreads(),
+    }
+    if args is not None:
+        info['args'] = vars(args)
+    return info
+
+
+def saveResults(fileName, results):
+    with open(fileName, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def loadResults(fileName):
+    with open(fileName, 'r') as f:
+        return json.load(f)
+
+
+def latencyStats(latencies):
+    latencies = np.asarray(latencies, dtype=np.float64)
+    if latencies.size == 0:
+        return {'n': 0}
+
+    return {
+        'n': int(latencies.size),
+        'mean_ms': float(np.mean(latencies)),
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p90_ms': float(np.percentile(latencies, 90)),
+        'p99_ms': float(np.percentile(latencies, 99)),
+        'max_ms': float(np.max(latencies)),
+        'throughput_hz': float(1000.0 / np.mean(latencies)) if np.mean(latencies) > 0 else float('inf'),
+    }
+
+
+def printStats(name, stats):
+    if stats.get('n', 0) == 0:
+        print("%-40s no samples" % name)
+        return
+
+    print("%-40s n=%-5d mean=%9.3f ms  p50=%9.3f ms  p90=%9.3f ms  p99=%9.3f ms  (%.1f Hz)" % (
+        name, stats['n'], stats['mean_ms'], stats['p50_ms'], stats['p90_ms'], stats['p99_ms'], stats['throughput_hz']))
+
+
+def printMemory(name, stats):
+    fields = []
+    if 'alloc_peak_mean_bytes' in stats:
+        fields.append("alloc/call mean=%.2f MB max=%.2f MB  retained=%.2f MB" % (
+            stats['alloc_peak_mean_bytes'] / 1e6, stats['alloc_peak_max_bytes'] / 1e6, stats['alloc_retained_bytes'] / 1e6))
+    if 'rss_peak_bytes' in stats:
+        fields.append("peak RSS=%.1f MB" % (stats['rss_peak_bytes'] / 1e6))
+    print("%-40s %s" % (name, "  ".join(fields)))
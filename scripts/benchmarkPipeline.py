@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import cv2
+import numpy as np
+
+from benchmarkModule import timeStage, allocationStats, memoryStats, runInfo, saveResults, loadResults, printStats, printMemory
+from pointingModule import pointingLine, resolvePointingTarget
+from captureModule import readCapture, indexName
+from motionGateModule import motionGate
+
+
+imageExtensions = ('.png', '.jpg', '.jpeg', '.bmp', '.webp', '.tif', '.tiff')
+
+
+class stageSkipped(Exception):
+    pass
+
+
+def loadFrames(source, maxFrames, scale = 1.0):
+    """
+    It reads the frames of a capture of readCameraImgAndSave.py (image files or tar shards), of an image directory or of a video file.
+    The frames are decoded before the stages are timed.
+
+    :return frames: (list) BGR frames, in capture, file name or video order.
+    """
+    frames = []
+    if os.path.isfile(os.path.join(source, indexName)):
+        frames = [img for name, stamp, img in readCapture(source, maxFrames)]
+    elif os.path.isdir(source):
+        files = sorted(f for f in os.listdir(source) if f.lower().endswith(imageExtensions))
+        for f in files[:maxFrames]:
+            img = cv2.imread(os.path.join(source, f), cv2.IMREAD_COLOR)
+            if img is not None:
+                frames.append(img)
+    else:
+        capture = cv2.VideoCapture(source)
+        while len(frames) < maxFrames:
+            ok, img = capture.read()
+            if not ok:
+                break
+            frames.append(img)
+        capture.release()
+
+    if scale != 1.0:
+        frames = [cv2.resize(f, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) for f in frames]
+    return frames
+
+
+def holisticStage(args, frames):
+    try:
+        from holisticDetectorModule import holisticDetector
+    except ImportError as e:
+        raise stageSkipped(str(e))
+
+    detector = holisticDetector()
+
+    # Same calls as the mediapipe holistic node for each frame, without drawing
+    def run(frame):
+        img = detector.find(frame, False, False, False, False)
+        detector.getPoseWorldLandmarks()
+        detector.getPoseImgLandmarks(img)
+        detector.getRightHandLandmarks(img)
+        detector.getLeftHandLandmarks(img)
+        detector.getFaceLandmarks(img)
+        detector.getPointingArm()
+
+    return run
+
+
+def faceRecognitionStage(args, frames):
+    try:
+        from facerecModule import faceRecognition
+    except ImportError as e:
+        raise stageSkipped(str(e))
+
+    # The faces of the first frame are the known identities, so the matching step is also timed
+    locations, names, encodings = faceRecognition(frames[0], [], [], return_encodings=True)
+    knownNames = ["H" + str(i) for i in range(len(encodings))]
+
+    def run(frame):
+        faceRecognition(frame, encodings, knownNames, return_encodings=True)
+
+    return run
+
+
+def reidAttributesStage(args, frames):
+    # Age and gender networks of the reid node, on a face sized crop of each frame
+    files = [os.path.join(args.models, f) for f in ("age_net.caffemodel", "age_deploy.prototxt", "gender_net.caffemodel", "gender_deploy.prototxt")]
+    missing = [f for f in files if not os.path.isfile(f)]
+    if missing != []:
+        raise stageSkipped("missing " + ", ".join(missing))
+
+    ageNet = cv2.dnn.readNet(files[0], files[1])
+    genderNet = cv2.dnn.readNet(files[2], files[3])
+    meanValues = (78.4263377603, 87.7689143744, 114.895847746)
+
+    def run(frame):
+        h, w = frame.shape[:2]
+        size = min(h, w) // 2
+        face = frame[(h - size) // 2:(h + size) // 2, (w - size) // 2:(w + size) // 2]
+        blob = cv2.dnn.blobFromImage(face, 1.0, (227, 227), meanValues, swapRB=False)
+        genderNet.setInput(blob)
+        genderNet.forward()
+        ageNet.setInput(blob)
+        ageNet.forward()
+
+    return run
+
+
+def pointingStage(args, frames):
+    # The resolver does not look at the pixels, each frame gets its own synthetic boxes and pointing line
+    rng = np.random.default_rng(0)
+    h, w = frames[0].shape[:2]
+    inputs = {}
+
+    def run(frame):
+        key = id(frame)
+        if key not in inputs:
+            x = rng.uniform(0, w - 50, args.boxes)
+            y = rng.uniform(0, h - 50, args.boxes)
+            boxes = np.stack([x, y, np.minimum(x + rng.uniform(10, 200, args.boxes), w), np.minimum(y + rng.uniform(10, 200, args.boxes), h)], axis=1)
+            inputs[key] = (boxes, rng.uniform(-1, 1), rng.uniform(0, h))
+        boxes, slope, intercept = inputs[key]
+        origin, direction, length = pointingLine(slope, intercept, width=w)
+        resolvePointingTarget(boxes, origin, direction, 0, length)
+
+    return run
+
+
+def colorStage(args, frames):
+    try:
+        from holisticDetectorModule import holisticDetector
+    except ImportError as e:
+        raise stageSkipped(str(e))
+    if not os.path.isfile(os.path.join(args.pkg_path, "files", "basic_colors_simplified.csv")):
+        raise stageSkipped("color table not found in " + args.pkg_path)
+
+    # Color name of the mean color of the frame center, as done for the sweater color
+    def run(frame):
+        h, w = frame.shape[:2]
+        b, g, r = [int(c) for c in frame[h // 2 - 20:h // 2 + 20, w // 2 - 20:w // 2 + 20].reshape(-1, 3).mean(axis=0)]
+        holisticDetector.getColorName(None, args.pkg_path, r, g, b)
+
+    return run
+
+
+def motionGateStage(args, frames):
+    # Scene change test run by the nodes before the inference, with their default thresholds
+    gate = motionGate(4.0, 12.0, maxInterval=1.0)
+    clock = iter(range(10**9))
+
+    def run(frame):
+        # Frames 0.1 s apart, as received by the nodes at 10 Hz
+        gate.check(frame, next(clock) * 0.1)
+
+    return run
+
+
+stages = {
+    'holistic': holisticStage,
+    'face_recognition': faceRecognitionStage,
+    'reid_attributes': reidAttributesStage,
+    'pointing': pointingStage,
+    'color': colorStage,
+    'motion_gate': motionGateStage,
+}
+
+
+def printComparison(previous, results):
+    print("\nComparison with " + previous['run']['date'] + " (p50, negative is faster):")
+    for name, stage in results['stages'].items():
+        old = previous['stages'].get(name, {})
+        if 'p50_ms' not in stage or 'p50_ms' not in old:
+            continue
+        change = (stage['p50_ms'] - old['p50_ms']) / old['p50_ms'] * 100 if old['p50_ms'] > 0 else 0.0
+        print("%-40s %9.3f ms -> %9.3f ms  (%+.1f%%)" % (name, old['p50_ms'], stage['p50_ms'], change))
+
+
+def main():
+    scriptDir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Offline benchmark of the perception stages on recorded frames (no ROS needed)")
+    parser.add_argument("source", help="image directory (e.g., images/dataset) or video file")
+    parser.add_argument("--stages", nargs="+", choices=list(stages), default=list(stages))
+    parser.add_argument("--max-frames", type=int, default=100)
+    parser.add_argument("--scale", type=float, default=1.0, help="resize factor applied to the frames")
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--boxes", type=int, default=20, help="boxes per frame for the pointing stage")
+    parser.add_argument("--no-allocations", action="store_true", help="skip the tracemalloc pass (slow for some stages)")
+    parser.add_argument("--models", default=os.path.join(scriptDir, "..", "models"))
+    parser.add_argument("--pkg-path", default=os.path.join(scriptDir, ".."))
+    parser.add_argument("--output", help="JSON file where the results are saved")
+    parser.add_argument("--compare", help="JSON file of a previous run to compare with")
+    args = parser.parse_args()
+
+    frames = loadFrames(args.source, args.max_frames, args.scale)
+    if frames == []:
+        parser.error("no frames could be read from " + args.source)
+    print("%d frames of %dx%d from %s" % (len(frames), frames[0].shape[1], frames[0].shape[0], args.source))
+
+    results = {'run': runInfo(args), 'frames': len(frames), 'frame_size': list(frames[0].shape[:2]), 'stages': {}}
+    for name in args.stages:
+        try:
+            fn = stages[name](args, frames)
+        except stageSkipped as e:
+            print("%-40s skipped: %s" % (name, str(e)))
+            results['stages'][name] = {'skipped': str(e)}
+            continue
+
+        stats = timeStage(fn, frames, args.warmup)
+        printStats(name, stats)
+        if not args.no_allocations:
+            stats.update(allocationStats(fn, frames))
+        stats.update(memoryStats())
+        printMemory(name, stats)
+        results['stages'][name] = stats
+
+    if args.output is not None:
+        saveResults(args.output, results)
+        print("Results saved to " + args.output)
+
+    if args.compare is not None:
+        printComparison(loadResults(args.compare), results)
+
+
+if __name__ == '__main__':
+    main()
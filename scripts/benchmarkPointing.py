@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+
+import argparse
+import numpy as np
+
+from benchmarkModule import timeFunction, printStats
+from pointingModule import pointingLine, resolvePointingTarget
+
+
+def syntheticBoxes(n, width, height, rng):
+    x = rng.uniform(0, width - 50, n)
+    y = rng.uniform(0, height - 50, n)
+    w = rng.uniform(10, 200, n)
+    h = rng.uniform(10, 200, n)
+    return np.stack([x, y, np.minimum(x + w, width), np.minimum(y + h, height)], axis=1)
+
+
+def sympyResolver(boxes, slope, intercept, width):
+    # Previous implementation: one sympy polygon per box and a python loop for the closest box
+    from sympy import Point, Polygon, Line
+
+    line = Line(Point(0, intercept), Point(width, slope * width + intercept))
+    for idx, (x0, y0, x1, y1) in enumerate(boxes):
+        poly = Polygon(*map(Point, [(x0, y1), (x1, y1), (x1, y0), (x0, y0), (x0, y1)]))
+        if poly.intersection(line) != []:
+            return idx
+
+    perpendicularSlope = -1 / slope
+    best, bestDist = None, None
+    for idx, (x0, y0, x1, y1) in enumerate(boxes):
+        cx, cy = (x0 + x1) / 2, (y0 + y1) / 2
+        perpendicularIntercept = cy - perpendicularSlope * cx
+        ix = (perpendicularIntercept - intercept) / (slope - perpendicularSlope)
+        iy = slope * ix + intercept
+        dist = np.hypot(cx - ix, cy - iy)
+        if bestDist is None or dist < bestDist:
+            best, bestDist = idx, dist
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pointing target resolution benchmark (NumPy resolver vs sympy geometry)")
+    parser.add_argument("--boxes", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--sympy", action="store_true", help="also time the previous sympy implementation (slow)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    width, height = 1280, 720
+    # Pointing line that misses most boxes, the worst case for the sympy loop
+    slope, intercept = 0.01, -50.0
+
+    for n in args.boxes:
+        boxes = syntheticBoxes(n, width, height, rng)
+        origin, direction, length = pointingLine(slope, intercept, width=width)
+        stats = timeFunction(lambda: resolvePointingTarget(boxes, origin, direction, 0, length), repeat=args.repeat)
+        printStats("numpy resolver, %d boxes" % n, stats)
+
+        if args.sympy:
+            stats = timeFunction(lambda: sympyResolver(boxes, slope, intercept, width), repeat=max(1, args.repeat // 10), warmup=1)
+            printStats("sympy geometry, %d boxes" % n, stats)
+
+
+if __name__ == '__main__':
+    main()
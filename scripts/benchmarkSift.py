@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+
+import argparse
+import cv2
+import numpy as np
+
+from benchmarkModule import timeFunction, printStats
+from siftModule import featureMatcher, keypointStats, matchedPoints
+
+
+def legacyDetect(sift, color_image):
+    # Previous applySift: SIFT on the 3-channel RGB image
+    return sift.detectAndCompute(cv2.cvtColor(color_image, cv2.COLOR_BGR2RGB), None)
+
+
+def legacyMatch(bf, descriptors, prev_descriptors):
+    # Previous applyMatching: brute force with cross check, every match sorted in Python
+    return sorted(bf.match(descriptors, prev_descriptors), key=lambda x: x.distance)
+
+
+def legacyStats(matches, prev_keypoints, keypoints):
+    # Previous computeDistanceBetweenKeypoints (without the prints): complex numbers and N x N distance matrices
+    pts1 = np.float32([keypoints[m.queryIdx].pt for m in matches])
+    pts2 = np.float32([prev_keypoints[m.trainIdx].pt for m in matches])
+    z1 = np.array([[complex(c[0], c[1]) for c in pts1]])
+    z2 = np.array([[complex(c[0], c[1]) for c in pts2]])
+    # The N x N keypoint distance matrices were computed but never used. They are kept (and returned) so the benchmark
+    # measures the cost of the previous implementation
+    KP_dist1 = abs(z1.T - z1)
+    KP_dist2 = abs(z2.T - z2)
+    FM_dist = abs(z2 - z1)
+    return np.sum(FM_dist) / FM_dist.shape[1], KP_dist1, KP_dist2
+
+
+def syntheticPair(width, height, rng):
+    # Textured image and a copy warped by a known homography (small rotation, scale and translation)
+    img = cv2.GaussianBlur(rng.integers(0, 256, (height, width), dtype=np.uint8), (0, 0), 2)
+    for _ in range(60):
+        p1 = tuple(int(v) for v in rng.integers(0, [width, height]))
+        p2 = tuple(int(v) for v in rng.integers(0, [width, height]))
+        cv2.rectangle(img, p1, p2, int(rng.integers(0, 256)), int(rng.integers(-1, 4)))
+    img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+
+    angle, scale = 5.0, 1.05
+    H = np.vstack([cv2.getRotationMatrix2D((width / 2, height / 2), angle, scale), [0, 0, 1]])
+    H[0, 2] += 12
+    H[1, 2] -= 8
+    return cv2.warpPerspective(img, H, (width, height)), img, H
+
+
+def loadPair(source):
+    # Two consecutive frames of a video, or the first two images of a list
+    capture = cv2.VideoCapture(source)
+    ok1, img1 = capture.read()
+    ok2, img2 = capture.read()
+    capture.release()
+    if not (ok1 and ok2):
+        raise SystemExit("Could not read two frames from " + source)
+    return img2, img1
+
+
+def correctRatio(matches, keypoints, prev_keypoints, H):
+    # Fraction of the matches whose previous keypoint maps onto the current one (3 px) with the ground truth homography
+    if H is None or len(matches) == 0:
+        return None
+    pts1, pts2 = matchedPoints(matches, keypoints, prev_keypoints)
+    projected = cv2.perspectiveTransform(pts2.reshape(-1, 1, 2).astype(np.float64), H).reshape(-1, 2)
+    return float(np.mean(np.hypot(*(projected - pts1).T) < 3.0))
+
+
+def describe(name, matches, keypoints, prev_keypoints, H):
+    ratio = correctRatio(matches, keypoints, prev_keypoints, H)
+    print("%-40s %d matches%s" % (name, len(matches), "" if ratio is None else ", %.1f%% correct" % (100 * ratio)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Feature matching benchmark (siftModule engine vs the previous brute force matching)")
+    parser.add_argument("--source", help="video file or image sequence pattern (e.g. frames/img_%%06d.png). A synthetic warped pair is used otherwise")
+    parser.add_argument("--size", type=int, nargs=2, default=[640, 480], help="size of the synthetic images")
+    parser.add_argument("--detectors", nargs="+", default=["sift", "orb", "akaze"])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.source is not None:
+        img, prev_img, H = loadPair(args.source) + (None,)
+    else:
+        img, prev_img, H = syntheticPair(args.size[0], args.size[1], np.random.default_rng(0))
+
+    # Previous implementation
+    sift = cv2.SIFT_create()
+    bf = cv2.BFMatcher(cv2.NORM_L2, crossCheck=True)
+    keypoints, descriptors = legacyDetect(sift, img)
+    prev_keypoints, prev_descriptors = legacyDetect(sift, prev_img)
+    printStats("legacy sift detect (rgb)", timeFunction(lambda: legacyDetect(sift, img), repeat=args.repeat))
+    printStats("legacy bf cross check match", timeFunction(lambda: legacyMatch(bf, descriptors, prev_descriptors), repeat=args.repeat))
+    matches = legacyMatch(bf, descriptors, prev_descriptors)
+    printStats("legacy keypoint stats", timeFunction(lambda: legacyStats(matches, prev_keypoints, keypoints), repeat=args.repeat))
+    describe("legacy", matches, keypoints, prev_keypoints, H)
+
+    for detector in args.detectors:
+        for matcher in ("flann", "bf"):
+            try:
+                engine = featureMatcher(detector, matcher, verify="homography")
+            except ValueError as e:
+                print("%-40s skipped: %s" % (detector, str(e)))
+                break
+
+            name = detector + " " + ("lsh" if matcher == "flann" and engine.binary else matcher)
+            keypoints, descriptors = engine.detect(img)
+            prev_keypoints, prev_descriptors = engine.detect(prev_img)
+            if matcher == "flann":
+                printStats(detector + " detect (gray)", timeFunction(lambda: engine.detect(img), repeat=args.repeat))
+            printStats(name + " knn ratio match", timeFunction(lambda: engine.match(descriptors, prev_descriptors), repeat=args.repeat))
+            printStats(name + " match + ransac", timeFunction(lambda: engine.matchKeypoints(keypoints, descriptors, prev_keypoints, prev_descriptors), repeat=args.repeat))
+
+            matches = engine.match(descriptors, prev_descriptors)
+            if matcher == "flann":
+                printStats(detector + " keypoint stats", timeFunction(lambda: keypointStats(matches, prev_keypoints, keypoints), repeat=args.repeat))
+            describe(name + " ratio test", matches, keypoints, prev_keypoints, H)
+            describe(name + " ransac inliers", engine.matchKeypoints(keypoints, descriptors, prev_keypoints, prev_descriptors)[0], keypoints, prev_keypoints, H)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import subprocess
+import sys
+
+from benchmarkModule import latencyStats, printStats
+
+
+# Entry point module and its first call (the work done before the first result, without a ROS master)
+entryPoints = {
+    'perception_smach': ("perception_smach",
+                         "import perception_states; perception_states.perception_object()"),
+    'mediapipeHolisticnode': ("mediapipeHolisticnode",
+                              "import numpy as np, holisticDetectorModule; holisticDetectorModule.holisticDetector().find(np.zeros((480, 640, 3), np.uint8), False, False, False, False)"),
+    'reidnode': ("reidnode",
+                 "import numpy as np, facerecModule; facerecModule.faceRecognition(np.zeros((480, 640, 3), np.uint8), [], [])"),
+}
+
+# Runs in a fresh interpreter, so nothing is cached by previous imports
+probe = '''
+import time
+start = time.perf_counter()
+import %s
+imported = time.perf_counter()
+%s
+done = time.perf_counter()
+print("%%f %%f" %% ((imported - start) * 1000, (done - imported) * 1000))
+'''
+
+
+def runProbe(module, firstCall, importTime = False):
+    cmd = [sys.executable] + (["-X", "importtime"] if importTime else []) + ["-c", probe % (module, firstCall)]
+    result = subprocess.run(cmd, cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "exit code " + str(result.returncode))
+
+    importMs, firstCallMs = map(float, result.stdout.strip().splitlines()[-1].split())
+    return importMs, firstCallMs, result.stderr
+
+
+def heaviestImports(importTimeLog, top):
+    # -X importtime lines: "import time: self [us] | cumulative | imported package", children before their parent
+    modules = []
+    for line in importTimeLog.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        imported = fields[2][1:].rstrip()
+        if imported == "site":
+            # Interpreter startup ends with site, the probe imports come after it
+            modules = []
+            continue
+        # Nested imports are indented by two spaces per level. The entry point and its direct imports are listed
+        if len(imported) - len(imported.lstrip(" ")) <= 2:
+            modules.append((int(fields[1]), imported.strip()))
+    return sorted(modules, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup benchmark: import time and first call latency of the entry points")
+    parser.add_argument("--entry", nargs="+", choices=sorted(entryPoints), default=sorted(entryPoints))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=None, help="import time budget in ms, the exit code is 1 if an entry point exceeds it")
+    parser.add_argument("--top", type=int, default=0, help="also list the N slowest imports of each entry point")
+    args = parser.parse_args()
+
+    overBudget = False
+    for name in args.entry:
+        module, firstCall = entryPoints[name]
+        imports, firstCalls = [], []
+        try:
+            for _ in range(args.repeat):
+                importMs, firstCallMs, log = runProbe(module, firstCall)
+                imports.append(importMs)
+                firstCalls.append(firstCallMs)
+        except RuntimeError as e:
+            print("%-40s failed: %s" % (name, str(e)))
+            continue
+
+        importStats = latencyStats(imports)
+        printStats(name + " import", importStats)
+        printStats(name + " first call", latencyStats(firstCalls))
+        if args.budget is not None and importStats['p50_ms'] > args.budget:
+            print("%-40s import exceeds the %.0f ms budget" % (name, args.budget))
+            overBudget = True
+
+        if args.top > 0:
+            importMs, firstCallMs, log = runProbe(module, firstCall, importTime=True)
+            for cumulative, imported in heaviestImports(log, args.top):
+                print("    %9.3f ms  %s" % (cumulative / 1000.0, imported))
+
+    sys.exit(1 if overBudget else 0)
+
+
+if __name__ == '__main__':
+    main()
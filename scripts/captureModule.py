@@ -0,0 +1,215 @@
+import csv
+import io
+import os
+import queue
+import tarfile
+import threading
+import cv2
+import numpy as np
+
+
+# Encoder parameters of each format. The quality is the JPEG/WebP quality or the PNG compression level
+imageFormats = {
+    'jpg': lambda quality: [cv2.IMWRITE_JPEG_QUALITY, quality],
+    'png': lambda quality: [cv2.IMWRITE_PNG_COMPRESSION, quality],
+    'webp': lambda quality: [cv2.IMWRITE_WEBP_QUALITY, quality],
+}
+
+indexName = "index.csv"
+indexFields = ["name", "shard", "offset", "size", "stamp"]
+
+
+class frameWriter():
+    '''
+    description: encodes and saves captured frames in background threads. Frames are queued in a bounded queue and
+                 dropped (and counted) when the writers can not keep up, so the caller never blocks. Frames are saved
+                 as image files or, for large captures, appended to tar shards. Either way, an index.csv file lists
+                 the name, shard, data offset, size and stamp of every frame
+    '''
+    def __init__(self, directory, imageFormat = 'jpg', quality = 90, workers = 2, queueSize = 32, shardSize = 0):
+        """
+        :param directory: (string) Output directory, created if needed.
+        :param imageFormat: (string) jpg, png or webp.
+        :param quality: (int) JPEG/WebP quality (0-100) or PNG compression level (0-9).
+        :param workers: (int) Number of encoding threads.
+        :param queueSize: (int) Maximum number of frames waiting to be encoded.
+        :param shardSize: (int) Frames per tar shard. If 0, each frame is saved as its own image file.
+        """
+        if imageFormat not in imageFormats:
+            raise ValueError("Unsupported image format: " + str(imageFormat))
+
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.imageFormat = imageFormat
+        self.params = imageFormats[imageFormat](quality)
+        self.shardSize = shardSize
+
+        self.queue = queue.Queue(maxsize=queueSize)
+        self.lock = threading.Lock()
+        self.counter = self.__firstIndex()
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+        # Shared by the workers, only used with self.lock held
+        self.shard = None
+        self.shardName = None
+        # Existing shards are never reopened, a resumed capture starts a new one
+        self.shardNumber = len([f for f in os.listdir(directory) if f.startswith("shard_") and f.endswith(".tar")])
+        self.shardCount = 0
+        newIndex = not os.path.isfile(os.path.join(directory, indexName))
+        self.indexFile = open(os.path.join(directory, indexName), "a", newline="")
+        self.index = csv.writer(self.indexFile)
+        if newIndex:
+            self.index.writerow(indexFields)
+
+        self.workers = [threading.Thread(target=self.__work, daemon=True) for i in range(workers)]
+        for worker in self.workers:
+            worker.start()
+
+
+    def submit(self, img, stamp):
+        """
+        It queues a frame to be encoded and saved. The frame must not be modified afterwards.
+
+        :param img: (np.array) bgr8 image.
+        :param stamp: (float) Capture time in seconds.
+
+        :return queued: (bool) False if the queue was full and the frame was dropped.
+        """
+        return self.__put(img, False, stamp)
+
+
+    def submitEncoded(self, data, stamp):
+        """
+        It queues an already encoded frame (e.g., the data of a CompressedImage in the writer format), saved without re-encoding.
+
+        :return queued: (bool) False if the queue was full and the frame was dropped.
+        """
+        return self.__put(data, True, stamp)
+
+
+    def close(self):
+        # The queued frames are written before the workers stop
+        for worker in self.workers:
+            self.queue.put(None)
+        for worker in self.workers:
+            worker.join()
+
+        with self.lock:
+            if self.shard is not None:
+                self.shard.close()
+                self.shard = None
+            self.indexFile.close()
+
+
+    def __put(self, data, encoded, stamp):
+        with self.lock:
+            try:
+                self.queue.put_nowait((self.counter, data, encoded, stamp))
+            except queue.Full:
+                self.dropped += 1
+                return False
+            self.counter += 1
+            self.submitted += 1
+            return True
+
+
+    def __work(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+
+            number, data, encoded, stamp = item
+            if not encoded:
+                # Encoding releases the GIL, so the workers run in parallel
+                ok, buffer = cv2.imencode("." + self.imageFormat, data, self.params)
+                if not ok:
+                    with self.lock:
+                        self.failed += 1
+                    continue
+                data = buffer.tobytes()
+
+            name = "img_%06d.%s" % (number, self.imageFormat)
+            if self.shardSize > 0:
+                self.__addToShard(name, data, stamp)
+            else:
+                with open(os.path.join(self.directory, name), "wb") as f:
+                    f.write(data)
+                with self.lock:
+                    self.index.writerow([name, "", 0, len(data), "%.6f" % stamp])
+                    self.written += 1
+
+
+    def __addToShard(self, name, data, stamp):
+        with self.lock:
+            if self.shard is None or self.shardCount >= self.shardSize:
+                if self.shard is not None:
+                    self.shard.close()
+                    self.shardNumber += 1
+                shardName = "shard_%05d.tar" % self.shardNumber
+                self.shard = tarfile.open(os.path.join(self.directory, shardName), "w", format=tarfile.USTAR_FORMAT)
+                self.shardName = shardName
+                self.shardCount = 0
+
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(stamp)
+            # The data starts right after the member header, so it can be read back without scanning the archive
+            offset = self.shard.offset + len(info.tobuf(self.shard.format, self.shard.encoding, self.shard.errors))
+            self.shard.addfile(info, io.BytesIO(data))
+            self.shardCount += 1
+
+            self.index.writerow([name, self.shardName, offset, len(data), "%.6f" % stamp])
+            self.written += 1
+
+
+    def __firstIndex(self):
+        # A capture can be resumed in the same directory, the numbering continues after the frames already indexed
+        path = os.path.join(self.directory, indexName)
+        if not os.path.isfile(path):
+            return 0
+        with open(path, newline="") as f:
+            rows = list(csv.DictReader(f))
+        if rows == []:
+            return 0
+        return max(int(os.path.splitext(r["name"])[0].split("_")[-1]) for r in rows) + 1
+
+
+def readCapture(directory, maxFrames = None, flags = cv2.IMREAD_COLOR):
+    """
+    It reads back the frames saved by a frameWriter, in capture order, without extracting the shards.
+
+    :param directory: (string) Capture directory, with its index.csv file.
+    :param maxFrames: (int) Maximum number of frames read. If None, all the frames are read.
+    :param flags: (int) cv2.imdecode flags.
+
+    :return frames: (generator) (name, stamp, image) tuples. Frames that can not be decoded are skipped.
+    """
+    with open(os.path.join(directory, indexName), newline="") as f:
+        rows = sorted(csv.DictReader(f), key=lambda r: r["name"])
+    if maxFrames is not None:
+        rows = rows[:maxFrames]
+
+    shards = {}
+    try:
+        for row in rows:
+            if row["shard"] == "":
+                with open(os.path.join(directory, row["name"]), "rb") as f:
+                    data = f.read()
+            else:
+                shard = shards.get(row["shard"])
+                if shard is None:
+                    shard = open(os.path.join(directory, row["shard"]), "rb")
+                    shards[row["shard"]] = shard
+                shard.seek(int(row["offset"]))
+                data = shard.read(int(row["size"]))
+
+            img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flags)
+            if img is not None:
+                yield row["name"], float(row["stamp"]), img
+    finally:
+        for shard in shards.values():
+            shard.close()
@@ -1,4 +1,9 @@
 import csv
+import json
+import os
+import queue
+import threading
+import numpy as np
 
 def openCsvFile(header, filename):
     f = open(filename, 'w')
@@ -9,4 +14,203 @@ def openCsvFile(header, filename):
     return f, writer
 
 def closeCsvFile(f):
-    f.close()
\ No newline at end of file
+    f.close()
+
+
+metaName = "meta.json"
+
+
+def missingValue(dtype):
+    # Value of the columns not given for a row
+    dtype = np.dtype(dtype)
+    if dtype.kind == 'f':
+        return np.nan
+    if dtype.kind in ('U', 'S'):
+        return ""
+    if dtype.kind == 'b':
+        return False
+    return -1
+
+
+class columnarLogger():
+    '''
+    description: logs rows of several streams (e.g., landmarks of every frame) in columnar chunks. Each column is
+                 buffered in a preallocated array of chunkRows rows; full chunks are saved by a background thread as
+                 folders with one .npy file per column, so they can be memory-mapped (see landmarkArchiveModule.py).
+                 At most maxPendingChunks chunks wait to be saved, further chunks are dropped and counted, so the
+                 memory is bounded and the caller never blocks on the disk. log() and close() must be called from the
+                 same thread
+    '''
+    def __init__(self, directory, chunkRows = 256, maxPendingChunks = 8):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.chunkRows = chunkRows
+        self.streams = {}
+        self.droppedRows = 0
+
+        self.queue = queue.Queue(maxsize=maxPendingChunks)
+        self.writer = threading.Thread(target=self.__write, daemon=True)
+        self.writer.start()
+
+
+    def addStream(self, name, columns):
+        """
+        It declares a stream. Every stream has an implicit float64 "stamp" column.
+
+        :param name: (string) Stream name, saved in directory/name.
+        :param columns: (list) (name, dtype, shape) of each column, shape being the shape of one row (e.g., (468, 2) for a face mesh, () for a scalar).
+        """
+        columns = [("stamp", "float64", ())] + [(c, np.dtype(dtype).str, tuple(shape)) for c, dtype, shape in columns]
+        path = os.path.join(self.directory, name)
+        os.makedirs(path, exist_ok=True)
+
+        # A stream logged again in the same directory continues after its previous chunks
+        meta = readMeta(self.directory, name) if os.path.isfile(os.path.join(path, metaName)) else None
+        if meta is not None and [tuple(c) for c in meta["columns"]] != [(c, d, list(s)) for c, d, s in columns]:
+            raise ValueError("The columns of stream %s do not match the ones already logged" % name)
+        if meta is None:
+            meta = {"columns": [(c, d, list(s)) for c, d, s in columns], "chunks": []}
+
+        self.streams[name] = {"columns": columns, "meta": meta, "rows": 0, "buffers": self.__newBuffers(columns)}
+
+
+    def log(self, stream, stamp, **values):
+        """
+        It appends a row to a stream. Columns not given (or None) are filled with NaN, -1, "" or False depending on their type.
+
+        :param stream: (string) Stream name.
+        :param stamp: (float) Time of the row, in seconds.
+        :param values: Values of the columns, scalars or array-likes of the column shape.
+        """
+        s = self.streams[stream]
+        row = s["rows"]
+        buffers = s["buffers"]
+        buffers["stamp"][row] = stamp
+        for name, dtype, shape in s["columns"][1:]:
+            value = values.get(name)
+            buffers[name][row] = missingValue(dtype) if value is None else value
+
+        s["rows"] += 1
+        if s["rows"] == self.chunkRows:
+            self.__flush(stream)
+
+
+    def close(self):
+        # Partial chunks are saved too, then the writer stops once the queue is empty
+        for stream in self.streams:
+            self.__flush(stream, block=True)
+        self.queue.put(None)
+        self.writer.join()
+
+
+    def __flush(self, stream, block = False):
+        s = self.streams[stream]
+        if s["rows"] == 0:
+            return
+
+        chunk = {name: buffer[:s["rows"]] for name, buffer in s["buffers"].items()}
+        try:
+            self.queue.put((stream, chunk), block=block)
+        except queue.Full:
+            self.droppedRows += s["rows"]
+        s["rows"] = 0
+        s["buffers"] = self.__newBuffers(s["columns"])
+
+
+    def __newBuffers(self, columns):
+        return {name: np.empty((self.chunkRows,) + shape, dtype=dtype) for name, dtype, shape in columns}
+
+
+    def __write(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+
+            stream, chunk = item
+            meta = self.streams[stream]["meta"]
+            fileName = "chunk_%06d" % len(meta["chunks"])
+            os.makedirs(os.path.join(self.directory, stream, fileName), exist_ok=True)
+            for name, values in chunk.items():
+                np.save(os.path.join(self.directory, stream, fileName, name + ".npy"), values)
+
+            stamps = chunk["stamp"]
+            meta["chunks"].append({"file": fileName, "rows": len(stamps), "first_stamp": float(stamps.min()), "last_stamp": float(stamps.max())})
+            # The meta file is replaced atomically, so a reader never sees a chunk that is not fully written
+            metaFile = os.path.join(self.directory, stream, metaName)
+            with open(metaFile + ".tmp", "w") as f:
+                json.dump(meta, f)
+            os.replace(metaFile + ".tmp", metaFile)
+
+
+def readMeta(directory, stream):
+    with open(os.path.join(directory, stream, metaName)) as f:
+        return json.load(f)
+
+
+def readChunkColumn(directory, stream, chunk, column):
+    # Memory-mapped, only the rows actually used are read from disk
+    return np.load(os.path.join(directory, stream, chunk["file"], column + ".npy"), mmap_mode='r')
+
+
+def readColumns(directory, stream, columns = None, start = None, end = None):
+    """
+    It reads back a stream of a columnarLogger. Only the chunks overlapping [start, end] are loaded.
+
+    :param directory: (string) Log directory.
+    :param stream: (string) Stream name.
+    :param columns: (list) Names of the columns to read. If None, all the columns are read.
+    :param start: (float) Oldest stamp of the rows returned. If None, there is no lower bound.
+    :param end: (float) Newest stamp of the rows returned. If None, there is no upper bound.
+
+    :return columns: (dict) One array per column, with one row per logged row.
+    """
+    meta = readMeta(directory, stream)
+    if columns is None:
+        columns = [c[0] for c in meta["columns"]]
+    columnsMeta = {c[0]: c for c in meta["columns"]}
+
+    parts = {c: [] for c in columns}
+    for chunk in meta["chunks"]:
+        if (start is not None and chunk["last_stamp"] < start) or (end is not None and chunk["first_stamp"] > end):
+            continue
+        stamps = readChunkColumn(directory, stream, chunk, "stamp")
+        keep = np.ones(len(stamps), dtype=bool)
+        if start is not None:
+            keep &= stamps >= start
+        if end is not None:
+            keep &= stamps <= end
+        for c in columns:
+            parts[c].append(readChunkColumn(directory, stream, chunk, c)[keep])
+
+    result = {}
+    for c in columns:
+        name, dtype, shape = columnsMeta[c]
+        result[c] = np.concatenate(parts[c]) if parts[c] != [] else np.empty((0,) + tuple(shape), dtype=dtype)
+    return result
+
+
+def exportCsv(directory, stream, filename, columns = None):
+    """
+    It exports a stream of a columnarLogger as CSV. Array columns are flattened into one CSV column per value (e.g., face_0_0, face_0_1, ...).
+
+    :param directory: (string) Log directory.
+    :param stream: (string) Stream name.
+    :param filename: (string) CSV file.
+    :param columns: (list) Names of the columns to export. If None, all the columns are exported.
+    """
+    data = readColumns(directory, stream, columns)
+    header = []
+    flat = []
+    for name, values in data.items():
+        if values.ndim == 1:
+            header.append(name)
+            flat.append(values.reshape(-1, 1))
+        else:
+            header += [name + "_" + "_".join(str(i) for i in idx) for idx in np.ndindex(values.shape[1:])]
+            flat.append(values.reshape(len(values), -1))
+
+    f, writer = openCsvFile(header, filename)
+    for rowParts in zip(*flat):
+        writer.writerow([v for part in rowParts for v in part.tolist()])
+    closeCsvFile(f)
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+
+import rospy
+import threading
+from collections import deque
+
+from sensor_msgs.msg import RegionOfInterest
+from detectron2_ros.msg import RecognizedObjectWithMaskArrayStamped
+from perception_tests.msg import DetectedBox, DetectedBoxArray, MaskRle
+from perception_tests.srv import GetDetectionMasks, GetDetectionMasksResponse
+from imageConversionModule import imageView
+from maskRleModule import encodeMaskRle, cropToBox
+from csvModule import columnarLogger
+
+
+
+class DetectionRelay:
+    def __init__(self):
+        # Create the node
+        node_name = "detection_relay"
+        rospy.init_node(node_name, anonymous=False)
+        rospy.loginfo("%s node created" % node_name)
+
+        # Read from ROS Param
+        self.detection_topic = rospy.get_param("~detection_topic")
+        self.classes = [c.strip() for c in rospy.get_param("~classes").split(",") if c.strip() != ""]
+        self.minScore = rospy.get_param("~min_score")
+        self.historySize = rospy.get_param("~history_size")
+        self.logPath = rospy.get_param("~log_path")
+
+        # Last detections with their masks, so the masks of a published frame can be requested afterwards
+        self.history = deque(maxlen=self.historySize)
+        self.lock = threading.Lock()
+
+        # Kept detections of every frame, one row per object, saved in the background (disabled if ~log_path is empty)
+        self.logger = None
+        if self.logPath != "":
+            self.logger = columnarLogger(self.logPath)
+            self.logger.addStream("objects", [("class_name", "U64", ()),
+                                              ("confidence", "float32", ()),
+                                              ("box", "int32", (4,))])
+
+        # Subscribe to the full detectron results (with masks) once, for every consumer of the boxes
+        self.detection_sub = rospy.Subscriber(self.detection_topic, RecognizedObjectWithMaskArrayStamped, self.detectionCallback, queue_size=1, buff_size=2**26)
+
+        # Publish Boxes (class, score and bounding box) without masks
+        self.boxes_pub = rospy.Publisher("~boxes", DetectedBoxArray, queue_size=10)
+
+        # Serve the masks on request, run-length encoded and cropped to their box
+        self.masks_srv = rospy.Service("~get_masks", GetDetectionMasks, self.getMasks)
+
+
+    def run(self):
+        rospy.spin()
+        if self.logger is not None:
+            self.detection_sub.unregister()
+            self.logger.close()
+        rospy.loginfo('Shutting Down Detection Relay Node')
+
+
+    def detectionCallback(self, data):
+        msg = DetectedBoxArray()
+        msg.header = data.header
+        for idx, obj in enumerate(data.objects.objects):
+            if self.keep(obj):
+                msg.boxes.append(DetectedBox(index=idx, class_name=obj.class_name, confidence=obj.confidence, bounding_box=obj.bounding_box))
+
+        with self.lock:
+            self.history.append((data.header.stamp, data, set(b.index for b in msg.boxes)))
+
+        self.boxes_pub.publish(msg)
+
+        if self.logger is not None:
+            stamp = data.header.stamp.to_sec()
+            for b in msg.boxes:
+                box = b.bounding_box
+                self.logger.log("objects", stamp, class_name=b.class_name, confidence=b.confidence, box=(box.x_offset, box.y_offset, box.width, box.height))
+
+
+    def keep(self, obj):
+        if obj.confidence < self.minScore:
+            return False
+        return self.classes == [] or obj.class_name in self.classes
+
+
+    def getMasks(self, req):
+        res = GetDetectionMasksResponse()
+        res.success = False
+
+        with self.lock:
+            if len(self.history) == 0:
+                return res
+            if req.stamp.is_zero():
+                stamp, data, kept = self.history[-1]
+            else:
+                matches = [h for h in self.history if h[0] == req.stamp]
+                if matches == []:
+                    rospy.logwarn("Detections stamped %s are no longer available" % str(req.stamp.to_sec()))
+                    return res
+                stamp, data, kept = matches[-1]
+
+        objects = data.objects.objects
+        indices = req.indices if len(req.indices) > 0 else sorted(kept)
+        for idx in indices:
+            if idx not in kept:
+                continue
+
+            obj = objects[idx]
+            mask = imageView(obj.mask)
+            if mask is None:
+                rospy.logwarn("Unsupported mask encoding: " + obj.mask.encoding)
+                continue
+            if mask.ndim == 3:
+                mask = mask[:, :, 0]
+
+            box = obj.bounding_box
+            crop, x, y = cropToBox(mask, box.x_offset, box.y_offset, box.width, box.height)
+            roi = RegionOfInterest(x_offset=x, y_offset=y, height=crop.shape[0], width=crop.shape[1])
+            res.masks.append(MaskRle(index=idx, bounding_box=roi, counts=encodeMaskRle(crop).tolist()))
+            res.height, res.width = mask.shape
+
+        res.success = True
+        return res
+
+
+
+# Main function
+if __name__ == '__main__':
+    relay = DetectionRelay()
+    relay.run()
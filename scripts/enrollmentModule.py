@@ -0,0 +1,112 @@
+import rospy
+import cv2
+import numpy as np
+import os
+import queue
+import threading
+
+
+class enrollmentJob():
+    def __init__(self, personId, faceImg, fileName, extractFaceBoundary):
+        self.personId = personId
+        self.faceImg = faceImg
+        self.fileName = fileName
+        self.extractFaceBoundary = extractFaceBoundary
+
+
+class cleanupJob():
+    def __init__(self, directory):
+        self.directory = directory
+
+
+class enrollmentWorker():
+    '''
+    description: saves the photos of the enrolled persons in the background, so the detection loop never waits for the face mesh or the disk
+    '''
+    def __init__(self, maxQueueSize = 10, onDone = None):
+        self.queue = queue.Queue(maxsize=maxQueueSize)
+        # onDone(personId, fileName, faceBoundaryFound) is called from the worker thread
+        self.onDone = onDone
+        # Static-image face mesh owned by the worker, so the tracking state of the live detectors is not disturbed
+        self.faceMesh = None
+        self.thread = threading.Thread(target=self.__run, daemon=True)
+        self.thread.start()
+
+
+    def submit(self, personId, faceImg, fileName, extractFaceBoundary):
+        # The crop is copied since the caller keeps drawing on the frame
+        job = enrollmentJob(personId, faceImg.copy(), fileName, extractFaceBoundary)
+        try:
+            self.queue.put_nowait(job)
+        except queue.Full:
+            return False
+        return True
+
+
+    def clear(self, directory):
+        # The files are deleted by the worker after the photos already queued, so no photo of the previous session is written after the cleanup
+        self.queue.put(cleanupJob(directory))
+
+
+    def pending(self):
+        return self.queue.qsize()
+
+
+    def stop(self):
+        self.queue.put(None)
+        self.thread.join(timeout=5)
+
+
+    def __run(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                break
+
+            if isinstance(job, cleanupJob):
+                self.__deleteFiles(job.directory)
+                continue
+
+            faceBoundaryFound = False
+            try:
+                img = job.faceImg
+                if job.extractFaceBoundary:
+                    masked = self.__getFaceMask(img)
+                    if masked is not None:
+                        img = masked
+                        faceBoundaryFound = True
+                cv2.imwrite(job.fileName, img)
+            except Exception as e:
+                rospy.logerr("Could not save the photo of " + job.personId + ": " + str(e))
+
+            if self.onDone is not None:
+                self.onDone(job.personId, job.fileName, faceBoundaryFound)
+
+
+    def __deleteFiles(self, directory):
+        for file_name in os.listdir(directory):
+            file = os.path.join(directory, file_name)
+            try:
+                if os.path.isfile(file):
+                    os.remove(file)
+            except OSError as e:
+                rospy.logerr("Could not delete " + file + ": " + str(e))
+
+
+    def __getFaceMask(self, img):
+        if self.faceMesh is None:
+            import mediapipe as mp
+            self.faceMesh = mp.solutions.face_mesh.FaceMesh(static_image_mode=True, max_num_faces=1)
+
+        results = self.faceMesh.process(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+        if not results.multi_face_landmarks:
+            return None
+
+        h, w, c = img.shape
+        points = np.array([(int(lm.x * w), int(lm.y * h)) for lm in results.multi_face_landmarks[0].landmark], dtype=np.int32)
+        hull = cv2.convexHull(points)
+
+        mask = np.zeros((h, w), dtype=np.uint8)
+        cv2.fillConvexPoly(mask, hull, 255)
+
+        return cv2.bitwise_and(img, img, mask=mask)
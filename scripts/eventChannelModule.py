@@ -0,0 +1,99 @@
+import rospy
+import time
+from std_msgs.msg import String
+from waitModule import waitCondition
+
+
+def ackTopicFor(topic):
+    # The nodes of this package acknowledge the events received on ~event_in by publishing on ~event_out.
+    # Other nodes (e.g., detectron) do not, so their events are only waited until connected
+    if topic.startswith("/perception/") and topic.endswith("/event_in"):
+        return topic[:-len("event_in")] + "event_out"
+    return None
+
+
+def ackFor(event):
+    return event + "_done"
+
+
+class eventChannel():
+    '''
+    description: long-lived publisher of events to a node. Sending waits until the node is connected instead of
+                 sleeping a fixed time and, when the node acknowledges its events, until the ack is received
+    '''
+    def __init__(self, topic, ackTopic = None):
+        self.topic = topic
+        self.ackTopic = ackTopic
+        self.condition = waitCondition()
+        # Number of acks received per event, so an ack is only matched with events sent before it
+        self.ackCounter = {}
+        self.publisher = rospy.Publisher(topic, String, queue_size=10)
+        self.ackSubscriber = None
+        if ackTopic is not None:
+            self.ackSubscriber = rospy.Subscriber(ackTopic, String, self.__ackCallback, queue_size=10)
+
+
+    def __ackCallback(self, msg):
+        with self.condition:
+            self.ackCounter[msg.data] = self.ackCounter.get(msg.data, 0) + 1
+            self.condition.notify()
+
+
+    def waitConnected(self, timeout = 3.0):
+        """
+        It waits until the node is subscribed to the events and, if it acknowledges them, until its ack publisher is connected.
+
+        :param timeout: (float) Maximum time in seconds to wait.
+
+        :return connected: (bool) False on timeout.
+        """
+        def connected():
+            if self.ackSubscriber is not None and self.ackSubscriber.get_num_connections() == 0:
+                return False
+            return self.publisher.get_num_connections() > 0
+
+        # rospy does not notify new connections, so they are checked periodically
+        return self.condition.waitFor(connected, timeout, poll=0.01)
+
+
+    def send(self, event, timeout = 3.0, acks = None):
+        """
+        It publishes an event and waits for the node to acknowledge it.
+
+        :param event: (string) Event to publish.
+        :param timeout: (float) Maximum time in seconds to wait for the connection and the ack together.
+        :param acks: (list) Acks accepted for this event. If None, the node must reply with the event name followed by "_done".
+
+        :return ack: (string) The ack received, True for nodes that do not acknowledge their events, or False on timeout.
+        """
+        deadline = time.monotonic() + timeout
+        if not self.waitConnected(timeout):
+            rospy.logwarn("No node is listening to " + self.topic)
+            return False
+
+        if acks is None:
+            acks = [ackFor(event)]
+        with self.condition:
+            sentBefore = {ack: self.ackCounter.get(ack, 0) for ack in acks}
+
+        self.publisher.publish(String(data=event))
+        if self.ackSubscriber is None:
+            return True
+
+        def acknowledged():
+            for ack in acks:
+                if self.ackCounter.get(ack, 0) > sentBefore[ack]:
+                    return ack
+            return None
+
+        ack = self.condition.waitFor(acknowledged, max(deadline - time.monotonic(), 0))
+        if ack is None:
+            rospy.logwarn("Event " + event + " sent to " + self.topic + " was not acknowledged")
+            return False
+        return ack
+
+
+    def close(self):
+        self.publisher.unregister()
+        if self.ackSubscriber is not None:
+            self.ackSubscriber.unregister()
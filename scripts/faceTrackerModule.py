@@ -0,0 +1,152 @@
+import cv2
+import numpy as np
+
+
+class faceTrack():
+    def __init__(self, trackId, location):
+        self.trackId = trackId
+        self.location = location
+        self.name = "Unknown"
+        self.gender = None
+        self.ageRange = None
+        self.encoding = None
+        self.thumbnail = None
+        self.framesSinceEncoding = 0
+        self.missedFrames = 0
+        self.hits = 1
+        # True when the encoding was recomputed on the current frame
+        self.updated = False
+
+
+class faceTracker():
+    def __init__(self, iouThreshold = 0.3, centerDistanceThreshold = 0.5, maxMissedFrames = 5, reencodePeriod = 15, appearanceThreshold = 25.0):
+        self.iouThreshold = iouThreshold
+        # Max distance between centers, relative to the size of the track box
+        self.centerDistanceThreshold = centerDistanceThreshold
+        self.maxMissedFrames = maxMissedFrames
+        self.reencodePeriod = reencodePeriod
+        # Mean absolute difference (0-255) between face thumbnails that forces a new encoding
+        self.appearanceThreshold = appearanceThreshold
+        self.thumbnailSize = (16, 16)
+        self.reset()
+
+
+    def reset(self):
+        self.tracks = []
+        self.nextTrackId = 0
+        self.encodingsComputed = 0
+        self.encodingsSkipped = 0
+
+
+    def update(self, frame, face_locations):
+        """
+        Associates the face boxes of the current frame with the existing tracks.
+
+        :param frame: (np.array) Current BGR frame.
+        :param face_locations: (list) Face boxes as (top, right, bottom, left) tuples.
+
+        :return tracks: (list) One track per face location, in the same order.
+        """
+        for track in self.tracks:
+            track.updated = False
+
+        assignment = self.__associate(face_locations)
+
+        matchedTracks = set()
+        result = []
+        for idx, location in enumerate(face_locations):
+            trackIdx = assignment.get(idx)
+            if trackIdx is None:
+                track = faceTrack(self.nextTrackId, location)
+                self.nextTrackId += 1
+                self.tracks.append(track)
+            else:
+                track = self.tracks[trackIdx]
+                track.location = location
+                track.hits += 1
+                track.framesSinceEncoding += 1
+
+            track.missedFrames = 0
+            matchedTracks.add(track.trackId)
+            result.append(track)
+
+        # Age out tracks that were not seen
+        for track in self.tracks:
+            if track.trackId not in matchedTracks:
+                track.missedFrames += 1
+        self.tracks = [t for t in self.tracks if t.missedFrames <= self.maxMissedFrames]
+
+        # Check appearance changes on the tracks that would otherwise reuse their encoding
+        for track in result:
+            thumbnail = self.__thumbnail(frame, track.location)
+            if track.thumbnail is not None and thumbnail is not None and track.encoding is not None:
+                diff = np.mean(cv2.absdiff(thumbnail, track.thumbnail))
+                if diff > self.appearanceThreshold:
+                    track.encoding = None
+            if track.encoding is None or track.thumbnail is None:
+                track.thumbnail = thumbnail
+
+        return result
+
+
+    def needsEncoding(self, track):
+        return track.encoding is None or track.framesSinceEncoding >= self.reencodePeriod
+
+
+    def setEncoding(self, frame, track, encoding):
+        track.encoding = encoding
+        track.framesSinceEncoding = 0
+        track.updated = True
+        track.thumbnail = self.__thumbnail(frame, track.location)
+
+
+    def __associate(self, face_locations):
+        # Greedy association ordered by IoU, falling back to center distance for fast movements
+        if self.tracks == [] or face_locations == []:
+            return {}
+
+        boxes = np.array(face_locations, dtype=np.float32)
+        trackBoxes = np.array([t.location for t in self.tracks], dtype=np.float32)
+
+        # Boxes are (top, right, bottom, left)
+        top = np.maximum(boxes[:, None, 0], trackBoxes[None, :, 0])
+        right = np.minimum(boxes[:, None, 1], trackBoxes[None, :, 1])
+        bottom = np.minimum(boxes[:, None, 2], trackBoxes[None, :, 2])
+        left = np.maximum(boxes[:, None, 3], trackBoxes[None, :, 3])
+        intersection = np.clip(right - left, 0, None) * np.clip(bottom - top, 0, None)
+
+        area = (boxes[:, 1] - boxes[:, 3]) * (boxes[:, 2] - boxes[:, 0])
+        trackArea = (trackBoxes[:, 1] - trackBoxes[:, 3]) * (trackBoxes[:, 2] - trackBoxes[:, 0])
+        union = area[:, None] + trackArea[None, :] - intersection
+        iou = intersection / np.maximum(union, 1e-6)
+
+        center = np.stack([(boxes[:, 1] + boxes[:, 3]) / 2, (boxes[:, 0] + boxes[:, 2]) / 2], axis=1)
+        trackCenter = np.stack([(trackBoxes[:, 1] + trackBoxes[:, 3]) / 2, (trackBoxes[:, 0] + trackBoxes[:, 2]) / 2], axis=1)
+        trackSize = np.sqrt(np.maximum(trackArea, 1e-6))
+        centerDistance = np.linalg.norm(center[:, None, :] - trackCenter[None, :, :], axis=2) / trackSize[None, :]
+
+        valid = (iou >= self.iouThreshold) | (centerDistance <= self.centerDistanceThreshold)
+        cost = np.where(valid, iou - centerDistance, -np.inf)
+
+        assignment = {}
+        usedTracks = set()
+        for flatIdx in np.argsort(-cost, axis=None):
+            boxIdx, trackIdx = [int(i) for i in np.unravel_index(flatIdx, cost.shape)]
+            if not np.isfinite(cost[boxIdx, trackIdx]):
+                break
+            if boxIdx in assignment or trackIdx in usedTracks:
+                continue
+            assignment[boxIdx] = trackIdx
+            usedTracks.add(trackIdx)
+
+        return assignment
+
+
+    def __thumbnail(self, frame, location):
+        top, right, bottom, left = location
+        top, left = max(top, 0), max(left, 0)
+        crop = frame[top:bottom, left:right]
+        if crop.size == 0:
+            return None
+        gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+        return cv2.resize(gray, self.thumbnailSize, interpolation=cv2.INTER_AREA)
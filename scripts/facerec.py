@@ -5,7 +5,7 @@ import cv2
 import sys
 from std_msgs.msg import String
 from sensor_msgs.msg import Image
-from cv_bridge import CvBridge, CvBridgeError
+from imageConversionModule import imageDecoder
 from facerecModule import *
 
 
@@ -23,7 +23,7 @@ class Reid:
         self.known_face_encodings = []
         self.known_face_names = []
         
-        self.bridge = CvBridge()
+        self.decoder = imageDecoder(writable=True, reuseBuffer=False)
 
         # Subscribe to Camera Topic
         self.image_sub = rospy.Subscriber("/camera/color/image_raw", Image, self.imgCallback)
@@ -57,10 +57,9 @@ class Reid:
                 
 
     def imgCallback(self, data):
-        try:
-            self.img = self.bridge.imgmsg_to_cv2(data, "bgr8")
-        except CvBridgeError as e:
-            print(e)
+        img = self.decoder.decode(data)
+        if img is not None:
+            self.img = img
 
 
 
@@ -36,7 +36,28 @@ def drawRectangleAroundFace(frame, current_detection, face_boundary, offset):
     return frame
 
 
-def faceRecognition(frame, known_face_encodings, known_face_names, use_distance = False):
+def matchFaceEncoding(face_encoding, known_face_encodings, known_face_names, use_distance = False):
+    # See if the face is a match for the known face(s)
+    matches = face_recognition.compare_faces(known_face_encodings, face_encoding)
+    name = "Unknown"
+
+    if ~use_distance:
+        # # If a match was found in known_face_encodings, just use the first one.
+        if True in matches:
+            first_match_index = matches.index(True)
+            name = known_face_names[first_match_index]
+    else:
+        # Or instead, use the known face with the smallest distance to the new face
+        face_distances = face_recognition.face_distance(known_face_encodings, face_encoding)
+        if face_distances != []:
+            best_match_index = np.argmin(face_distances)
+            if matches[best_match_index]:
+                name = known_face_names[best_match_index]
+
+    return name
+
+
+def faceRecognition(frame, known_face_encodings, known_face_names, use_distance = False, return_encodings = False):
     
     face_locations = []
     face_encodings = []
@@ -48,24 +69,37 @@ def faceRecognition(frame, known_face_encodings, known_face_names, use_distance
     
     face_names = []
     for face_encoding in face_encodings:
-        # See if the face is a match for the known face(s)
-        matches = face_recognition.compare_faces(known_face_encodings, face_encoding)
-        name = "Unknown"
-
-        if ~use_distance:
-            # # If a match was found in known_face_encodings, just use the first one.
-            if True in matches:
-                first_match_index = matches.index(True)
-                name = known_face_names[first_match_index]
-        else:
-            # Or instead, use the known face with the smallest distance to the new face
-            face_distances = face_recognition.face_distance(known_face_encodings, face_encoding)
-            if face_distances != []:
-                best_match_index = np.argmin(face_distances)
-                if matches[best_match_index]:
-                    name = known_face_names[best_match_index]
-
+        name = matchFaceEncoding(face_encoding, known_face_encodings, known_face_names, use_distance)
         face_names.append(name)
         # print(name)
 
-    return face_locations, face_names
\ No newline at end of file
+    if return_encodings:
+        return face_locations, face_names, face_encodings
+
+    return face_locations, face_names
+
+
+def faceRecognitionTracked(frame, tracker, known_face_encodings, known_face_names, use_distance = False):
+    # Faces are still detected every frame, but encodings are only computed for new tracks,
+    # every tracker.reencodePeriod frames or when the appearance of the face changed
+    face_locations = face_recognition.face_locations(frame)
+    tracks = tracker.update(frame, face_locations)
+
+    staleTracks = [t for t in tracks if tracker.needsEncoding(t)]
+    if staleTracks != []:
+        face_encodings = face_recognition.face_encodings(frame, [t.location for t in staleTracks])
+        for track, face_encoding in zip(staleTracks, face_encodings):
+            tracker.setEncoding(frame, track, face_encoding)
+
+    tracker.encodingsComputed += len(staleTracks)
+    tracker.encodingsSkipped += len(tracks) - len(staleTracks)
+
+    face_names = []
+    for track in tracks:
+        # Matching a cached encoding is cheap, so unknown tracks are matched again every frame
+        # in case the person was meanwhile added to the encoder
+        if track.encoding is not None and (track.updated or track.name == "Unknown"):
+            track.name = matchFaceEncoding(track.encoding, known_face_encodings, known_face_names, use_distance)
+        face_names.append(track.name)
+
+    return face_locations, face_names, tracks
\ No newline at end of file
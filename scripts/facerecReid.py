@@ -5,7 +5,7 @@ import rospkg
 import cv2
 from std_msgs.msg import String
 from sensor_msgs.msg import Image
-from cv_bridge import CvBridge, CvBridgeError
+from imageConversionModule import imageDecoder
 
 from PIL import Image as imgPil
 from facerecModule import *
@@ -29,7 +29,7 @@ class Reid:
         self.known_face_encodings = []
         self.known_face_names = []
         
-        self.bridge = CvBridge()
+        self.decoder = imageDecoder(writable=True, reuseBuffer=False)
 
         # Subscribe to Camera Topic
         self.image_sub = rospy.Subscriber("/camera/color/image_raw", Image, self.imgCallback)
@@ -94,11 +94,10 @@ class Reid:
         return detectionResult
 
     def imgCallback(self, data):
-        try:
-            self.img = self.bridge.imgmsg_to_cv2(data, "bgr8")
+        img = self.decoder.decode(data)
+        if img is not None:
+            self.img = img
             self.ctr = True
-        except CvBridgeError as e:
-            print(e)
 
 
 
@@ -0,0 +1,251 @@
+import numpy as np
+import os
+import threading
+import time
+from collections import OrderedDict
+from scipy.cluster.hierarchy import linkage, fcluster
+
+
+class galleryIdentity():
+    def __init__(self, personId, encoding, record, imageFile):
+        self.personId = personId
+        self.encodings = [encoding]
+        self.record = record
+        self.imageFiles = [imageFile] if imageFile is not None else []
+        self.enrolledAt = time.time()
+        self.lastSeen = self.enrolledAt
+        # Pinned identities (e.g., named guests) are never evicted nor merged into other identities
+        self.pinned = False
+
+
+class faceGallery():
+    '''
+    description: known face encodings grouped by identity. Duplicated identities can be merged by compact(),
+                 the merged ids stay resolvable through the alias map. enforceLimits() evicts the least recently
+                 seen identities when the gallery goes over its caps
+    '''
+    def __init__(self, mergeDistance = 0.5, maxEmbeddingsPerIdentity = 5, maxIdentities = 0, maxImageBytes = 0):
+        # Faces closer than mergeDistance (same metric as face_recognition.face_distance) are the same person
+        self.mergeDistance = mergeDistance
+        self.maxEmbeddingsPerIdentity = maxEmbeddingsPerIdentity
+        # Caps on the number of identities and on the size of their images on disk (0 means no limit)
+        self.maxIdentities = maxIdentities
+        self.maxImageBytes = maxImageBytes
+        self.lock = threading.RLock()
+        self.reset()
+
+
+    def reset(self):
+        with self.lock:
+            self.identities = OrderedDict()
+            self.aliases = {}
+            self.mergedIdentities = 0
+            self.evictedIdentities = 0
+            self.evictedImages = 0
+            self.evictedBytes = 0
+            self.__rebuild()
+
+
+    def add(self, personId, encoding, record, imageFile = None):
+        with self.lock:
+            self.identities[personId] = galleryIdentity(personId, encoding, record, imageFile)
+            self.__rebuild()
+
+
+    def pin(self, personId):
+        with self.lock:
+            identity = self.identities.get(self.resolve(personId))
+            if identity is None:
+                return False
+            identity.pinned = True
+            return True
+
+
+    def getEncodings(self):
+        # The lists are rebuilt (never modified in place) so they can be used without holding the lock
+        with self.lock:
+            return self.known_face_encodings, self.known_face_names
+
+
+    def resolve(self, personId):
+        with self.lock:
+            while personId in self.aliases:
+                personId = self.aliases[personId]
+            return personId
+
+
+    def getRecord(self, personId):
+        with self.lock:
+            identity = self.identities.get(self.resolve(personId))
+            return identity.record if identity is not None else None
+
+
+    def records(self):
+        with self.lock:
+            return [identity.record for identity in self.identities.values()]
+
+
+    def getAliases(self):
+        with self.lock:
+            return {alias: self.resolve(alias) for alias in self.aliases}
+
+
+    def touch(self, personId):
+        with self.lock:
+            identity = self.identities.get(self.resolve(personId))
+            if identity is not None:
+                identity.lastSeen = time.time()
+
+
+    def compact(self):
+        """
+        Clusters the identities (agglomerative clustering on the distance between their mean encodings) and merges each cluster into a single identity.
+
+        :return merges: (list) (mergedId, survivorId) pairs.
+        """
+        # Clustering runs on a snapshot, so the detection loop is only blocked while the merges are applied
+        with self.lock:
+            snapshot = [(personId, np.mean(identity.encodings, axis=0)) for personId, identity in self.identities.items()]
+
+        if len(snapshot) < 2:
+            return []
+
+        centroids = np.array([c for _, c in snapshot])
+        clusterLabels = fcluster(linkage(centroids, method='average', metric='euclidean'), t=self.mergeDistance, criterion='distance')
+
+        clusters = {}
+        for (personId, _), label in zip(snapshot, clusterLabels):
+            clusters.setdefault(label, []).append(personId)
+
+        merges = []
+        with self.lock:
+            for personIds in clusters.values():
+                personIds = [p for p in personIds if p in self.identities]
+                if len(personIds) < 2:
+                    continue
+
+                survivorId = self.chooseSurvivor(personIds)
+                survivor = self.identities[survivorId]
+                for personId in personIds:
+                    if personId == survivorId:
+                        continue
+                    identity = self.identities[personId]
+                    if identity.pinned:
+                        # Two named guests are never merged together
+                        continue
+                    del self.identities[personId]
+                    survivor.encodings.extend(identity.encodings)
+                    survivor.imageFiles.extend(identity.imageFiles)
+                    survivor.lastSeen = max(survivor.lastSeen, identity.lastSeen)
+                    self.aliases[personId] = survivorId
+                    merges.append((personId, survivorId))
+
+                survivor.encodings = self.selectRepresentatives(survivor.encodings)
+
+            self.mergedIdentities += len(merges)
+            if merges != []:
+                self.__rebuild()
+
+        return merges
+
+
+    def chooseSurvivor(self, personIds):
+        # Pinned identities keep their id, otherwise the identity enrolled first does
+        return min(personIds, key=lambda p: (not self.identities[p].pinned, self.identities[p].enrolledAt))
+
+
+    def enforceLimits(self):
+        """
+        Evicts the least recently seen identities that are not pinned until the gallery is within its caps.
+        When only the images go over their cap, the images of those identities are deleted but the identities are kept.
+
+        :return evicted: (list) Ids of the evicted identities.
+        """
+        evicted = []
+        with self.lock:
+            for identity in self.identities.values():
+                if len(identity.encodings) > self.maxEmbeddingsPerIdentity:
+                    identity.encodings = self.selectRepresentatives(identity.encodings)
+                    self.__rebuild()
+
+            lru = sorted([i for i in self.identities.values() if not i.pinned], key=lambda i: i.lastSeen)
+
+            if self.maxIdentities > 0:
+                while len(self.identities) > self.maxIdentities and lru != []:
+                    identity = lru.pop(0)
+                    self.__removeImages(identity)
+                    del self.identities[identity.personId]
+                    evicted.append(identity.personId)
+
+                if evicted != []:
+                    self.evictedIdentities += len(evicted)
+                    # Aliases of evicted identities can not be resolved anymore
+                    self.aliases = {alias: personId for alias, personId in self.aliases.items() if self.resolve(personId) in self.identities}
+                    self.__rebuild()
+
+            if self.maxImageBytes > 0:
+                totalBytes = sum(self.__imageBytes(i) for i in self.identities.values())
+                for identity in lru:
+                    if totalBytes <= self.maxImageBytes:
+                        break
+                    totalBytes -= self.__removeImages(identity)
+
+        return evicted
+
+
+    def stats(self):
+        with self.lock:
+            return {
+                'identities': len(self.identities),
+                'embeddings': len(self.known_face_encodings),
+                'pinned': sum(1 for i in self.identities.values() if i.pinned),
+                'aliases': len(self.aliases),
+                'merged_identities': self.mergedIdentities,
+                'evicted_identities': self.evictedIdentities,
+                'evicted_images': self.evictedImages,
+                'evicted_bytes': self.evictedBytes,
+            }
+
+
+    def selectRepresentatives(self, encodings):
+        # Farthest point sampling keeps the most diverse encodings (poses, lighting) of the identity
+        if len(encodings) <= self.maxEmbeddingsPerIdentity:
+            return encodings
+
+        points = np.array(encodings)
+        selected = [0]
+        distances = np.linalg.norm(points - points[0], axis=1)
+        while len(selected) < self.maxEmbeddingsPerIdentity:
+            idx = int(np.argmax(distances))
+            selected.append(idx)
+            distances = np.minimum(distances, np.linalg.norm(points - points[idx], axis=1))
+
+        return [encodings[i] for i in selected]
+
+
+    def __imageBytes(self, identity):
+        return sum(os.path.getsize(f) for f in identity.imageFiles if os.path.isfile(f))
+
+
+    def __removeImages(self, identity):
+        removedBytes = 0
+        for f in identity.imageFiles:
+            if os.path.isfile(f):
+                removedBytes += os.path.getsize(f)
+                os.remove(f)
+                self.evictedImages += 1
+        self.evictedBytes += removedBytes
+        identity.imageFiles = []
+        return removedBytes
+
+
+    def __rebuild(self):
+        encodings = []
+        names = []
+        for personId, identity in self.identities.items():
+            for encoding in identity.encodings:
+                encodings.append(encoding)
+                names.append(personId)
+
+        self.known_face_encodings = encodings
+        self.known_face_names = names
@@ -0,0 +1,114 @@
+import bisect
+import threading
+
+
+def messageStamp(msg, default = None):
+    # Header stamp in seconds, or the default (e.g., the receipt time) for messages without header
+    header = getattr(msg, 'header', None)
+    if header is not None:
+        return header.stamp.to_sec()
+    return default
+
+
+class stampedHistory():
+    '''
+    description: bounded buffer of messages sorted by stamp. Lookups are binary searches, so looking for the message
+                 closest to a given time (e.g., the detections of the frame where the pointing line was computed) is O(log n)
+    '''
+    def __init__(self, maxSize = 100):
+        self.maxSize = maxSize
+        self.stamps = []
+        self.msgs = []
+        self.lock = threading.Lock()
+
+
+    def add(self, stamp, msg):
+        with self.lock:
+            if self.stamps == [] or stamp >= self.stamps[-1]:
+                self.stamps.append(stamp)
+                self.msgs.append(msg)
+            else:
+                # Out of order messages (e.g., several publishers) are inserted in place
+                idx = bisect.bisect_right(self.stamps, stamp)
+                self.stamps.insert(idx, stamp)
+                self.msgs.insert(idx, msg)
+
+            if len(self.stamps) > self.maxSize:
+                excess = len(self.stamps) - self.maxSize
+                del self.stamps[:excess]
+                del self.msgs[:excess]
+
+
+    def clear(self):
+        with self.lock:
+            self.stamps = []
+            self.msgs = []
+
+
+    def __len__(self):
+        return len(self.stamps)
+
+
+    def latest(self):
+        with self.lock:
+            if self.stamps == []:
+                return None
+            return self.stamps[-1], self.msgs[-1]
+
+
+    def nearest(self, stamp, tolerance = None):
+        """
+        It returns the message with the stamp closest to the given one.
+
+        :param stamp: (float) Time in seconds.
+        :param tolerance: (float) If given, messages further than tolerance seconds are ignored.
+
+        :return stamp, msg: The stamp and the message, or None if there is no message within the tolerance.
+        """
+        with self.lock:
+            idx = bisect.bisect_left(self.stamps, stamp)
+            candidates = [i for i in (idx - 1, idx) if 0 <= i < len(self.stamps)]
+            if candidates == []:
+                return None
+
+            best = min(candidates, key=lambda i: abs(self.stamps[i] - stamp))
+            if tolerance is not None and abs(self.stamps[best] - stamp) > tolerance:
+                return None
+            return self.stamps[best], self.msgs[best]
+
+
+    def before(self, stamp):
+        # Latest message stamped at or before the given time
+        with self.lock:
+            idx = bisect.bisect_right(self.stamps, stamp) - 1
+            if idx < 0:
+                return None
+            return self.stamps[idx], self.msgs[idx]
+
+
+    def between(self, start, end):
+        # Messages stamped in [start, end], oldest first
+        with self.lock:
+            i = bisect.bisect_left(self.stamps, start)
+            j = bisect.bisect_right(self.stamps, end)
+            return list(zip(self.stamps[i:j], self.msgs[i:j]))
+
+
+def joinNearest(left, right, tolerance, start = None, end = None):
+    """
+    It pairs each message of the left history (within [start, end]) with the message of the right history closest in time.
+
+    :param left, right: (stampedHistory) Histories to join.
+    :param tolerance: (float) Maximum stamp difference in seconds of a pair.
+
+    :return pairs: (list) (stamp, leftMsg, rightMsg) tuples, oldest first. Left messages without a match are skipped.
+    """
+    start = float('-inf') if start is None else start
+    end = float('inf') if end is None else end
+
+    pairs = []
+    for stamp, msg in left.between(start, end):
+        match = right.nearest(stamp, tolerance)
+        if match is not None:
+            pairs.append((stamp, msg, match[1]))
+    return pairs
@@ -2,9 +2,12 @@ import cv2
 import mediapipe as mp
 import math
 import numpy as np
-import pandas as pd
-from PIL import Image as IMG
-from PIL import ImageEnhance
+from lazyImportModule import lazyModule
+
+# Only needed by the sweater color helpers
+pd = lazyModule("pandas")
+IMG = lazyModule("PIL.Image")
+ImageEnhance = lazyModule("PIL.ImageEnhance")
 
 
 class tridimensionalInfo():
@@ -32,6 +35,12 @@ class holisticDetector():
         self.leftHandReturnMsg = "Left Hand"
 
 
+    def reset(self):
+        # The graph forgets the landmarks tracked in the previous frames, the models stay loaded
+        self.holistic.reset()
+        self.results = None
+
+
     def find(self, img, pose, face, rightHand, leftHand):
         imgRGB = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
         self.results = self.holistic.process(imgRGB)
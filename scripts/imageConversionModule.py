@@ -0,0 +1,140 @@
+import cv2
+import numpy as np
+
+
+# Channels and dtype of the raw encodings that can be viewed without any conversion
+rawEncodings = {
+    'bgr8': (3, np.uint8),
+    'rgb8': (3, np.uint8),
+    'bgra8': (4, np.uint8),
+    'rgba8': (4, np.uint8),
+    'mono8': (1, np.uint8),
+    '8UC1': (1, np.uint8),
+    '8UC3': (3, np.uint8),
+    'mono16': (1, np.uint16),
+    '16UC1': (1, np.uint16),
+    '32FC1': (1, np.float32),
+}
+
+# Conversions to bgr8
+toBgr = {
+    'rgb8': cv2.COLOR_RGB2BGR,
+    'bgra8': cv2.COLOR_BGRA2BGR,
+    'rgba8': cv2.COLOR_RGBA2BGR,
+    'mono8': cv2.COLOR_GRAY2BGR,
+    '8UC1': cv2.COLOR_GRAY2BGR,
+}
+
+# Reduced-resolution decoding. For JPEG, the decoder skips the discarded DCT coefficients, so it is much cheaper than a full decode
+reducedColorFlags = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+def imageView(msg):
+    """
+    It returns a NumPy view over the data of a raw sensor_msgs/Image, without copying it. The view is read-only.
+
+    :param msg: (Image.msg) Raw image with one of the encodings of rawEncodings.
+
+    :return img: (np.array) HxW or HxWxC array, or None if the encoding is not supported.
+    """
+    if msg.encoding not in rawEncodings:
+        return None
+
+    channels, dtype = rawEncodings[msg.encoding]
+    dtype = np.dtype(dtype).newbyteorder('>' if msg.is_bigendian else '<')
+
+    # The strides skip the padding at the end of each row (step > width * channels * itemsize)
+    shape = (msg.height, msg.width, channels) if channels > 1 else (msg.height, msg.width)
+    strides = (msg.step, channels * dtype.itemsize, dtype.itemsize)[:len(shape)]
+    img = np.ndarray(shape, dtype=dtype, buffer=msg.data, strides=strides)
+    if isinstance(msg.data, (bytearray, memoryview)):
+        # Only bytes buffers are read-only by themselves
+        img.flags.writeable = False
+    return img
+
+
+class imageDecoder():
+    '''
+    description: converts Image and CompressedImage messages into bgr8 arrays. Raw bgr8 images are returned as views
+                 over the message data, other conversions and resizes are written into a preallocated buffer reused
+                 between frames. Compressed images can be decoded at 1/2, 1/4 or 1/8 of their resolution
+    '''
+    def __init__(self, scale = 1, writable = False, reuseBuffer = True):
+        # Downscale factor (1, 2, 4 or 8) applied to every decoded frame
+        self.scale = scale
+        # Views over the message data are read-only. Stages that draw on the frame need a writable copy
+        self.writable = writable
+        # With a reused buffer, the previous frame is overwritten by the next decode. Only use it when the frames are
+        # decoded and consumed by the same thread
+        self.reuseBuffer = reuseBuffer
+        self.buffer = None
+
+
+    def decode(self, msg, scale = None):
+        """
+        It converts an image message into a bgr8 array.
+
+        :param msg: (Image.msg or CompressedImage.msg) Image to convert.
+        :param scale: (int) Downscale factor (1, 2, 4 or 8). If None, the decoder scale is used.
+
+        :return img: (np.array) HxWx3 bgr8 image, or None if the message could not be converted.
+        """
+        scale = self.scale if scale is None else scale
+        if scale not in reducedColorFlags:
+            raise ValueError("Unsupported scale: " + str(scale))
+
+        if hasattr(msg, 'format'):
+            return self.__decodeCompressed(msg, scale)
+        return self.__decodeRaw(msg, scale)
+
+
+    def __decodeCompressed(self, msg, scale):
+        img = cv2.imdecode(np.frombuffer(msg.data, dtype=np.uint8), reducedColorFlags[scale])
+        # imdecode always allocates a new writable array
+        return img
+
+
+    def __decodeRaw(self, msg, scale):
+        img = imageView(msg)
+        if img is None or img.dtype.itemsize != 1:
+            return None
+
+        h, w = img.shape[:2]
+        if scale > 1:
+            # Resized first, so the color conversion runs on the small image
+            h, w = h // scale, w // scale
+            if msg.encoding not in toBgr:
+                return self.__downscale(img, scale, self.__getBuffer(h, w))
+            img = self.__downscale(img, scale)
+
+        if msg.encoding in toBgr:
+            return cv2.cvtColor(img, toBgr[msg.encoding], dst=self.__getBuffer(h, w))
+
+        # bgr8 / 8UC3
+        if not self.writable:
+            return img
+        out = self.__getBuffer(h, w)
+        np.copyto(out, img)
+        return out
+
+
+    def __downscale(self, img, scale, dst = None):
+        # Successive halvings, OpenCV only has a fast area interpolation for a factor of 2
+        while scale > 1:
+            h, w = img.shape[0] // 2, img.shape[1] // 2
+            img = cv2.resize(img, (w, h), dst=dst if scale == 2 else None, interpolation=cv2.INTER_AREA)
+            scale //= 2
+        return img
+
+
+    def __getBuffer(self, h, w):
+        if not self.reuseBuffer:
+            return np.empty((h, w, 3), dtype=np.uint8)
+        if self.buffer is None or self.buffer.shape != (h, w, 3):
+            self.buffer = np.empty((h, w, 3), dtype=np.uint8)
+        return self.buffer
@@ -0,0 +1,265 @@
+import io
+import os
+from collections import OrderedDict
+import numpy as np
+from csvModule import metaName, readMeta
+
+
+# Label columns indexed by default: the pointing direction of the holistic node, the identities of the reid node and the
+# object classes of the detection relay
+defaultLabelColumns = {
+    "holistic": ["pointing_direction"],
+    "reid": ["id", "gender", "age_range"],
+    "objects": ["class_name"],
+}
+
+
+class labelIndex():
+    '''
+    description: inverted index of a label column: for every label, the sorted global rows where it was logged
+    '''
+    def __init__(self, keys, starts, rows, chunks):
+        self.keys = keys
+        self.starts = starts
+        self.rows = rows
+        # Number of chunks already indexed
+        self.chunks = chunks
+
+
+    def lookup(self, key):
+        i = np.searchsorted(self.keys, key)
+        if i == len(self.keys) or self.keys[i] != key:
+            return self.rows[:0]
+        return self.rows[self.starts[i]:self.starts[i + 1]]
+
+
+    def counts(self):
+        return dict(zip(self.keys.tolist(), np.diff(self.starts).tolist()))
+
+
+    def extend(self, values, rows, chunks):
+        # The previous postings are expanded and merged with the new rows. A stable sort keeps the rows of each label sorted
+        oldValues = np.repeat(self.keys, np.diff(self.starts))
+        keys, codes = np.unique(np.concatenate([oldValues, values]), return_inverse=True)
+        allRows = np.concatenate([self.rows, rows])
+        order = np.argsort(codes, kind='stable')
+        starts = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=len(keys)))])
+        return labelIndex(keys, starts.astype(np.int64), allRows[order], chunks)
+
+
+    @staticmethod
+    def empty():
+        return labelIndex(np.array([], dtype=str), np.zeros(1, dtype=np.int64), np.array([], dtype=np.int64), 0)
+
+
+    @staticmethod
+    def load(fileName):
+        with np.load(fileName) as data:
+            return labelIndex(data["keys"], data["starts"], data["rows"], int(data["chunks"]))
+
+
+    def save(self, fileName):
+        # Written to a temporary file and renamed, so readers never load a partial index
+        buffer = io.BytesIO()
+        np.savez(buffer, keys=self.keys, starts=self.starts, rows=self.rows, chunks=self.chunks)
+        with open(fileName + ".tmp", "wb") as f:
+            f.write(buffer.getvalue())
+        os.replace(fileName + ".tmp", fileName)
+
+
+class landmarkArchive():
+    '''
+    description: queries over the logs of a columnarLogger (landmarks, body lengths and pointing results of the holistic
+                 node, reid detections, object detections). Label columns (identity, pointing direction, object class)
+                 have inverted indexes saved next to the chunks and updated incrementally. Time queries use the stamp
+                 range of every chunk. Chunks are memory-mapped, so only the rows that are used are read from disk
+    '''
+    def __init__(self, directory, labelColumns = None, maxOpenColumns = 256):
+        self.directory = directory
+        self.labelColumns = defaultLabelColumns if labelColumns is None else labelColumns
+        self.maxOpenColumns = maxOpenColumns
+        self.streams = {}
+        # Memory maps of the most recently used chunk columns. Each map keeps a file descriptor, so their number is bounded
+        self.openColumns = OrderedDict()
+        self.refresh()
+
+
+    def refresh(self):
+        """
+        It loads the chunks logged since the last call and updates the label indexes (saved as index_<column>.npz in the stream folder).
+        """
+        names = sorted(f for f in os.listdir(self.directory) if os.path.isfile(os.path.join(self.directory, f, metaName)))
+        for name in names:
+            meta = readMeta(self.directory, name)
+            chunks = meta["chunks"]
+            previous = self.streams.get(name)
+            stream = {
+                "columns": {c[0]: (np.dtype(c[1]), tuple(c[2])) for c in meta["columns"]},
+                "chunks": chunks,
+                # Global row of the first row of every chunk, plus the total number of rows
+                "offsets": np.concatenate([[0], np.cumsum([c["rows"] for c in chunks])]).astype(np.int64),
+                "firstStamps": np.array([c["first_stamp"] for c in chunks]),
+                "lastStamps": np.array([c["last_stamp"] for c in chunks]),
+                "indexes": {},
+            }
+            self.streams[name] = stream
+
+            for column in self.labelColumns.get(name, []):
+                if column in stream["columns"]:
+                    index = previous["indexes"].get(column) if previous is not None else None
+                    stream["indexes"][column] = self.__updateIndex(name, stream, column, index)
+
+
+    def rows(self, stream):
+        return int(self.streams[stream]["offsets"][-1])
+
+
+    def labels(self, stream, column):
+        """
+        :return counts: (dict) Number of rows of every label of an indexed column.
+        """
+        return self.streams[stream]["indexes"][column].counts()
+
+
+    def select(self, stream, where = None, ranges = None, start = None, end = None):
+        """
+        It returns the rows matching all the given conditions, e.g. select("holistic", {"pointing_direction": "left"}, {"left_arm_length": (0.5, None)})
+        or select("reid", {"id": "H3"}).
+
+        :param stream: (string) Stream name.
+        :param where: (dict) Label of indexed columns. A list of labels matches any of them.
+        :param ranges: (dict) (min, max) of scalar columns, None meaning no bound. Rows with NaN never match.
+        :param start: (float) Oldest stamp. If None, there is no lower bound.
+        :param end: (float) Newest stamp. If None, there is no upper bound.
+
+        :return rows: (np.array) Sorted global rows.
+        """
+        s = self.streams[stream]
+        rows = None
+        for column, labels in (where or {}).items():
+            if column not in s["indexes"]:
+                raise ValueError("Column %s of stream %s is not indexed" % (column, stream))
+            labels = labels if isinstance(labels, (list, tuple, set)) else [labels]
+            found = np.unique(np.concatenate([s["indexes"][column].lookup(l) for l in labels]))
+            rows = found if rows is None else np.intersect1d(rows, found, assume_unique=True)
+
+        conditions = dict(ranges or {})
+        if start is not None or end is not None:
+            conditions["stamp"] = (start, end)
+        if conditions == {}:
+            return np.arange(self.rows(stream)) if rows is None else rows
+
+        for column in conditions:
+            if s["columns"][column][1] != ():
+                raise ValueError("Column %s of stream %s is not a scalar" % (column, stream))
+
+        selected = []
+        for i in self.__chunksInTime(s, start, end):
+            first, last = s["offsets"][i], s["offsets"][i + 1]
+            if rows is None:
+                local = None
+            else:
+                local = rows[np.searchsorted(rows, first):np.searchsorted(rows, last)] - first
+                if len(local) == 0:
+                    continue
+
+            keep = None
+            for column, (low, high) in conditions.items():
+                values = self.__column(stream, i, column)
+                values = values if local is None else values[local]
+                match = np.ones(len(values), dtype=bool)
+                if low is not None:
+                    match &= values >= low
+                if high is not None:
+                    match &= values <= high
+                keep = match if keep is None else keep & match
+
+            selected.append(first + (np.flatnonzero(keep) if local is None else local[keep]))
+
+        return np.concatenate(selected) if selected != [] else np.array([], dtype=np.int64)
+
+
+    def get(self, stream, rows, columns = None):
+        """
+        It gathers the values of some rows (e.g., returned by select).
+
+        :param stream: (string) Stream name.
+        :param rows: (np.array) Sorted global rows.
+        :param columns: (list) Names of the columns. If None, all the columns are returned.
+
+        :return values: (dict) One array per column, with one row per requested row.
+        """
+        s = self.streams[stream]
+        columns = list(s["columns"]) if columns is None else columns
+        chunkOfRow = np.searchsorted(s["offsets"], rows, side='right') - 1
+
+        parts = {c: [] for c in columns}
+        for i in np.unique(chunkOfRow):
+            local = rows[chunkOfRow == i] - s["offsets"][i]
+            for c in columns:
+                parts[c].append(self.__column(stream, i, c)[local])
+
+        result = {}
+        for c in columns:
+            dtype, shape = s["columns"][c]
+            result[c] = np.concatenate(parts[c]) if parts[c] != [] else np.empty((0,) + shape, dtype=dtype)
+        return result
+
+
+    def slices(self, stream, column, start = None, end = None):
+        """
+        It returns the values of a column in a time range without copying them.
+
+        :return views: (list) (stamps, values) memory-mapped views, one pair per chunk.
+        """
+        s = self.streams[stream]
+        views = []
+        for i in self.__chunksInTime(s, start, end):
+            stamps = self.__column(stream, i, "stamp")
+            keep = np.flatnonzero((stamps >= (start if start is not None else -np.inf)) & (stamps <= (end if end is not None else np.inf)))
+            if len(keep) == 0:
+                continue
+            # The rows of a chunk are logged in time order, so the range is contiguous
+            first, last = keep[0], keep[-1] + 1
+            views.append((stamps[first:last], self.__column(stream, i, column)[first:last]))
+        return views
+
+
+    def __chunksInTime(self, s, start, end):
+        keep = np.ones(len(s["chunks"]), dtype=bool)
+        if start is not None:
+            keep &= s["lastStamps"] >= start
+        if end is not None:
+            keep &= s["firstStamps"] <= end
+        return np.flatnonzero(keep)
+
+
+    def __column(self, stream, chunk, column):
+        key = (stream, chunk, column)
+        values = self.openColumns.get(key)
+        if values is None:
+            fileName = os.path.join(self.directory, stream, self.streams[stream]["chunks"][chunk]["file"], column + ".npy")
+            values = np.load(fileName, mmap_mode='r')
+            self.openColumns[key] = values
+            if len(self.openColumns) > self.maxOpenColumns:
+                self.openColumns.popitem(last=False)
+        else:
+            self.openColumns.move_to_end(key)
+        return values
+
+
+    def __updateIndex(self, name, stream, column, index):
+        fileName = os.path.join(self.directory, name, "index_" + column + ".npz")
+        if index is None:
+            index = labelIndex.load(fileName) if os.path.isfile(fileName) else labelIndex.empty()
+
+        chunks = stream["chunks"]
+        if index.chunks == len(chunks):
+            return index
+
+        # Only the chunks logged after the last update are read
+        values = [self.__column(name, i, column) for i in range(index.chunks, len(chunks))]
+        rows = np.arange(stream["offsets"][index.chunks], stream["offsets"][-1], dtype=np.int64)
+        index = index.extend(np.concatenate(values), rows, len(chunks))
+        index.save(fileName)
+        return index
@@ -0,0 +1,30 @@
+import importlib
+import threading
+
+
+class lazyModule():
+    '''
+    description: stands for a module that is only imported on the first attribute access, so optional or rarely used
+                 dependencies (e.g., msal, pandas, the detectron messages) do not slow down the import of the scripts using them
+    '''
+    def __init__(self, name):
+        self.__name = name
+        self.__module = None
+        self.__lock = threading.Lock()
+
+
+    def load(self):
+        # Imported once, concurrent first uses wait for the same import
+        if self.__module is None:
+            with self.__lock:
+                if self.__module is None:
+                    self.__module = importlib.import_module(self.__name)
+        return self.__module
+
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+
+    def __repr__(self):
+        return "<lazy module '%s'%s>" % (self.__name, "" if self.__module is None else " (loaded)")
@@ -0,0 +1,55 @@
+import numpy as np
+
+
+def encodeMaskRle(mask):
+    """
+    It run-length encodes a binary mask in row-major order. The runs alternate between background and object pixels,
+    starting with background, so the first run is 0 when the mask starts with an object pixel.
+
+    :param mask: (np.array) HxW mask, any non-zero value is an object pixel.
+
+    :return counts: (np.array) Run lengths (uint32).
+    """
+    flat = np.asarray(mask).ravel() != 0
+    if flat.size == 0:
+        return np.zeros(0, dtype=np.uint32)
+
+    changes = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+    boundaries = np.concatenate(([0], changes, [flat.size]))
+    counts = np.diff(boundaries)
+    if flat[0]:
+        counts = np.concatenate(([0], counts))
+    return counts.astype(np.uint32)
+
+
+def decodeMaskRle(counts, height, width, value = 255):
+    """
+    It decodes a mask encoded by encodeMaskRle.
+
+    :param counts: (list) Run lengths.
+    :param height, width: (int) Mask size.
+    :param value: (int) Value of the object pixels.
+
+    :return mask: (np.array) HxW uint8 mask.
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    values = np.zeros(counts.size, dtype=np.uint8)
+    values[1::2] = value
+    flat = np.repeat(values, counts)
+    if flat.size != height * width:
+        raise ValueError("Run lengths do not match the mask size")
+    return flat.reshape(height, width)
+
+
+def cropToBox(mask, x, y, width, height):
+    # The box is clipped to the mask, so boxes slightly outside the image are still valid
+    x0, y0 = max(int(x), 0), max(int(y), 0)
+    x1, y1 = min(int(x) + int(width), mask.shape[1]), min(int(y) + int(height), mask.shape[0])
+    return mask[y0:max(y1, y0), x0:max(x1, x0)], x0, y0
+
+
+def pasteCrop(crop, x, y, height, width):
+    # Full size mask with the crop at (x, y)
+    mask = np.zeros((height, width), dtype=np.uint8)
+    mask[y:y + crop.shape[0], x:x + crop.shape[1]] = crop
+    return mask
@@ -7,7 +7,7 @@ import numpy as np
 
 from std_msgs.msg import String
 from sensor_msgs.msg import Image
-from cv_bridge import CvBridge, CvBridgeError
+from imageConversionModule import imageDecoder
 from holisticDetectorModule import *
 from PIL import Image as imgPil
 from PIL import ImageDraw
@@ -23,7 +23,7 @@ class Holistic:
         self.ctr = True
         self.detector = holisticDetector()
 
-        self.bridge = CvBridge()
+        self.decoder = imageDecoder(writable=True, reuseBuffer=False)
 
         # Subscribe to Camera Topic
         self.image_sub = rospy.Subscriber("/camera/color/image_raw", Image, self.imgCallback)
@@ -53,11 +53,10 @@ class Holistic:
 
 
     def imgCallback(self, data):
-        try:
-            self.img = self.bridge.imgmsg_to_cv2(data, "bgr8")
+        img = self.decoder.decode(data)
+        if img is not None:
+            self.img = img
             self.ctr = True
-        except CvBridgeError as e:
-            print(e)
 
 
     def getFaceMask(self):
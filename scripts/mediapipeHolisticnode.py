@@ -4,17 +4,28 @@ import rospy
 import cv2
 import numpy as np
 import os
+from collections import deque
 import rospkg
 
-from std_msgs.msg import String, Float32
+from std_msgs.msg import String, Float32, Bool
 from sensor_msgs.msg import Image, CompressedImage
-from cv_bridge import CvBridge, CvBridgeError
-from PIL import Image as imgPil
-from facerecModule import *
+from imageConversionModule import imageDecoder
+from eventChannelModule import ackFor
 from holisticDetectorModule import *
-from PIL import ImageDraw
-from scipy.spatial import ConvexHull
-from perception_tests.msg import MediapipePointInfo, MediapipePointInfoArray
+from perception_tests.msg import MediapipePointInfo, MediapipePointInfoArray, PointingLine
+from perception_tests.srv import TriggerProcessing, TriggerProcessingResponse
+from modelLoaderModule import modelLoader
+from nodeStatusModule import nodeStatus
+from triggerModule import processingTrigger
+from profilingModule import loopProfiler
+from csvModule import columnarLogger
+from motionGateModule import motionGate
+from lazyImportModule import lazyModule
+
+# Only needed for the face mask
+imgPil = lazyModule("PIL.Image")
+ImageDraw = lazyModule("PIL.ImageDraw")
+spatial = lazyModule("scipy.spatial")
 
 
 
@@ -30,9 +41,16 @@ class MediapipeHolistic:
         self.rate = rospy.Rate(10)
         self.img = None
         self.ctr = True
-        self.detector = holisticDetector()
+        # Built in the background (see loadModels)
+        self.detector = None
         self.currentEvent = "e_stop"
-        self.bridge = CvBridge()
+        self.events = deque()
+        # Frames are decoded by the run loop into a reused buffer, so the frames that are never processed are never decoded.
+        # The frame is drawn on, hence writable
+        self.decoder = imageDecoder(writable=True)
+        self.imgMsg = None
+        # Header of the decoded image, the stamped outputs carry it so they can be matched with other results of the same frame
+        self.imgHeader = None
         self.directory = rospack.get_path('perception_tests')
 
         # Read from ROS Param
@@ -47,16 +65,22 @@ class MediapipeHolistic:
         self.drawFaceBoundary = rospy.get_param("~drawFaceBoundary")
         self.pointingRightHandMsg = rospy.get_param("~pointing_right_hand_msg")
         self.pointingLeftHandMsg = rospy.get_param("~pointing_left_hand_msg")
+        self.logPath = rospy.get_param("~log_path")
+        self.useMotionGate = rospy.get_param("~motion_gate")
+
+        # Publish the node state and frame rates on ~status
+        self.status = nodeStatus()
 
         # Subscribe to Camera Topic
-        if self.readImgCompressed:
-            self.image_sub = rospy.Subscriber(self.camera_topic, CompressedImage, self.imgCallback)
-        else:
-            self.image_sub = rospy.Subscriber(self.camera_topic, Image, self.imgCallback)
+        self.image_sub = None
+        self.subscribeCamera()
 
         # Subscribe to Event and perform accordingly
         self.event_sub = rospy.Subscriber("~event_in", String, self.eventCallback)
 
+        # Acknowledge the handled events
+        self.eventOut_pub = rospy.Publisher("~event_out", String, queue_size=10)
+
         # Publish Face Landmarks
         self.mp_faceLandmarks_pub = rospy.Publisher("~face_landmarks", MediapipePointInfoArray, queue_size=10)
         
@@ -97,41 +121,150 @@ class MediapipeHolistic:
 
         # Publish Hand Poiting Direction - Direction
         self.mp_pointingDirectionHand_direction_pub = rospy.Publisher("~hand_pointing_direction", String, queue_size=10)
+
+        # Publish Hand Poiting Direction - Slope, intercept and direction stamped with the image
+        self.mp_pointingLine_pub = rospy.Publisher("~hand_pointing_line", PointingLine, queue_size=10)
     
         # Publish Shirt/Sweater Color
         self.mp_sweaterColor_pub = rospy.Publisher("~sweater_color", String, queue_size=10)
 
+        # Publish whether the MediaPipe graph is loaded (latched)
+        self.ready_pub = rospy.Publisher("~ready", Bool, queue_size=1, latch=True)
+        self.ready_pub.publish(False)
+
+        # On demand mode: the frames are only processed when requested through ~trigger
+        self.trigger = processingTrigger()
+        self.trigger_srv = rospy.Service("~trigger", TriggerProcessing, self.triggerCallback)
+
+        # Profile of the run loop between e_profile_start and e_profile_stop, saved in ~/.ros/profiles
+        self.profiler = loopProfiler(os.path.join(rospkg.get_ros_home(), "profiles"), node_name)
+
+        # Landmarks, body metrics and pointing results of every processed frame, saved in the background (disabled if ~log_path is empty)
+        self.logger = None
+        if self.logPath != "":
+            self.logger = columnarLogger(self.logPath)
+            self.logger.addStream("holistic", [("pose_world", "float32", (33, 4)),
+                                               ("pose_img", "float32", (33, 3)),
+                                               ("right_hand", "float32", (21, 2)),
+                                               ("left_hand", "float32", (21, 2)),
+                                               ("face", "float32", (468, 2)),
+                                               ("right_arm_length", "float32", ()),
+                                               ("left_arm_length", "float32", ()),
+                                               ("shoulder_length", "float32", ()),
+                                               ("hip_length", "float32", ()),
+                                               ("torso_length", "float32", ()),
+                                               ("pointing_slope", "float32", ()),
+                                               ("pointing_intercept", "float32", ()),
+                                               ("pointing_direction", "U32", ())])
+
+        # Frames without relevant change since the last processed frame reuse its results (disabled if ~motion_gate is false)
+        self.gate = None
+        if self.useMotionGate:
+            self.gate = motionGate(rospy.get_param("~motion_threshold"), rospy.get_param("~motion_region_threshold"), maxInterval=rospy.get_param("~motion_max_interval"))
+        # Publications of the last processed frame, published again for the reused frames
+        self.lastResults = []
+
+        # The MediaPipe graph is built and warmed up in the background, events are handled in the meantime
+        self.models = modelLoader(self.loadModels, onDone=self.modelsLoaded)
+
     def run(self):
         while not rospy.is_shutdown():
+            # Events are handled one per cycle, in the order they were received, and acknowledged on ~event_out
+            ack = None
+            self.status.eventsPending = len(self.events)
+            if self.currentEvent is None and len(self.events) > 0:
+                self.currentEvent = self.events.popleft()
+                ack = ackFor(self.currentEvent)
+
             if self.currentEvent is not None:
+                if self.currentEvent == "e_on_demand":
+                    self.trigger.onDemand = True
+                    self.currentEvent = None
+                    rospy.loginfo("Processing frames on demand!")
+
+                if self.currentEvent == "e_continuous":
+                    self.trigger.onDemand = False
+                    self.currentEvent = None
+                    rospy.loginfo("Processing frames continuously!")
+
+                if self.currentEvent == "e_profile_start":
+                    self.currentEvent = None
+                    if self.profiler.start():
+                        rospy.loginfo("Profiling started!")
+                    else:
+                        rospy.logwarn("Profiling is already running!")
+
+                if self.currentEvent == "e_profile_stop":
+                    self.currentEvent = None
+                    self.stopProfiling()
+
                 if self.currentEvent == "e_stop":
                     self.currentEvent = None
                     self.img = None
-                    self.image_sub.unregister()
+                    self.imgMsg = None
+                    self.unsubscribeCamera()
                     cv2.destroyAllWindows()
                     rospy.loginfo("Stopping detection!")
 
                 if self.currentEvent == "e_start":
                     self.currentEvent = None
-                    if self.readImgCompressed:
-                        self.image_sub = rospy.Subscriber(self.camera_topic, CompressedImage, self.imgCallback)
-                    else:
-                        self.image_sub = rospy.Subscriber(self.camera_topic, Image, self.imgCallback)
+                    self.resetGate()
+                    self.subscribeCamera()
                     rospy.loginfo("Starting detection!")
 
                 if self.currentEvent == "e_reset":
                     self.img = None
+                    self.imgMsg = None
                     self.ctr = True
-                    self.detector = holisticDetector()
+                    # Only the tracking state is cleared, the graph is not rebuilt
+                    if self.models.isReady():
+                        self.detector.reset()
+                    self.resetGate()
                     self.currentEvent = None
-                    if self.readImgCompressed:
-                        self.image_sub = rospy.Subscriber(self.camera_topic, CompressedImage, self.imgCallback)
-                    else:
-                        self.image_sub = rospy.Subscriber(self.camera_topic, Image, self.imgCallback)
+                    self.subscribeCamera()
                     rospy.loginfo("Reseting!")
 
+                # Unknown events are dropped
+                self.currentEvent = None
+
+            if ack is not None:
+                self.eventOut_pub.publish(ack)
+
+            if not self.models.isReady():
+                # Frames are not decoded until the graph is loaded, the latest one is processed then
+                self.rate.sleep()
+                continue
+
+            if self.trigger.start():
+                # Only the frames received after the request are processed
+                self.imgMsg = None
+                self.ctr = False
+
+            if not self.trigger.shouldProcess():
+                # On demand mode without pending request, the models stay loaded but no frame is processed
+                self.rate.sleep()
+                continue
+
+            if self.ctr and self.imgMsg is not None:
+                imgMsg, self.imgMsg = self.imgMsg, None
+                self.img = self.decoder.decode(imgMsg)
+                self.imgHeader = imgMsg.header
+                if self.img is None:
+                    rospy.logerr("Could not decode img from: " + self.camera_topic)
+
+            if self.img is not None and self.ctr and self.gate is not None and not self.trigger.isActive():
+                # The frames requested through ~trigger (or in on demand mode) are always processed
+                process = self.gate.check(self.img)
+                self.status.sceneChange = self.gate.lastChange
+                if not process:
+                    # Nothing relevant changed since the last processed frame, its results are published again for this frame
+                    self.republishResults()
+                    self.ctr = False
+                    self.status.frameReused(self.imgHeader.stamp)
+
             if self.img is not None:
                 if self.ctr:
+                    self.lastResults = []
                     self.img = self.detector.find(self.img, self.drawPose, self.drawFace, self.drawRightHand, self.drawLeftHand)
 
                     isPoseWorldLandmarks = self.detector.getPoseWorldLandmarks()
@@ -155,23 +288,23 @@ class MediapipeHolistic:
 
 
                     if self.detector.getRightArmLength():
-                        self.mp_rightArmLength_pub.publish(self.detector.getRightArmLength())
+                        self.publishResult(self.mp_rightArmLength_pub, self.detector.getRightArmLength())
 
                     
                     if self.detector.getLeftArmLength():
-                        self.mp_leftArmLength_pub.publish(self.detector.getLeftArmLength())
+                        self.publishResult(self.mp_leftArmLength_pub, self.detector.getLeftArmLength())
 
                     
                     if self.detector.getShoulderLength():
-                        self.mp_shoulderLength_pub.publish(self.detector.getShoulderLength())
+                        self.publishResult(self.mp_shoulderLength_pub, self.detector.getShoulderLength())
 
                     
                     if self.detector.getHipLength():
-                        self.mp_hipLength_pub.publish(self.detector.getHipLength())
+                        self.publishResult(self.mp_hipLength_pub, self.detector.getHipLength())
 
 
                     if self.detector.getTorsoLength():
-                        self.mp_torsoLength_pub.publish(self.detector.getTorsoLength())
+                        self.publishResult(self.mp_torsoLength_pub, self.detector.getTorsoLength())
 
 
                     # sweater_color = self.detector.readSweaterColor(self.img, self.directory)
@@ -179,6 +312,7 @@ class MediapipeHolistic:
                     #     self.mp_sweaterColor_pub.publish(sweater_color)
 
 
+                    pointing = None
                     isPointingHand = self.detector.getPointingArm()
                     if isPointingHand:
                         if self.usePointingHands:
@@ -187,12 +321,12 @@ class MediapipeHolistic:
                             self.img, h_slope, h_intercept = self.detector.getPointingDirectionArm(self.img, isPointingHand)
 
                         if h_slope != None and h_intercept != None:
-                            self.mp_pointingDirectionHand_slope_pub.publish(h_slope)
-                            self.mp_pointingDirectionHand_intercept_pub.publish(h_intercept)
-                            if h_slope > 0:
-                                self.mp_pointingDirectionHand_direction_pub.publish(self.pointingLeftHandMsg)
-                            else:
-                                self.mp_pointingDirectionHand_direction_pub.publish(self.pointingRightHandMsg)
+                            self.publishResult(self.mp_pointingDirectionHand_slope_pub, h_slope)
+                            self.publishResult(self.mp_pointingDirectionHand_intercept_pub, h_intercept)
+                            direction = self.pointingLeftHandMsg if h_slope > 0 else self.pointingRightHandMsg
+                            self.publishResult(self.mp_pointingDirectionHand_direction_pub, direction)
+                            self.publishPointingLine(h_slope, h_intercept, direction)
+                            pointing = (h_slope, h_intercept, direction)
 
 
                     isFaceLandmarks = self.detector.getFaceLandmarks(self.img)
@@ -200,9 +334,14 @@ class MediapipeHolistic:
                         self.publishFaceCoordinates()
                         if self.drawFaceBoundary:
                             self.img = self.getFaceMask()
+
+                    if self.logger is not None:
+                        self.logFrame(pointing)
                     
                     
                     self.ctr = False
+                    self.status.frameProcessed(self.imgHeader.stamp)
+                    self.trigger.frameProcessed(self.imgHeader.stamp)
                     
 
                 if self.showImg:
@@ -212,17 +351,80 @@ class MediapipeHolistic:
             self.rate.sleep()
 
 
+        if self.profiler.isRunning():
+            self.stopProfiling()
+        if self.logger is not None:
+            self.logger.close()
         cv2.destroyAllWindows()
         rospy.loginfo('Shutting Down MediapipeHolistic Node')
 
 
+    def loadModels(self):
+        detector = holisticDetector()
+
+        # The first frame initializes the graph calculators, so it is processed here instead of on the first camera frame
+        detector.find(np.zeros((480, 640, 3), dtype=np.uint8), False, False, False, False)
+        detector.reset()
+
+        self.detector = detector
+        return detector
+
+
+    def modelsLoaded(self, models, error):
+        if error is not None:
+            rospy.logerr("Could not load the MediaPipe Holistic graph: " + str(error))
+            return
+
+        rospy.loginfo("MediaPipe Holistic graph loaded!")
+        self.ready_pub.publish(True)
+        self.status.setModelsLoaded(True)
+
+
+    def stopProfiling(self):
+        fileName, summary = self.profiler.stop()
+        if fileName is None:
+            rospy.logwarn("Profiling is not running!")
+            return
+        rospy.loginfo("Profile saved to " + fileName + "\n" + summary)
+
+
+    def triggerCallback(self, req):
+        if self.status.state() != "running":
+            # Stopped or models not loaded, no frame would be processed
+            rospy.logwarn("Trigger request rejected, the node is " + self.status.state() + "!")
+            return TriggerProcessingResponse(success=False, stamp=rospy.Time(), frames_processed=0)
+
+        success, stamp, processed = self.trigger.request(req.frames, req.timeout)
+        return TriggerProcessingResponse(success=success, stamp=stamp, frames_processed=processed)
+
+
+    def subscribeCamera(self):
+        # Idempotent, so repeated e_start or e_reset events never duplicate the image callbacks
+        if self.image_sub is not None:
+            return
+
+        if self.readImgCompressed:
+            self.image_sub = rospy.Subscriber(self.camera_topic, CompressedImage, self.imgCallback)
+        else:
+            self.image_sub = rospy.Subscriber(self.camera_topic, Image, self.imgCallback)
+        self.status.setRunning(True)
+
+
+    def unsubscribeCamera(self):
+        if self.image_sub is not None:
+            self.image_sub.unregister()
+            self.image_sub = None
+        self.status.setRunning(False)
+        self.trigger.cancel()
+
+
     def getFaceMask(self):
         height, width, c = self.img.shape
         mask_img = imgPil.new('L', (width, height), 0)
 
         points = np.array(self.detector.faceCoordinates)
 
-        hull = ConvexHull(points)
+        hull = spatial.ConvexHull(points)
         polygon = []
         for v in hull.vertices:
             polygon.append((points[v, 0], points[v, 1]))
@@ -236,21 +438,64 @@ class MediapipeHolistic:
 
 
     def imgCallback(self, data):
-        try:
-            if self.readImgCompressed:
-                self.img = self.bridge.compressed_imgmsg_to_cv2(data, "bgr8")
-            else:
-                self.img = self.bridge.imgmsg_to_cv2(data, "bgr8")
-
-            self.ctr = True
-        except CvBridgeError as e:
-            print(e)
+        self.status.frameReceived(dropped=self.imgMsg is not None)
+        self.imgMsg = data
+        self.ctr = True
 
 
     def eventCallback(self, data):
-        self.currentEvent = data.data
+        self.events.append(data.data)
 
     
+    def publishPointingLine(self, slope, intercept, direction):
+        msg = PointingLine()
+        if self.imgHeader is not None:
+            msg.header = self.imgHeader
+        msg.slope = slope
+        msg.intercept = intercept
+        msg.direction = direction
+        msg.image_height, msg.image_width = self.img.shape[:2]
+        self.publishResult(self.mp_pointingLine_pub, msg)
+
+
+    def publishResult(self, pub, msg):
+        pub.publish(msg)
+        self.lastResults.append((pub, msg))
+
+
+    def republishResults(self):
+        for pub, msg in self.lastResults:
+            if hasattr(msg, "header"):
+                # Stamped results are published with the header of the reused frame
+                msg.header = self.imgHeader
+            pub.publish(msg)
+
+
+    def resetGate(self):
+        self.lastResults = []
+        if self.gate is not None:
+            self.gate.reset()
+
+
+    def logFrame(self, pointing):
+        # Landmarks and lengths that were not detected (False) are logged as NaN
+        slope, intercept, direction = pointing if pointing is not None else (None, None, None)
+        self.logger.log("holistic", self.imgHeader.stamp.to_sec(),
+                        pose_world=[(p.x, p.y, p.z, p.visibility) for p in self.detector.poseCoordinates] or None,
+                        pose_img=[(p.x, p.y, p.visibility) for p in self.detector.imgPoseCoordinates] or None,
+                        right_hand=self.detector.rightHandCoordinates or None,
+                        left_hand=self.detector.leftHandCoordinates or None,
+                        face=self.detector.faceCoordinates or None,
+                        right_arm_length=self.detector.getRightArmLength() or None,
+                        left_arm_length=self.detector.getLeftArmLength() or None,
+                        shoulder_length=self.detector.getShoulderLength() or None,
+                        hip_length=self.detector.getHipLength() or None,
+                        torso_length=self.detector.getTorsoLength() or None,
+                        pointing_slope=slope,
+                        pointing_intercept=intercept,
+                        pointing_direction=direction)
+
+
     def publishFaceCoordinates(self):
         msgArr = []
         for p in self.detector.faceCoordinates:
@@ -261,7 +506,7 @@ class MediapipeHolistic:
             msg.visibility = -1
             msgArr.append(msg)
 
-        self.mp_faceLandmarks_pub.publish(msgArr)
+        self.publishResult(self.mp_faceLandmarks_pub, msgArr)
 
     
     def publishPoseWorldCoordinates(self):
@@ -274,7 +519,7 @@ class MediapipeHolistic:
             msg.visibility = p.visibility
             msgArr.append(msg)
 
-        self.mp_poseWorldLandmarks_pub.publish(msgArr)
+        self.publishResult(self.mp_poseWorldLandmarks_pub, msgArr)
 
     
     def publishPoseImgCoordinates(self):
@@ -287,7 +532,7 @@ class MediapipeHolistic:
             msg.visibility = p.visibility
             msgArr.append(msg)
 
-        self.mp_imgPoseLandmarks_pub.publish(msgArr)
+        self.publishResult(self.mp_imgPoseLandmarks_pub, msgArr)
 
 
     def publishRightHandCoordinates(self):
@@ -300,7 +545,7 @@ class MediapipeHolistic:
             msg.visibility = -1
             msgArr.append(msg)
 
-        self.mp_rightHandLandmarks_pub.publish(msgArr)
+        self.publishResult(self.mp_rightHandLandmarks_pub, msgArr)
 
 
     def publishLeftHandCoordinates(self):
@@ -313,7 +558,7 @@ class MediapipeHolistic:
             msg.visibility = -1
             msgArr.append(msg)
 
-        self.mp_leftHandLandmarks_pub.publish(msgArr)
+        self.publishResult(self.mp_leftHandLandmarks_pub, msgArr)
 
         
 
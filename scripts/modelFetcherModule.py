@@ -0,0 +1,280 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import requests
+
+
+class modelFetchError(Exception):
+    pass
+
+
+class modelFetcher():
+    '''
+    description: downloads model files into a content-addressed cache (one blob per sha256 digest). Downloads are streamed
+                 to disk in chunks, resumed with HTTP range requests after an interruption and can be split over several
+                 connections. Cached files are installed into their target directory with an atomic swap
+    '''
+    def __init__(self, cacheDir, chunkSize = 1 << 20, connections = 1, timeout = 30.0, session = None):
+        self.cacheDir = cacheDir
+        self.blobsDir = os.path.join(cacheDir, "blobs")
+        self.partialDir = os.path.join(cacheDir, "partial")
+        self.indexFile = os.path.join(cacheDir, "index.json")
+        self.chunkSize = chunkSize
+        self.connections = connections
+        self.timeout = timeout
+        self.session = session if session is not None else requests.Session()
+        self.lock = threading.Lock()
+        os.makedirs(self.blobsDir, exist_ok=True)
+        os.makedirs(self.partialDir, exist_ok=True)
+
+
+    def cached(self, url, sha256 = None):
+        """
+        It returns the cached blob of a url (or of a digest) without any network access.
+
+        :param url: (string) Url of the file.
+        :param sha256: (string) Expected digest. If given, any blob with this digest is returned, whatever its url.
+
+        :return path: (string) Path of the blob, or None if it is not cached.
+        """
+        digest = sha256 if sha256 is not None else self.__readIndex().get(url)
+        if digest is None:
+            return None
+
+        path = os.path.join(self.blobsDir, digest)
+        return path if os.path.isfile(path) else None
+
+
+    def fetch(self, url, headers = None, sha256 = None, refresh = False):
+        """
+        It returns the blob of a url, downloading it only when it is not cached.
+
+        :param url: (string) Url of the file.
+        :param headers: (dict) Extra request headers (e.g., authorization).
+        :param sha256: (string) Expected digest. The download is rejected if it does not match.
+        :param refresh: (bool) If set to true, the file is downloaded again even if the url is cached.
+
+        :return path: (string) Path of the blob. It raises modelFetchError when the download fails or does not match the digest.
+        """
+        if not refresh:
+            path = self.cached(url, sha256)
+            if path is not None:
+                return path
+
+        key = hashlib.sha256(url.encode()).hexdigest()
+        headers = dict(headers or {})
+
+        size, acceptRanges, validator = self.__probe(url, headers)
+        self.__checkPartial(key, validator, sha256 is not None)
+        if self.connections > 1 and acceptRanges and size is not None and size > self.chunkSize:
+            step = -(-size // self.connections)
+            segments = [(start, min(start + step, size) - 1) for start in range(0, size, step)]
+        else:
+            segments = [(0, None)]
+
+        # The parts are only resumed while the file on the server is the same (If-Range), otherwise it is downloaded again
+        if validator is not None:
+            headers['If-Range'] = validator
+        parts = [os.path.join(self.partialDir, key + ".part" + str(i)) for i in range(len(segments))]
+        if len(segments) == 1:
+            self.__downloadSegment(url, headers, parts[0], 0, None)
+        else:
+            errors = []
+            threads = [threading.Thread(target=self.__downloadSegmentSafe, args=(url, headers, part, start, end, errors)) for part, (start, end) in zip(parts, segments)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            if errors != []:
+                raise modelFetchError("Could not download " + url + ": " + str(errors[0]))
+
+        # The parts are joined while computing the digest, so the file is only read once
+        digest = hashlib.sha256()
+        fd, tmpFile = tempfile.mkstemp(dir=self.partialDir, suffix=".tmp")
+        with os.fdopen(fd, 'wb') as out:
+            for part in parts:
+                with open(part, 'rb') as f:
+                    for chunk in iter(lambda: f.read(self.chunkSize), b''):
+                        digest.update(chunk)
+                        out.write(chunk)
+
+        digest = digest.hexdigest()
+        validatorFile = self.__validatorFile(key)
+        if size is not None and os.path.getsize(tmpFile) != size:
+            self.__remove([tmpFile, validatorFile] + parts)
+            raise modelFetchError("Incomplete download of " + url)
+        if sha256 is not None and digest != sha256.lower():
+            self.__remove([tmpFile, validatorFile] + parts)
+            raise modelFetchError("Checksum mismatch for " + url + ": expected " + sha256 + ", got " + digest)
+
+        path = os.path.join(self.blobsDir, digest)
+        os.replace(tmpFile, path)
+        self.__remove([validatorFile] + parts)
+        self.__writeIndex(url, digest)
+        return path
+
+
+    def install(self, blob, targetDir, fileName, unpack = False):
+        """
+        It installs a cached blob into a directory. The new directory is built next to the target and swapped in with renames,
+        so readers never see a half written model and the previous model is kept if anything fails.
+
+        :param blob: (string) Path of the cached blob.
+        :param targetDir: (string) Directory replaced by the blob contents.
+        :param fileName: (string) Name of the file inside the directory (or archive name when unpacking).
+        :param unpack: (bool) If set to true, the blob is an archive (e.g., zip) unpacked into the directory.
+        """
+        parentDir = os.path.dirname(os.path.abspath(targetDir))
+        os.makedirs(parentDir, exist_ok=True)
+        newDir = tempfile.mkdtemp(dir=parentDir, prefix=".new-")
+        try:
+            if unpack:
+                # unpack_archive infers the format from the file name
+                archive = os.path.join(newDir, fileName)
+                self.__link(blob, archive)
+                shutil.unpack_archive(archive, newDir)
+                os.remove(archive)
+            else:
+                self.__link(blob, os.path.join(newDir, fileName))
+        except Exception:
+            shutil.rmtree(newDir, ignore_errors=True)
+            raise
+
+        oldDir = None
+        if os.path.exists(targetDir):
+            oldDir = tempfile.mkdtemp(dir=parentDir, prefix=".old-")
+            os.rmdir(oldDir)
+            os.rename(targetDir, oldDir)
+        os.rename(newDir, targetDir)
+        if oldDir is not None:
+            shutil.rmtree(oldDir, ignore_errors=True)
+
+
+    def __probe(self, url, headers):
+        # Size, range support and validator (strong ETag or Last-Modified) of the file. Servers that do not answer HEAD
+        # are downloaded with a single connection
+        try:
+            response = self.session.head(url, headers=headers, allow_redirects=True, timeout=self.timeout)
+        except requests.RequestException:
+            return None, False, None
+        if response.status_code != 200:
+            return None, False, None
+
+        size = response.headers.get('Content-Length')
+        size = int(size) if size is not None and response.headers.get('Content-Encoding') is None else None
+        # Weak ETags cannot be used with If-Range
+        validator = response.headers.get('ETag')
+        if validator is None or validator.startswith('W/'):
+            validator = response.headers.get('Last-Modified')
+        return size, response.headers.get('Accept-Ranges', '').lower() == 'bytes', validator
+
+
+    def __checkPartial(self, key, validator, checksum):
+        """
+        It discards the parts of a previous download unless they can be verified: the file on the server must have the
+        same validator as when they were started, or, without validators, the download must have a checksum.
+        The validator of the download is saved next to its parts.
+        """
+        validatorFile = self.__validatorFile(key)
+        saved = None
+        if os.path.isfile(validatorFile):
+            with open(validatorFile, 'r') as f:
+                saved = f.read()
+
+        parts = [os.path.join(self.partialDir, f) for f in os.listdir(self.partialDir) if f.startswith(key + ".part")]
+        if parts != [] and (saved != validator or (validator is None and not checksum)):
+            self.__remove(parts + [validatorFile])
+
+        if validator is not None:
+            with open(validatorFile, 'w') as f:
+                f.write(validator)
+        else:
+            self.__remove([validatorFile])
+
+
+    def __downloadSegmentSafe(self, url, headers, part, start, end, errors):
+        try:
+            self.__downloadSegment(url, headers, part, start, end)
+        except Exception as e:
+            errors.append(e)
+
+
+    def __downloadSegment(self, url, headers, part, start, end):
+        """
+        It streams the byte range [start, end] of the file into a part file, resuming from what the part already has.
+        end is None for the rest of the file.
+        """
+        done = os.path.getsize(part) if os.path.isfile(part) else 0
+        if end is not None and done == end - start + 1:
+            return
+
+        segmentHeaders = dict(headers)
+        if start + done > 0 or end is not None:
+            segmentHeaders['Range'] = "bytes=%d-%s" % (start + done, "" if end is None else str(end))
+
+        try:
+            with self.session.get(url, headers=segmentHeaders, stream=True, allow_redirects=True, timeout=self.timeout) as response:
+                if response.status_code == 416 and end is None and done > 0:
+                    # The part already holds the whole file
+                    return
+                if response.status_code == 200:
+                    if start > 0 or end is not None:
+                        # The parts of the other segments may come from the previous file, they are all downloaded again
+                        self.__remove([part])
+                        if 'If-Range' in segmentHeaders:
+                            raise modelFetchError(url + " changed on the server during the download")
+                        raise modelFetchError("Server does not support range requests")
+                    # Range ignored by the server (or file changed since the part was started), the download starts over
+                    mode = 'wb'
+                elif response.status_code == 206:
+                    mode = 'ab'
+                else:
+                    raise modelFetchError("HTTP " + str(response.status_code) + " while downloading " + url)
+
+                with open(part, mode) as f:
+                    for chunk in response.iter_content(chunk_size=self.chunkSize):
+                        f.write(chunk)
+        except requests.RequestException as e:
+            # The part is kept, so the next fetch resumes from where this one stopped
+            raise modelFetchError("Download of " + url + " interrupted: " + str(e))
+
+
+    def __validatorFile(self, key):
+        return os.path.join(self.partialDir, key + ".validator")
+
+
+    def __link(self, src, dst):
+        # Hard links make installs free when the cache and the target are on the same file system
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copyfile(src, dst)
+
+
+    def __remove(self, files):
+        for f in files:
+            if os.path.isfile(f):
+                os.remove(f)
+
+
+    def __readIndex(self):
+        if not os.path.isfile(self.indexFile):
+            return {}
+        try:
+            with open(self.indexFile, 'r') as f:
+                return json.load(f)
+        except ValueError:
+            return {}
+
+
+    def __writeIndex(self, url, digest):
+        with self.lock:
+            index = self.__readIndex()
+            index[url] = digest
+            fd, tmpFile = tempfile.mkstemp(dir=self.cacheDir, suffix=".tmp")
+            with os.fdopen(fd, 'w') as f:
+                json.dump(index, f, indent=2)
+            os.replace(tmpFile, self.indexFile)
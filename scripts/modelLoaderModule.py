@@ -0,0 +1,44 @@
+import threading
+
+
+class modelLoader():
+    '''
+    description: loads models in a background thread, so a node can subscribe, answer events and publish its status while
+                 its networks are being read and warmed up. The ready event is set once the models can be used
+    '''
+    def __init__(self, load, onDone = None):
+        # load() returns the loaded models. onDone(models, error) is called from the loading thread
+        self.load = load
+        self.onDone = onDone
+        self.models = None
+        self.error = None
+        self.ready = threading.Event()
+        self.thread = threading.Thread(target=self.__run, daemon=True)
+        self.thread.start()
+
+
+    def isReady(self):
+        return self.ready.is_set()
+
+
+    def wait(self, timeout = None):
+        """
+        It waits for the models to be loaded.
+
+        :param timeout: (float) Maximum wait in seconds. If None, it waits until the loading ends.
+
+        :return models: The loaded models, or None if they are not loaded yet or the loading failed (see error).
+        """
+        self.thread.join(timeout)
+        return self.models
+
+
+    def __run(self):
+        try:
+            self.models = self.load()
+            self.ready.set()
+        except Exception as e:
+            self.error = e
+
+        if self.onDone is not None:
+            self.onDone(self.models, self.error)
@@ -0,0 +1,79 @@
+import time
+import cv2
+import numpy as np
+
+
+class motionGate():
+    '''
+    description: cheap scene change test run before the inference of a frame. Each frame is reduced to a small grayscale
+                 thumbnail and compared with the thumbnail of the last processed frame, globally and per cell of a
+                 grid (so a small moving region is not averaged out). Frames without change can reuse the previous
+                 results, and a frame is always processed after maxInterval seconds
+    '''
+    def __init__(self, threshold = 4.0, regionThreshold = 12.0, grid = 4, maxInterval = 2.0, thumbnailSize = (64, 48)):
+        """
+        :param threshold: (float) Mean absolute difference (gray levels) of the whole thumbnail above which the frame is processed.
+        :param regionThreshold: (float) Mean absolute difference of a grid cell above which the frame is processed.
+        :param grid: (int) The thumbnail is split into grid x grid cells.
+        :param maxInterval: (float) Maximum time in seconds between two processed frames.
+        :param thumbnailSize: (tuple) Width and height of the thumbnail, multiples of grid.
+        """
+        self.threshold = threshold
+        self.regionThreshold = regionThreshold
+        self.grid = grid
+        self.maxInterval = maxInterval
+        self.thumbnailSize = thumbnailSize
+        self.reference = None
+        self.referenceTime = None
+        # Statistics
+        self.framesChecked = 0
+        self.framesReused = 0
+        self.lastChange = 0.0
+        self.lastRegionChange = 0.0
+
+
+    def reset(self):
+        # The next frame is processed (e.g., after a reset or when results are requested)
+        self.reference = None
+        self.referenceTime = None
+
+
+    def check(self, img, now = None):
+        """
+        It tells whether a frame must be processed. When it must, the frame becomes the new reference.
+
+        :param img: (np.array) BGR or grayscale frame.
+        :param now: (float) Current time in seconds (time.monotonic() if None).
+
+        :return process: (bool) False if the previous results can be reused for this frame.
+        """
+        now = time.monotonic() if now is None else now
+        # Resized first, so the color conversion runs on the thumbnail
+        thumbnail = cv2.resize(img, self.thumbnailSize, interpolation=cv2.INTER_AREA)
+        if thumbnail.ndim == 3:
+            thumbnail = cv2.cvtColor(thumbnail, cv2.COLOR_BGR2GRAY)
+        self.framesChecked += 1
+
+        if self.reference is None or now - self.referenceTime >= self.maxInterval:
+            return self.__accept(thumbnail, now)
+
+        difference = cv2.absdiff(thumbnail, self.reference)
+        w, h = self.thumbnailSize
+        cells = difference.reshape(self.grid, h // self.grid, self.grid, w // self.grid).mean(axis=(1, 3), dtype=np.float32)
+        self.lastChange = float(difference.mean())
+        self.lastRegionChange = float(cells.max())
+        if self.lastChange > self.threshold or self.lastRegionChange > self.regionThreshold:
+            return self.__accept(thumbnail, now)
+
+        self.framesReused += 1
+        return False
+
+
+    def reuseRatio(self):
+        return self.framesReused / self.framesChecked if self.framesChecked > 0 else 0.0
+
+
+    def __accept(self, thumbnail, now):
+        self.reference = thumbnail
+        self.referenceTime = now
+        return True
@@ -0,0 +1,114 @@
+import rospy
+import threading
+import time
+from perception_tests.msg import NodeStatus
+
+
+class nodeStatus():
+    '''
+    description: frame counters and state of a perception node, published on ~status so the clients can wait for the
+                 node to be running instead of sleeping a fixed time. The frame rates are updated every period, and the
+                 status is also published when a frame is processed (at most every minInterval), so a new
+                 last_frame_stamp reaches the clients without waiting for the timer
+    '''
+    def __init__(self, topic = "~status", period = 1.0, minInterval = 0.1):
+        self.lock = threading.Lock()
+        self.running = False
+        self.modelsLoaded = False
+        self.framesReceived = 0
+        self.framesProcessed = 0
+        self.framesDropped = 0
+        self.framesReused = 0
+        # Last scene change measured by the motion gate, if any
+        self.sceneChange = 0.0
+        self.eventsPending = 0
+        self.lastFrameStamp = rospy.Time()
+        # Counters at the previous rate update, and the rates computed then
+        self.last = (time.monotonic(), 0, 0)
+        self.inputFps = 0.0
+        self.processingFps = 0.0
+        self.minInterval = minInterval
+        self.lastPublish = 0.0
+
+        # Latched, so the clients get the current state as soon as they subscribe
+        self.status_pub = rospy.Publisher(topic, NodeStatus, queue_size=1, latch=True)
+        self.timer = rospy.Timer(rospy.Duration(period), lambda event: self.publish(updateRates=True))
+
+
+    def frameReceived(self, dropped = False):
+        # dropped: the previous frame was replaced before being processed
+        with self.lock:
+            self.framesReceived += 1
+            if dropped:
+                self.framesDropped += 1
+
+
+    def frameProcessed(self, stamp):
+        with self.lock:
+            self.framesProcessed += 1
+            self.lastFrameStamp = stamp
+        self.__publishThrottled()
+
+
+    def frameReused(self, stamp):
+        # The results of the previous processed frame were published again for this frame (motion gate)
+        with self.lock:
+            self.framesReused += 1
+            self.lastFrameStamp = stamp
+        self.__publishThrottled()
+
+
+    def setRunning(self, running):
+        if running != self.running:
+            self.running = running
+            self.publish()
+
+
+    def setModelsLoaded(self, loaded):
+        if loaded != self.modelsLoaded:
+            self.modelsLoaded = loaded
+            self.publish()
+
+
+    def state(self):
+        if not self.running:
+            return "stopped"
+        return "running" if self.modelsLoaded else "starting"
+
+
+    def publish(self, updateRates = False):
+        with self.lock:
+            now = time.monotonic()
+            if updateRates:
+                lastTime, lastReceived, lastProcessed = self.last
+                elapsed = now - lastTime
+                if elapsed > 0:
+                    self.inputFps = (self.framesReceived - lastReceived) / elapsed
+                    self.processingFps = (self.framesProcessed - lastProcessed) / elapsed
+                self.last = (now, self.framesReceived, self.framesProcessed)
+            self.lastPublish = now
+
+            msg = NodeStatus()
+            msg.header.stamp = rospy.Time.now()
+            msg.state = self.state()
+            msg.models_loaded = self.modelsLoaded
+            msg.input_fps = self.inputFps
+            msg.processing_fps = self.processingFps
+            msg.frames_received = self.framesReceived
+            msg.frames_processed = self.framesProcessed
+            msg.frames_dropped = self.framesDropped
+            msg.frames_reused = self.framesReused
+            msg.scene_change = self.sceneChange
+            msg.events_pending = self.eventsPending
+            msg.last_frame_stamp = self.lastFrameStamp
+
+        self.status_pub.publish(msg)
+
+
+    def __publishThrottled(self):
+        if time.monotonic() - self.lastPublish >= self.minInterval:
+            self.publish()
+
+
+    def stop(self):
+        self.timer.shutdown()
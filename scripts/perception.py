@@ -3,20 +3,28 @@
 import rospy, rospkg
 import cv2
 import numpy as np
-import math
 from std_msgs.msg import String, Float32
 from sensor_msgs.msg import Image, CompressedImage, CameraInfo
 from geometry_msgs.msg import Pose, PoseStamped
-from cv_bridge import CvBridge, CvBridgeError
-from detectron2_ros.msg import Result, RecognizedObjectArrayStamped, RecognizedObjectWithMaskArrayStamped, SingleRecognizedObjectWithMask
 from perception_tests.msg import MediapipePointInfo, MediapipePointInfoArray
-from perception_tests.msg import ReidInfoArray
-from sympy import Point, Polygon, Line
-
-import message_filters
+from perception_tests.msg import ReidInfoArray, ReidAliasArray, DetectedBoxArray, PointingLine, NodeStatus
+from perception_tests.srv import GetDetectionMasks, TriggerProcessing
+from topicCacheModule import topicCache
+from historyModule import joinNearest
+from imageConversionModule import imageDecoder
+from eventChannelModule import eventChannel, ackTopicFor
+from lazyImportModule import lazyModule
+from maskRleModule import decodeMaskRle, pasteCrop
+from pointingModule import boundingBoxesToArray, pointingLine, resolvePointingTarget
 
 from datetime import datetime
-import shutil, os, msal, requests, webbrowser, json
+import os, json
+
+# Optional dependencies, only imported by the actions that need them (e.g., the model download or the detectron actions)
+msal = lazyModule("msal")
+webbrowser = lazyModule("webbrowser")
+modelFetcherModule = lazyModule("modelFetcherModule")
+detectronMsg = lazyModule("detectron2_ros.msg")
 
 
 # import tiago_object_localization.tiago_object_localization_library_helper as obj_pose_module
@@ -38,6 +46,21 @@ class Perception:
 
         # Variable Initialization
         self.__timeout = 3
+        # Maximum age (s) of the cached messages returned by the getters
+        self.__maxAge = 1.0
+
+        # Long-lived subscribers with the latest message of each topic. Perception is a singleton,
+        # so the subscribers must survive new instantiations
+        if not hasattr(self, '_Perception__cache'):
+            self.__cache = topicCache()
+            # Event publishers are created once and reused
+            self.__eventChannels = {}
+            self.__doorChannel = None
+            # Perception can be used by concurrent smach states, so the decoded images never share a buffer
+            self.__decoder = imageDecoder(reuseBuffer = False)
+            self.__masksProxy = None
+            # Persistent trigger service proxies, one per node
+            self.__triggerProxies = {}
         self.__img = None
         
         self.__pointingDirection = None
@@ -64,7 +87,8 @@ class Perception:
         self.__detectedObjects = []
         self.__detectionMsg = None
         self.__depthImg = None
-        self.__readDetectronMsgs = False
+        # Max stamp difference (s) between the detection and the depth image when using approximate synchronization
+        self.__syncSlop = 0.05
 
         # One Drive Info
         self.__GRAPH_API_ENDPOINT = 'https://graph.microsoft.com/v1.0'
@@ -80,34 +104,16 @@ class Perception:
         NOTE: raises exceptions in some cases to prevent mistaking with boolean door open/close
         """
 
-        self.__door_detector_pub = rospy.Publisher('/door_detector_node/event_in', String, queue_size=5)
-        rospy.sleep(0.25)
-        sub_door = rospy.Subscriber('/door_detector_node/event_out', String, self.__callback_door_open)
-        rospy.sleep(0.25)
-
-        if self.__door_detector_pub.get_num_connections() == 0:
-            rospy.logwarn('There is no subscriber for door detector topic. Did you launch the door detector?')
-
-        self.__door_open = None
-        self.__door_detector_pub.publish(String(data='e_start'))
-
-        # wait for response for 3 seconds
-        wait_time = rospy.Time.now() + rospy.Duration(timeout)
-        while self.__door_open is None:
-            if rospy.Time.now() > wait_time:
-                rospy.logerr("Timeout while checking door")
-                return None
-
-        sub_door.unregister()
-
-        return self.__door_open
+        # The door detector replies on its event_out topic with e_open or e_closed
+        if self.__doorChannel is None:
+            self.__doorChannel = eventChannel('/door_detector_node/event_in', '/door_detector_node/event_out')
 
+        ack = self.__doorChannel.send('e_start', timeout, acks=['e_open', 'e_closed'])
+        if not ack:
+            rospy.logerr("Timeout while checking door. Did you launch the door detector?")
+            return None
 
-    def __callback_door_open(self, msg):
-        if msg.data == 'e_open':
-            self.__door_open = True
-        elif msg.data == 'e_closed':
-            self.__door_open = False
+        return ack == 'e_open'
 
 
     def __oneDriveGenerateAccessToken(self):
@@ -144,63 +150,69 @@ class Perception:
         return token_response
     
 
-    def downloadDetectronModel(self, option):
+    def downloadDetectronModel(self, option, sha256 = None, connections = 1, refresh = False):
+        """
+        It downloads a detectron model from OneDrive into the detectron2_ros model folder. Models are kept in a local cache
+        (~/.cache/perception_tests/models), so downloading the same model again is free and does not ask for OneDrive credentials.
+        
+        :param option: (int) Model to download (2: Bags/BagsHandles).
+        :param sha256: (string) Expected checksum of the model file. If given, a download that does not match is rejected and the current model is kept.
+        :param connections: (int) Number of parallel ranged connections used to download the file.
+        :param refresh: (bool) If set to true, the model is downloaded again even if it is cached.
+        
+        :return success: (bool) True if the model was installed.
+        """
         rospack = rospkg.RosPack()
         detectronDir = rospack.get_path('detectron2_ros')
         detectronModelsDir = detectronDir + "/model"
 
-        # Delete model folder
-        if os.path.exists(detectronModelsDir):
-            shutil.rmtree(detectronModelsDir, ignore_errors=True)
-
-        # OneDrive access token
-        access_token = self.__oneDriveGenerateAccessToken()
-        headers = {
-            'Authorization': 'Bearer' + access_token['access_token']
-        }
-
         if option == 1:
             # Download Fashion Model
-            pass
+            rospy.logwarn("Option is not available!")
+            return False
         elif option == 2:
             # Download Bags/BagsHandles Model
             path_to_file = 'socrob/perception/detectron/models/bags/'
             file_name = 'trainingInfo.txt'
         elif option == 3:
             # Download DoorKnobs Model
-            pass
+            rospy.logwarn("Option is not available!")
+            return False
         else:
             rospy.logwarn("Option is not available!")
-            return
-
-        # Download model under zip format
-        rospy.logwarn("Downloading Model zip file!")
-        
+            return False
+
+        url = self.__GRAPH_API_ENDPOINT + '/me/drive/root:/' + path_to_file + file_name +':/content'
+        fetcher = modelFetcherModule.modelFetcher(os.path.expanduser("~/.cache/perception_tests/models"), connections=connections)
+
+        blob = None if refresh else fetcher.cached(url, sha256)
+        if blob is None:
+            # OneDrive access token, only needed when the model is not cached
+            access_token = self.__oneDriveGenerateAccessToken()
+            headers = {
+                'Authorization': 'Bearer ' + access_token['access_token']
+            }
+
+            rospy.logwarn("Downloading Model " + file_name + "!")
+            try:
+                blob = fetcher.fetch(url, headers, sha256, refresh)
+            except modelFetcherModule.modelFetchError as e:
+                rospy.logwarn("Could not download the model " + file_name + " from OneDrive! " + str(e))
+                return False
+
+        # The model folder is replaced at once, the previous model stays in place if anything fails
         try:
-            response_file_content = requests.get(self.__GRAPH_API_ENDPOINT + '/me/drive/root:/' + path_to_file + file_name +':/content', headers=headers)
-        except:
-            rospy.logwarn("Could not download the model" + file_name + " from OneDrive!")
-            return
-        
-        with open(os.path.join(detectronDir, file_name), 'wb') as _f:
-            _f.write(response_file_content.content)
+            fetcher.install(blob, detectronModelsDir, file_name, unpack = file_name.endswith(".zip"))
+        except Exception as e:
+            rospy.logwarn("Could not install the model " + file_name + "! " + str(e))
+            return False
 
-        rospy.sleep(3)
-        
-        modelZipfile = detectronDir + "/" + file_name
-        # Unzip file
-        # rospy.logwarn("Unzipping Model!")
-        # try:
-        #     shutil.unpack_archive(modelZipfile , detectronDir)
-        # except:
-        #     rospy.logwarn("Could not unzip the model")
-        
-        # os.remove(modelZipfile)
+        return True
 
 
 
 
-    def detectPointingObject(self, classNameToBeDetected, useYolo = False, easyDetection = False, useFilteredObjects = True, score = 0.5):
+    def detectPointingObject(self, classNameToBeDetected, useYolo = False, easyDetection = False, useFilteredObjects = True, score = 0.5, stampTolerance = None):
         """
         This action returns the object someone is pointing at. It requires the mediapipe holistic node to be running and the Detectron or YOLO nodes. The msg type is RecognizedObject.
         
@@ -210,6 +222,7 @@ class Perception:
                                     If set to false, it finds which object gets intercepted by the pointing line segment and returns that object. If no object is detected, it returns the one closest to the line.
         :param classNameToBeDetected: (string) The class name to be filtered during the search.
         :param score: (float) The detection confindence level.
+        :param stampTolerance: (float) If given, the detections and the pointing inputs are only used when their stamps are within this tolerance (in seconds) of each other.
         
         :return res: (RecognizedObject.mgs) It returns the object.
         """ 
@@ -222,8 +235,15 @@ class Perception:
                 rospy.logwarn("Input argument classNameToBeDetected cannot be an empty list!")
                 return None
                 
-        self.__detectionMsg = self.returnDetectedObjects()
-        if self.__detectionMsg is None:
+        # Detections and pointing inputs are waited on together, with a single deadline
+        requests = [self.__detectionTopic(useYolo)] + self.__pointingRequests(easyDetection, useYolo)
+        msgs = self.gather(requests, stamp_tolerance = stampTolerance)
+        if msgs is None:
+            rospy.logerr("Could not read the pointing inputs!")
+            return None
+
+        self.__detectionMsg = msgs[0]
+        if not self.__setPointingInputs(msgs[1:], easyDetection):
             return None
 
         self.__detectedObjects = self.__filterObjectionDetectionMsg(self.__detectionMsg, useFilteredObjects, classNameToBeDetected, score)
@@ -231,10 +251,60 @@ class Perception:
         if self.__detectedObjects == []:
             return None
 
-        return self.__returnPointedObject(easyDetection, useYolo)
+        return self.__returnPointedObject(easyDetection)
         
 
-    def detectPointingObjectWithCustomMsg(self, classNameToBeDetected, easyDetection = False, useFilteredObjects = True, score = 0.5):
+    def startPointingHistory(self, useYolo = False, size = 100):
+        """
+        It starts recording the last detections and pointing lines, so pointing queries can look into the recent past (see detectPointingObjectInPast).
+        It requires the mediapipe holistic node to publish the hand_pointing_line topic.
+
+        :param useYolo: (bool) It tells which object detector should we subsribe to. If set to True, subscribes to YOLO otherwise uses Detectron.
+        :param size: (int) Number of messages kept for each topic.
+
+        :return detections, lines: (stampedHistory) The histories of the detections and of the pointing lines.
+        """
+        detections = self.__cache.getHistory(*self.__detectionTopic(useYolo), size = size)
+        lines = self.__cache.getHistory("/perception/mediapipe_holistic/hand_pointing_line", PointingLine, size = size)
+        return detections, lines
+
+
+    def detectPointingObjectInPast(self, classNameToBeDetected, ago = 0.0, useYolo = False, useFilteredObjects = True, score = 0.5, tolerance = 0.05, window = 0.5):
+        """
+        This action returns the object someone was pointing at some time ago (e.g., 0.3 s ago). The pointing line is matched with the detections
+        of the same camera frame, looked up by stamp in the histories started by startPointingHistory. The first call starts the histories.
+
+        :param classNameToBeDetected: (string) The class name to be filtered during the search.
+        :param ago: (float) How long ago, in seconds.
+        :param useYolo: (bool) It tells which object detector should we subsribe to. If set to True, subscribes to YOLO otherwise uses Detectron.
+        :param score: (float) The detection confindence level.
+        :param tolerance: (float) Maximum stamp difference in seconds between a pointing line and its detections.
+        :param window: (float) Maximum time difference in seconds between the pointing line and the requested time.
+
+        :return res: (RecognizedObject.mgs) It returns the object, or None if nothing was recorded around that time.
+        """
+        if useFilteredObjects == True and (type(classNameToBeDetected) != list or len(classNameToBeDetected) == 0):
+            rospy.logwarn("Input argument classNameToBeDetected must be a non empty list of classes!")
+            return None
+
+        detections, lines = self.startPointingHistory(useYolo)
+        target = rospy.get_time() - ago
+
+        # Lines without detections of their frame are skipped, the closest remaining one to the requested time is used
+        pairs = joinNearest(lines, detections, tolerance, target - window, target + window)
+        if pairs == []:
+            rospy.logwarn("No pointing line with detections around the requested time!")
+            return None
+
+        stamp, line, detectionMsg = min(pairs, key = lambda pair: abs(pair[0] - target))
+        objects = self.__filterObjectionDetectionMsg(detectionMsg, useFilteredObjects, classNameToBeDetected, score)
+        if objects == []:
+            return None
+
+        return self.__objectPointedByLine(objects, line.slope, line.intercept, line.image_width)
+
+
+    def detectPointingObjectWithCustomMsg(self, classNameToBeDetected, easyDetection = False, useFilteredObjects = True, score = 0.5, approximateSync = False, useRelay = False, stampTolerance = None):
         """
         This action returns the object someone is pointing at + the corresponding depth img. It requires the mediapipe holistic node to be running and the Detectron node. The msg type is SingleRecognizedObjectWithMask.
         
@@ -243,6 +313,9 @@ class Perception:
                                     If set to false, it finds which object gets intercepted by the pointing line segment and returns that object. If no object is detected, it returns the one closest to the line.
         :param classNameToBeDetected: (string) The class name to be filtered during the search.
         :param score: (float) The detection confindence level.
+        :param approximateSync: (bool) If set to true, the detection and the depth image are matched with an approximate time policy instead of exact stamps.
+        :param useRelay: (bool) If set to true, it reads the boxes published by the detection relay node and only requests the mask of the pointed object.
+        :param stampTolerance: (float) If given, the detections and the pointing inputs are only used when their stamps are within this tolerance (in seconds) of each other.
         
         :return res: (SingleRecognizedObjectWithMask.mgs + Image.msg) It returns the object and the corresponding depth image.
         """
@@ -262,44 +335,56 @@ class Perception:
             rospy.logwarn("Detectron custom msg must be set to true on the detectron launch file!")
             return None, None
 
-        self.__readSynchronizedMsgs()
-        if self.__detectionMsg is None:
-            rospy.logwarn("Could not read detectron detection and image depth topics!")
+        # The detection + depth pair and the pointing inputs are waited on together, with a single deadline
+        sync = self.__synchronizedDetections(approximateSync, useRelay)
+        try:
+            msgs = self.__cache.gather(self.__pointingRequests(easyDetection, useYolo), self.__getMaxAge(None), self.__timeout, stampTolerance, sync, rospy.Time.now())
+        except rospy.ROSException as e:
+            rospy.logwarn("Could not read detectron detection, image depth and pointing topics! " + str(e))
+            self.__detectionMsg, self.__depthImg = None, None
             return None, None
 
+        self.__detectionMsg, self.__depthImg = msgs[0]
         self.__detectedObjects = self.__filterObjectionDetectionMsg(self.__detectionMsg, useFilteredObjects, classNameToBeDetected, score)
         
         if self.__detectedObjects == []:
             return None, None
 
-        obj = self.__returnPointedObject(easyDetection, useYolo)
+        if not self.__setPointingInputs(msgs[1:], easyDetection):
+            return None, None
+
+        obj = self.__returnPointedObject(easyDetection)
         if obj == None:
             return None, None
 
-        msg = SingleRecognizedObjectWithMask()
+        if useRelay:
+            obj = self.__boxToObjectWithMask(obj, self.__detectionMsg.header)
+            if obj is None:
+                return None, None
+
+        msg = detectronMsg.SingleRecognizedObjectWithMask()
         msg.header = self.__detectionMsg.header
         msg.object = obj
 
         return msg, self.__depthImg
 
 
-    def returnDetectedObjects(self, useYolo = False, useFilteredObjects = True, classNameToBeDetected = 'bag', score = 0.5):
+    def returnDetectedObjects(self, useYolo = False, useFilteredObjects = True, classNameToBeDetected = 'bag', score = 0.5, max_age = None):
         """
         It returns all the objects detected by the YOLO or the detectron. Hence, it requires one of the nodes to be running. The msg type is RecognizedObjectArrayStamped.
         
         :param useYolo: (bool) It tells which object detector should we subsribe to. If set to True, subscribes to YOLO otherwise uses Detectron.
         :param classNameToBeDetected: (string) The class name to be filtered during the search.
         :param score: (float) The detection confindence level.
+        :param max_age: (float) Maximum age in seconds of the returned detections. If None, it defaults to 1 s.
         
         :return dObjects: (RecognizedObjectArrayStamped.mgs) It returns all objects detected.
         """ 
         
-        detectedObjects_topic = "/detectron2_ros/result_yolo_msg"
-        if useYolo == True:
-            detectedObjects_topic = "/object_detector/detections"
+        detectedObjects_topic, msgType = self.__detectionTopic(useYolo)
 
         try:
-            data = rospy.wait_for_message(detectedObjects_topic, RecognizedObjectArrayStamped, timeout = self.__timeout)
+            data = self.__cache.get(detectedObjects_topic, msgType, self.__getMaxAge(max_age), self.__timeout)
         except:
             rospy.logerr("Object Detection Results are not being published!")
             return None
@@ -307,33 +392,59 @@ class Perception:
         return data
 
 
-    def __returnPointedObject(self, easyDetection, useYolo):
+    def __getMaxAge(self, max_age):
+        if max_age is None:
+            return self.__maxAge
+        return max_age
+
+
+    def __detectionTopic(self, useYolo):
+        if useYolo == True:
+            return "/object_detector/detections", detectronMsg.RecognizedObjectArrayStamped
+        return "/detectron2_ros/result_yolo_msg", detectronMsg.RecognizedObjectArrayStamped
+
+
+    def __imgTopic(self, useYolo):
+        if useYolo == True:
+            return "/object_detector/detection_image/compressed", CompressedImage
+        return "/camera/color/image_raw", Image
+
+
+    def __pointingRequests(self, easyDetection, useYolo):
+        # Topics needed to find the pointed object, as (topic, msgType) pairs for topicCache.gather
+        if easyDetection:
+            return [("/perception/mediapipe_holistic/hand_pointing_direction", String)]
+
+        return [self.__imgTopic(useYolo),
+                ("/perception/mediapipe_holistic/hand_pointing_slope", Float32),
+                ("/perception/mediapipe_holistic/hand_pointing_intercept", Float32)]
+
+
+    def __setPointingInputs(self, msgs, easyDetection):
+        if easyDetection:
+            self.__pointingDirection = msgs[0].data
+            return True
+
+        self.__img = self.__convertImg(msgs[0])
+        self.__pointingSlope = msgs[1].data
+        self.__pointingIntercept = msgs[2].data
+        return self.__img is not None
+
+
+    def __returnPointedObject(self, easyDetection):
         """
-        It returns the object pointed at.
+        It returns the object pointed at. The pointing inputs must have been read beforehand (see __setPointingInputs).
         
         :param easyDetection: (bool) If set to true, it focuses on the arm direction to determine the pointing direction. Then it selects the object farthest left or farthest right accordingly. 
                                     This approach works under the assumption that the useFilteredObjects is also set to true and that we are choosing between two objects. 
                                     If set to false, it finds which object gets intercepted by the pointing line segment and returns that object. If no object is detected, it returns the one closest to the line.
-        :param useYolo: (bool) In this case it tells which img topic should we subscribe to.
         
         :return object: It returns the object pointed at. The msg type can be either RecognizedObject.msg or RecognizedObjectWithMask.msg
         """ 
         if easyDetection:
-            self.getPointingDirection()
             return self.__findObjectSimplifiedVersion()
         else:
-            self.__getImg(useYolo)
-            if self.__img is None:
-                return None
-
-            self.getPointingSlope()
-            self.getPointingIntercept()
-            
-            res = self.__lineIntersectionPolygon()
-            if res != None:
-                return res
-            else:
-                return self.__findClosestObjectToLine()
+            return self.__findObjectPointedByLine()
 
 
     def __filterObjectionDetectionMsg(self, data, useFilteredObjects, classNameToBeDetected, score):
@@ -347,46 +458,107 @@ class Perception:
         
         :return object: It returns the object pointed at. The msg type can be either RecognizedObject.msg or RecognizedObjectWithMask.msg
         """ 
+        # Boxes published by the detection relay (DetectedBoxArray) or full detector results
+        objects = data.boxes if hasattr(data, 'boxes') else data.objects.objects
+
         dObjects = []
         if useFilteredObjects:
-            for obj in data.objects.objects:
+            for obj in objects:
                 if obj.class_name in classNameToBeDetected and obj.confidence > score:
                     dObjects.append(obj)
         else:
-            for obj in data.objects.objects:    
+            for obj in objects:    
                 dObjects.append(obj)
 
         return dObjects
 
 
-    def __detectronSynchronizedCallback(self, detectronMsg, depthImgMsg):
-        self.__detectionMsg = detectronMsg
-        self.__depthImg = depthImgMsg
-        self.__readDetectronMsgs = True
+    def __synchronizedDetections(self, approximateSync = False, useRelay = False):
+        """
+        It returns the synchronizer of the detectron result and the aligned depth image (matched by stamp).
+        The synchronizer is created on the first call and kept, so the callers only wait for the next matched pair.
+        
+        :param approximateSync: (bool) If set to true, the messages are matched with an approximate time policy.
+        :param useRelay: (bool) If set to true, it reads the boxes of the detection relay node instead of the full detectron result.
+        """
+        if useRelay:
+            detectronMsgObjects_topic, detectionMsgType = "/perception/detection_relay/boxes", DetectedBoxArray
+        else:
+            detectronMsgObjects_topic, detectionMsgType = "/detectron2_ros/result", detectronMsg.RecognizedObjectWithMaskArrayStamped
+        depthImg_topic = "/camera/aligned_depth_to_color/image_raw"
+
+        slop = self.__syncSlop if approximateSync else None
+        return self.__cache.getSynchronized([detectronMsgObjects_topic, depthImg_topic], [detectionMsgType, Image], slop)
+
     
+    def getDetectedBoxes(self, max_age = None):
+        """
+        It returns the boxes (class name, confidence and bounding box, without masks) published by the detection relay node. It requires the detection relay node to be running.
+        
+        :param max_age: (float) Maximum age in seconds of the boxes. If None, it defaults to 1 s.
+        
+        :return boxes: (DetectedBoxArray.msg) Boxes of the latest detectron result, already filtered by class and score by the relay.
+        """
+        detectedBoxes_topic = "/perception/detection_relay/boxes"
+        try:
+            return self.__cache.get(detectedBoxes_topic, DetectedBoxArray, self.__getMaxAge(max_age), self.__timeout)
+        except:
+            rospy.logerr("Could not get Detected Boxes!")
 
-    def __readSynchronizedMsgs(self):
-        detectronMsgObjects_topic = "/detectron2_ros/result"
-        depthImg_topic = "/camera/aligned_depth_to_color/image_raw"
 
-        detectron_sub = message_filters.Subscriber(detectronMsgObjects_topic, RecognizedObjectWithMaskArrayStamped)
-        depth_img_sub = message_filters.Subscriber(depthImg_topic, Image)
+    def getDetectionMasks(self, stamp = None, indices = []):
+        """
+        It requests the masks of some detections to the detection relay node. Only the masks are transferred, run-length encoded and cropped to their box.
+        
+        :param stamp: (rospy.Time) Stamp of the detections (header stamp of the DetectedBoxArray). If None, the latest detections are used.
+        :param indices: (list) Indices (DetectedBox.index) of the requested masks. If empty, all the masks are returned.
+        
+        :return masks: (dict) Full size uint8 mask (0 or 255) per index, or None if the masks are not available.
+        """
+        service = "/perception/detection_relay/get_masks"
+        if self.__masksProxy is None:
+            try:
+                rospy.wait_for_service(service, self.__timeout)
+            except rospy.ROSException:
+                rospy.logerr("Detection relay node must be running!")
+                return None
+            self.__masksProxy = rospy.ServiceProxy(service, GetDetectionMasks, persistent=True)
 
-        ts = message_filters.TimeSynchronizer([detectron_sub, depth_img_sub], 10)
-        ts.registerCallback(self.__detectronSynchronizedCallback)
-        rospy.sleep(5)
+        try:
+            res = self.__masksProxy(stamp if stamp is not None else rospy.Time(), indices)
+        except rospy.ServiceException as e:
+            # The persistent connection is created again on the next call
+            self.__masksProxy = None
+            rospy.logerr("Could not get Detection Masks! " + str(e))
+            return None
 
-        while not self.__readDetectronMsgs:
-            break
+        if not res.success:
+            return None
 
-        self.__readDetectronMsgs = False          
+        masks = {}
+        for m in res.masks:
+            crop = decodeMaskRle(m.counts, m.bounding_box.height, m.bounding_box.width)
+            masks[m.index] = pasteCrop(crop, m.bounding_box.x_offset, m.bounding_box.y_offset, res.height, res.width)
+        return masks
 
-    
-    def returnDetectedObjectsDetectronMsg(self):
+
+    def __boxToObjectWithMask(self, box, header):
+        # Same message the detectron publishes, with the mask of this box only
+        masks = self.getDetectionMasks(header.stamp, [box.index])
+        if masks is None or box.index not in masks:
+            rospy.logwarn("Could not get the mask of the pointed object!")
+            return None
+
+        mask = masks[box.index]
+        maskImg = Image(header=header, height=mask.shape[0], width=mask.shape[1], encoding="mono8", is_bigendian=0, step=mask.shape[1], data=mask.tobytes())
+        return detectronMsg.RecognizedObjectWithMask(class_name=box.class_name, confidence=box.confidence, bounding_box=box.bounding_box, mask=maskImg)
+
+
+    def returnDetectedObjectsDetectronMsg(self, max_age = None):
         detectronMsgDetectedObjects_topic = "/detectron2_ros/result"
 
         try:
-            data = rospy.wait_for_message(detectronMsgDetectedObjects_topic, Result, timeout = self.__timeout)
+            data = self.__cache.get(detectronMsgDetectedObjects_topic, detectronMsg.Result, self.__getMaxAge(max_age), self.__timeout)
         except:
             rospy.logerr("Could read detectron msg!")
             return None
@@ -416,42 +588,18 @@ class Perception:
             return objs_class_names
 
 
-    def __getImg(self, useYolo):
-        """
-        It reads an image from a specified topic.
-        
-        :param useYolo: (bool) It tells which topic should we subsribe to. If set to True, subscribes to YOLO image otherwise uses the camera image.
-        
-        """ 
-        bridge = CvBridge()
-
-        if useYolo == True:
-            camera_topic = "/object_detector/detection_image/compressed"
-            readImgMsg = CompressedImage
-        else:
-            camera_topic = "/camera/color/image_raw"
-            readImgMsg = Image
-
-        try:
-            data = rospy.wait_for_message(camera_topic, readImgMsg, timeout = self.__timeout)
-        except:
-            rospy.logerr("Could not read img from: " + camera_topic)
-            return
-
-        try:
-            if readImgMsg == CompressedImage:
-                self.__img = bridge.compressed_imgmsg_to_cv2(data, "bgr8")
-            else:
-                self.__img = bridge.imgmsg_to_cv2(data, "bgr8")
-
-        except CvBridgeError as e:
-            print(e)
+    def __convertImg(self, data):
+        # Raw bgr8 images are read as views over the message data, without any copy
+        img = self.__decoder.decode(data)
+        if img is None:
+            rospy.logerr("Could not convert img with encoding: " + str(getattr(data, 'encoding', getattr(data, 'format', None))))
+        return img
 
 
-    def getPointingDirection(self):
+    def getPointingDirection(self, max_age = None):
         pointingDirection_topic = "/perception/mediapipe_holistic/hand_pointing_direction"
         try:
-            data = rospy.wait_for_message(pointingDirection_topic, String, timeout = self.__timeout)
+            data = self.__cache.get(pointingDirection_topic, String, self.__getMaxAge(max_age), self.__timeout)
             self.__pointingDirection = data.data
             return self.__pointingDirection
         except:
@@ -459,10 +607,10 @@ class Perception:
 
 
     
-    def getPointingSlope(self):
+    def getPointingSlope(self, max_age = None):
         pointingSlope_topic = "/perception/mediapipe_holistic/hand_pointing_slope"
         try:
-            data = rospy.wait_for_message(pointingSlope_topic, Float32, timeout = self.__timeout)
+            data = self.__cache.get(pointingSlope_topic, Float32, self.__getMaxAge(max_age), self.__timeout)
             self.__pointingSlope = data.data
             return self.__pointingSlope
         except:
@@ -470,10 +618,10 @@ class Perception:
 
     
 
-    def getPointingIntercept(self):
+    def getPointingIntercept(self, max_age = None):
         pointingIntercept_topic = "/perception/mediapipe_holistic/hand_pointing_intercept"
         try:
-            data = rospy.wait_for_message(pointingIntercept_topic, Float32, timeout = self.__timeout)
+            data = self.__cache.get(pointingIntercept_topic, Float32, self.__getMaxAge(max_age), self.__timeout)
             self.__pointingIntercept = data.data
             return self.__pointingIntercept
         except:
@@ -516,77 +664,30 @@ class Perception:
         return None
 
 
-    def __lineIntersectionPolygon(self):
-        if self.__pointingSlope != None and self.__pointingIntercept != None:
-            h, w, c = self.__img.shape
-            x1, x2 = 0, w
-            y1, y2 = self.__pointingIntercept * x1 + self.__pointingIntercept, self.__pointingSlope * x2 + self.__pointingIntercept
-            line = Line(Point(x1, y1), Point(x2, y2))
-
-            for obj in self.__detectedObjects:
-                x_top_left = obj.bounding_box.x_offset
-                y_top_left = obj.bounding_box.y_offset
-
-                x_bottom_left = obj.bounding_box.x_offset
-                y_bottom_left = obj.bounding_box.y_offset + obj.bounding_box.height
-
-                x_top_right = obj.bounding_box.x_offset + obj.bounding_box.width
-                y_top_right = obj.bounding_box.y_offset
-
-                x_bottom_right = obj.bounding_box.x_offset + obj.bounding_box.width
-                y_bottom_right = obj.bounding_box.y_offset + obj.bounding_box.height
-        
-                p1, p2, p3, p4, p5 = map(Point, [(x_bottom_left, y_bottom_left), (x_bottom_right, y_bottom_right), (x_top_right, y_top_right), (x_top_left, y_top_left), (x_bottom_left, y_bottom_left)])
-                
-                poly = Polygon(p1, p2, p3, p4, p5)
-
-                isIntersection = poly.intersection(line)
-
-                if isIntersection != []:
-                    return obj
-
-        return None
-
-
-    def __findClosestObjectToLine(self):
-        returnObject = None
-        returnDist = None
-        
-        if self.__pointingSlope != None and self.__pointingIntercept != None:
-            perpendicularLineSlope = -1 / self.__pointingSlope
-
-            for idx, obj in enumerate(self.__detectedObjects):
-                # Find Bounding Box Center
-                obj_boundingBoxCenter_x = obj.bounding_box.x_offset + obj.bounding_box.width / 2
-                obj_boundingBoxCenter_y = obj.bounding_box.y_offset + obj.bounding_box.height / 2
+    def __findObjectPointedByLine(self):
+        """
+        It returns the object crossed by the pointing line segment or, if none is crossed, the object closest to the line.
+        """
+        if self.__pointingSlope == None or self.__pointingIntercept == None:
+            return None
 
-                # Find Intercept of the perpendicular line
-                perpendicularLineIntercept = obj_boundingBoxCenter_y - perpendicularLineSlope * obj_boundingBoxCenter_x
+        h, w, c = self.__img.shape
+        return self.__objectPointedByLine(self.__detectedObjects, self.__pointingSlope, self.__pointingIntercept, w)
 
-                # Find Intersection (Point)
-                inter_x = (perpendicularLineIntercept - self.__pointingIntercept) / (self.__pointingSlope - perpendicularLineSlope)
-                inter_y = self.__pointingSlope * inter_x + self.__pointingIntercept
 
-                # Compute Distance between those two points (intersection and bounding box center)
-                dx = math.pow(obj_boundingBoxCenter_x - inter_x, 2)
-                dy = math.pow(obj_boundingBoxCenter_y - inter_y, 2)
-                dist = math.sqrt(dx + dy)
-                
-                if idx == 0:
-                    returnObject = obj
-                    returnDist = dist
-                
-                if idx > 0 and returnDist > dist:
-                    returnObject = obj
-                    returnDist = dist
+    def __objectPointedByLine(self, objects, slope, intercept, width):
+        origin, direction, length = pointingLine(slope, intercept, width=width)
+        order, scores, intersects, distances = resolvePointingTarget(boundingBoxesToArray(objects), origin, direction, 0, length)
+        if len(order) == 0:
+            return None
 
-        return returnObject
+        return objects[order[0]]
 
 
-    def getPoseWorldLandmarks(self):
+    def getPoseWorldLandmarks(self, max_age = None):
         poseWorldLandmarks_topic = "/perception/mediapipe_holistic/pose_world_landmarks"
         try:
-            data = rospy.wait_for_message(poseWorldLandmarks_topic, MediapipePointInfoArray, timeout = self.__timeout)
+            data = self.__cache.get(poseWorldLandmarks_topic, MediapipePointInfoArray, self.__getMaxAge(max_age), self.__timeout)
             self.__poseWorldLandmarks = data
             return self.__poseWorldLandmarks
         except:
@@ -594,10 +695,10 @@ class Perception:
 
 
 
-    def getFaceLandmarks(self):
+    def getFaceLandmarks(self, max_age = None):
         faceLandmarks_topic = "/perception/mediapipe_holistic/face_landmarks"
         try:
-            data = rospy.wait_for_message(faceLandmarks_topic, MediapipePointInfoArray, timeout = self.__timeout)
+            data = self.__cache.get(faceLandmarks_topic, MediapipePointInfoArray, self.__getMaxAge(max_age), self.__timeout)
             self.__faceLandmarks = data
             return self.__faceLandmarks
         except:
@@ -605,10 +706,10 @@ class Perception:
 
 
 
-    def getImgPoseLandmarks(self):
+    def getImgPoseLandmarks(self, max_age = None):
         imgPoseLandmarks_topic = "/perception/mediapipe_holistic/img_pose_landmarks"
         try:
-            data = rospy.wait_for_message(imgPoseLandmarks_topic, MediapipePointInfoArray, timeout = self.__timeout)
+            data = self.__cache.get(imgPoseLandmarks_topic, MediapipePointInfoArray, self.__getMaxAge(max_age), self.__timeout)
             self.__imgPoseLandmarks = data
             return self.__imgPoseLandmarks
         except:
@@ -616,10 +717,10 @@ class Perception:
 
 
     
-    def getRightHandLandmarks(self):
+    def getRightHandLandmarks(self, max_age = None):
         rightHandLandmarks_topic = "/perception/mediapipe_holistic/right_hand_landmarks"
         try:
-            data = rospy.wait_for_message(rightHandLandmarks_topic, MediapipePointInfoArray, timeout = self.__timeout)
+            data = self.__cache.get(rightHandLandmarks_topic, MediapipePointInfoArray, self.__getMaxAge(max_age), self.__timeout)
             self.__rightHandLandmarks = data
             return self.__rightHandLandmarks
         except:
@@ -627,10 +728,10 @@ class Perception:
 
 
 
-    def getLeftHandLandmarks(self):
+    def getLeftHandLandmarks(self, max_age = None):
         leftHandLandmarks_topic = "/perception/mediapipe_holistic/left_hand_landmarks"
         try:
-            data = rospy.wait_for_message(leftHandLandmarks_topic, MediapipePointInfoArray, timeout = self.__timeout)
+            data = self.__cache.get(leftHandLandmarks_topic, MediapipePointInfoArray, self.__getMaxAge(max_age), self.__timeout)
             self.__leftHandLandmarks = data
             return self.__leftHandLandmarks
         except:
@@ -638,10 +739,10 @@ class Perception:
 
 
 
-    def getHipLength(self):
+    def getHipLength(self, max_age = None):
         hipLength_topic = "/perception/mediapipe_holistic/hip_length"
         try:
-            data = rospy.wait_for_message(hipLength_topic, Float32, timeout = self.__timeout)
+            data = self.__cache.get(hipLength_topic, Float32, self.__getMaxAge(max_age), self.__timeout)
             self.__hipLength = data.data
             return self.__hipLength
         except:
@@ -649,10 +750,10 @@ class Perception:
 
 
     
-    def getTorsoLength(self):
+    def getTorsoLength(self, max_age = None):
         torsoLength_topic = "/perception/mediapipe_holistic/torso_length"
         try:
-            data = rospy.wait_for_message(torsoLength_topic, Float32, timeout = self.__timeout)
+            data = self.__cache.get(torsoLength_topic, Float32, self.__getMaxAge(max_age), self.__timeout)
             self.__torsoLength = data.data
             return self.__torsoLength
         except:
@@ -660,10 +761,10 @@ class Perception:
 
    
    
-    def getShoulderLength(self):
+    def getShoulderLength(self, max_age = None):
         shoulderLength_topic = "/perception/mediapipe_holistic/shoulder_length"
         try:
-            data = rospy.wait_for_message(shoulderLength_topic, Float32, timeout = self.__timeout)
+            data = self.__cache.get(shoulderLength_topic, Float32, self.__getMaxAge(max_age), self.__timeout)
             self.__shoulderLength = data.data
             return self.__shoulderLength
         except:
@@ -671,10 +772,10 @@ class Perception:
 
     
     
-    def getRightArmLength(self):
+    def getRightArmLength(self, max_age = None):
         rightArmLength_topic = "/perception/mediapipe_holistic/right_arm_length"
         try:
-            data = rospy.wait_for_message(rightArmLength_topic, Float32, timeout = self.__timeout)
+            data = self.__cache.get(rightArmLength_topic, Float32, self.__getMaxAge(max_age), self.__timeout)
             self.__rigthArmLength = data.data
             return self.__rigthArmLength
         except:
@@ -682,10 +783,10 @@ class Perception:
 
     
     
-    def getLeftArmLength(self):
+    def getLeftArmLength(self, max_age = None):
         leftArmLength_topic = "/perception/mediapipe_holistic/left_arm_length"
         try:
-            data = rospy.wait_for_message(leftArmLength_topic, Float32, timeout = self.__timeout)
+            data = self.__cache.get(leftArmLength_topic, Float32, self.__getMaxAge(max_age), self.__timeout)
             self.__leftArmLength = data.data
             return self.__leftArmLength
         except:
@@ -693,10 +794,49 @@ class Perception:
 
 
 
-    def getPeopleDetection(self):
+    def getBodyMeasurements(self, max_age = None, stamp_tolerance = None):
+        """
+        It returns all the body measurements published by the mediapipe holistic node, read together with a single deadline. It requires the mediapipe holistic node to be running.
+        
+        :param max_age: (float) Maximum age in seconds of the measurements. If None, it defaults to 1 s.
+        :param stamp_tolerance: (float) If given, the measurements are only accepted when they were received within this tolerance (in seconds) of each other.
+        
+        :return measurements: (dict) Hip, torso, shoulder, right arm and left arm lengths.
+        """
+        names = ["hip_length", "torso_length", "shoulder_length", "right_arm_length", "left_arm_length"]
+        requests = [("/perception/mediapipe_holistic/" + name, Float32) for name in names]
+        msgs = self.gather(requests, max_age, stamp_tolerance)
+        if msgs is None:
+            rospy.logerr("Could not get Body Measurements!")
+            return None
+
+        self.__hipLength, self.__torsoLength, self.__shoulderLength, self.__rigthArmLength, self.__leftArmLength = [msg.data for msg in msgs]
+        return {name: msg.data for name, msg in zip(names, msgs)}
+
+
+
+    def gather(self, requests, max_age = None, stamp_tolerance = None):
+        """
+        It waits on several topics concurrently, with one shared deadline. The worst case latency is the slowest topic instead of the sum of all of them.
+        
+        :param requests: (list) (topic, msgType) pairs.
+        :param max_age: (float) Maximum age in seconds of the messages. If None, it defaults to 1 s.
+        :param stamp_tolerance: (float) If given, the messages are only accepted when their stamps (header stamp, or receipt time for messages without header) are within this tolerance (in seconds) of each other.
+        
+        :return msgs: (list) One message per request, or None if they are not available before the deadline.
+        """
+        try:
+            return self.__cache.gather(requests, self.__getMaxAge(max_age), self.__timeout, stamp_tolerance)
+        except rospy.ROSException as e:
+            rospy.logerr(str(e))
+            return None
+
+
+
+    def getPeopleDetection(self, max_age = None):
         peopleDetection_topic = "/perception/reid/current_detection"
         try:
-            data = rospy.wait_for_message(peopleDetection_topic, ReidInfoArray, timeout = self.__timeout)
+            data = self.__cache.get(peopleDetection_topic, ReidInfoArray, self.__getMaxAge(max_age), self.__timeout)
             self.__peopleDetection = data.reidArr
             return self.__peopleDetection
         except:
@@ -704,16 +844,48 @@ class Perception:
 
     
     
-    def getPeopleDetectionRecord(self):
+    def getPeopleDetectionRecord(self, max_age = None):
         peopleDetectionRecord_topic = "/perception/reid/detection_record"
         try:
-            data = rospy.wait_for_message(peopleDetectionRecord_topic, ReidInfoArray, timeout = self.__timeout)
+            data = self.__cache.get(peopleDetectionRecord_topic, ReidInfoArray, self.__getMaxAge(max_age), self.__timeout)
             self.__peopleDetectionRecord = data.reidArr
             return self.__peopleDetectionRecord
         except:
             rospy.logerr("Could not get People Detection Record!")
 
 
+    def getReidAliases(self, max_age = None):
+        """
+        It returns the ids of the identities merged by the reid node and the id they were merged into. It requires the reid node to be running.
+        
+        :param max_age: (float) Maximum age in seconds of the alias map. If None, the latest map is returned.
+        
+        :return aliases: (dict) It maps each merged id to its current id.
+        """
+        reidAliases_topic = "/perception/reid/identity_aliases"
+        try:
+            # The alias map is latched and only published when it changes, so any cached map is valid
+            data = self.__cache.get(reidAliases_topic, ReidAliasArray, max_age, self.__timeout)
+            return {a.alias: a.id for a in data.aliasArr}
+        except:
+            rospy.logerr("Could not get Reid Aliases!")
+
+
+    def resolveReidId(self, reid_id):
+        """
+        It returns the current id of an identity, since the reid node may have merged it into another one.
+        
+        :param reid_id: (string) Id previously returned by the reid node.
+        
+        :return reid_id: (string) The current id of the identity.
+        """
+        aliases = self.getReidAliases()
+        if aliases is None:
+            return reid_id
+
+        return aliases.get(reid_id, reid_id)
+
+
     def getClosestPersonToCamera(self):
         detections = self.getPeopleDetection()
         if detections is None:
@@ -732,85 +904,175 @@ class Perception:
         return detections[person_idx]        
             
     
-    def readSweaterColor(self):
+    def readSweaterColor(self, max_age = None):
         sweaterColor_topic = "/perception/mediapipe_holistic/sweater_color"
         try:
-            data = rospy.wait_for_message(sweaterColor_topic, String, timeout = self.__timeout)
+            data = self.__cache.get(sweaterColor_topic, String, self.__getMaxAge(max_age), self.__timeout)
             self.__sweaterColor = data.data
             return self.__sweaterColor
         except:
             rospy.logerr("Could not get Sweater/T-shirt color!")
 
 
+    def getNodeStatus(self, node, max_age = None):
+        """
+        It returns the status of a perception node: state (stopped, starting or running), models loaded, frame rates, frame counters and last processed frame stamp.
+
+        :param node: (string) 'reid' or 'mediapipe_holistic'.
+        :param max_age: (float) Maximum age in seconds of the returned status. If None, it defaults to 1 s.
+
+        :return status: (NodeStatus.msg) The status, or None if the node is not publishing it.
+        """
+        try:
+            return self.__cache.get("/perception/" + node + "/status", NodeStatus, self.__getMaxAge(max_age), self.__timeout)
+        except:
+            rospy.logerr("The status of the " + node + " node is not being published!")
+            return None
+
+
+    def waitNodeRunning(self, node, newerThan = None, timeout = 10.0):
+        """
+        It waits until a perception node is running (subscribed to the camera, with its models loaded) and, if requested, has processed a frame stamped after a given time.
+
+        :param node: (string) 'reid' or 'mediapipe_holistic'.
+        :param newerThan: (rospy.Time) If given, the last processed frame must be stamped after this time.
+        :param timeout: (float) Maximum time in seconds to wait.
+
+        :return status: (NodeStatus.msg) The status that satisfied the condition, or None on timeout.
+        """
+        def running(status):
+            if status.state != "running":
+                return False
+            return newerThan is None or status.last_frame_stamp > newerThan
+
+        status = self.__cache.waitFor("/perception/" + node + "/status", NodeStatus, running, timeout)
+        if status is None:
+            rospy.logwarn("The " + node + " node is not running!")
+        return status
+
+
     def ___eventIn(self, msg, option):
-        publishMsg = True
-        if option == "reid":
-            pub = rospy.Publisher("/perception/reid/event_in", String, queue_size=10)
-        elif option == "mediapipe_holistic":
-            pub = rospy.Publisher("/perception/mediapipe_holistic/event_in", String, queue_size=10)
-        elif option == "detectron":
-            pub = rospy.Publisher("/detectron2_ros/event_in", String, queue_size=10)
-        else:
-            publishMsg = False    
-        
-        rospy.sleep(1)
-        
-        if publishMsg:
-            e = String()
-            e.data = msg
-            pub.publish(e)
+        topics = {
+            "reid": "/perception/reid/event_in",
+            "mediapipe_holistic": "/perception/mediapipe_holistic/event_in",
+            "reid_pin": "/perception/reid/pin_identity",
+            "detectron": "/detectron2_ros/event_in",
+        }
+        if option not in topics:
+            return False
+
+        topic = topics[option]
+        channel = self.__eventChannels.get(topic)
+        if channel is None:
+            channel = eventChannel(topic, ackTopicFor(topic))
+            self.__eventChannels[topic] = channel
+
+        return channel.send(msg, self.__timeout)
     
     
     def startReid(self):
-        self.___eventIn("e_start", "reid")
+        return self.___eventIn("e_start", "reid")
     
 
     def stopReid(self):
-        self.___eventIn("e_stop", "reid")
+        return self.___eventIn("e_stop", "reid")
     
     
     def resetReid(self):
-        self.___eventIn("e_reset", "reid")
+        return self.___eventIn("e_reset", "reid")
     
     
     def takePhotoReid(self):
-        self.___eventIn("e_take_photo", "reid")
+        return self.___eventIn("e_take_photo", "reid")
     
     
+    def pinReidIdentity(self, reid_id):
+        return self.___eventIn(reid_id, "reid_pin")
+
+
     def enableAutomaticReid(self):
-        self.___eventIn("e_enable_automatic", "reid")
+        return self.___eventIn("e_enable_automatic", "reid")
     
     
     def disableAutomaticReid(self):
-        self.___eventIn("e_disable_automatic", "reid")
+        return self.___eventIn("e_disable_automatic", "reid")
+
+
+    def enableOnDemandReid(self):
+        return self.___eventIn("e_on_demand", "reid")
+
+
+    def disableOnDemandReid(self):
+        return self.___eventIn("e_continuous", "reid")
+
+
+    def triggerReid(self, frames = 1, timeout = 3.0):
+        return self.__trigger("reid", frames, timeout)
 
 
     def startMediapipeHolistic(self):
-        self.___eventIn("e_start", "mediapipe_holistic")
+        return self.___eventIn("e_start", "mediapipe_holistic")
 
     
     def stopMediapipeHolistic(self):
-        self.___eventIn("e_stop", "mediapipe_holistic")
+        return self.___eventIn("e_stop", "mediapipe_holistic")
     
     
     def resetMediapipeHolistic(self):
-        self.___eventIn("e_reset", "mediapipe_holistic")
+        return self.___eventIn("e_reset", "mediapipe_holistic")
+
+
+    def enableOnDemandMediapipeHolistic(self):
+        return self.___eventIn("e_on_demand", "mediapipe_holistic")
+
+
+    def disableOnDemandMediapipeHolistic(self):
+        return self.___eventIn("e_continuous", "mediapipe_holistic")
+
+
+    def triggerMediapipeHolistic(self, frames = 1, timeout = 3.0):
+        return self.__trigger("mediapipe_holistic", frames, timeout)
+
+
+    def __trigger(self, node, frames, timeout):
+        """
+        It asks a node running on demand to process the next frames, and waits until their results are published.
+
+        :param node: (string) 'reid' or 'mediapipe_holistic'.
+        :param frames: (int) Number of frames to process.
+        :param timeout: (float) Maximum time in seconds to wait.
+
+        :return res: (TriggerProcessingResponse) success, stamp of the last processed frame and number of frames processed, or None if the service is not available.
+        """
+        service = "/perception/" + node + "/trigger"
+        try:
+            proxy = self.__triggerProxies.get(node)
+            if proxy is None:
+                rospy.wait_for_service(service, timeout)
+                proxy = rospy.ServiceProxy(service, TriggerProcessing, persistent = True)
+                self.__triggerProxies[node] = proxy
+            return proxy(frames, timeout)
+        except (rospy.ROSException, rospy.ServiceException) as e:
+            rospy.logerr("Could not trigger the " + node + " node! " + str(e))
+            # The persistent connection is dropped, it is created again on the next call
+            self.__triggerProxies.pop(node, None)
+            return None
 
 
     def startDetectron(self):    
-        self.___eventIn("e_start", "detectron")
+        return self.___eventIn("e_start", "detectron")
     
 
     def startDetectronTopics(self):    
-        self.___eventIn("e_start_topics", "detectron")
+        return self.___eventIn("e_start_topics", "detectron")
 
 
     def stopDetectron(self):    
-        self.___eventIn("e_stop", "detectron")
+        return self.___eventIn("e_stop", "detectron")
     
 
     def stopDetectronTopics(self):    
-        self.___eventIn("e_stop_topics", "detectron")
+        return self.___eventIn("e_stop_topics", "detectron")
 
     # def get_object_pose(self, pointing_object, depth_frame=None):
     #     if pointing_object == None:
@@ -9,9 +9,11 @@ import math
 
 from std_msgs.msg import String, Float32
 from sensor_msgs.msg import Image, CompressedImage
-from cv_bridge import CvBridge, CvBridgeError
+from imageConversionModule import imageDecoder
 from darknet_ros_py.msg import RecognizedObjectArrayStamped
-from sympy import Point, Polygon, Line
+from waitModule import waitCondition
+from historyModule import stampedHistory, messageStamp
+from pointingModule import boundingBoxesToArray, pointingLine, resolvePointingTarget
 
 
 class Perception:
@@ -22,7 +24,9 @@ class Perception:
         self.pointingDirection = None
         self.pointingSlope = None
         self.pointingIntercept = None
-        self.bridge = CvBridge()
+        # Only the image size is used, so raw images are read as views over the message data
+        self.decoder = imageDecoder(reuseBuffer=False)
+        self.condition = waitCondition()
 
         # Handle CTRL-C Interruption
         signal.signal(signal.SIGINT, self.handler)
@@ -36,6 +40,8 @@ class Perception:
         # Variables
         self.detectedObjects = []
         self.filteredObjects = []
+        # Filtered objects of the last frames, keyed by stamp. detectedObjects holds the objects of the latest frame only
+        self.detectionHistory = stampedHistory(30)
 
         # Msgs are defined in the mediapipeHolisticnode
         self.pointingLeftMsg = "left"
@@ -73,68 +79,75 @@ class Perception:
         self.pointingIntercept_sub = rospy.Subscriber(self.pointingIntercept_topic, Float32, self.getPointingIntercept)
 
     
-    def run(self):
-        while(not self.readObj):
-            rospy.loginfo("Waiting for Object Detection...")
+    def run(self, timeout = None):
+        # The callbacks notify the condition, so the waits sleep instead of spinning. They end on timeout or shutdown
+        rospy.loginfo("Waiting for Object Detection...")
+        if not self.condition.waitFor(lambda: self.readObj, timeout):
+            rospy.logwarn("Object Detection is not being published!")
+            return None
 
         if self.detectedObjects == []:
             rospy.loginfo("No objects were detected!")
 
         if self.easyDetection:
-            while(self.pointingDirection is None):
-                rospy.loginfo("Getting pointing direction...")
+            rospy.loginfo("Getting pointing direction...")
+            if not self.condition.waitFor(lambda: self.pointingDirection is not None, timeout):
+                return None
 
             return  self.findObjectSimplifiedVersion()
         
         else:
-            while(self.img is None):
-                rospy.loginfo("Getting img...")
+            rospy.loginfo("Getting img, pointing slope and intercept...")
+            if not self.condition.waitFor(lambda: self.img is not None and self.pointingSlope is not None and self.pointingIntercept is not None, timeout):
+                return None
 
-            while(self.pointingSlope is None and self.pointingIntercept is None):
-                rospy.loginfo("Getting pointing slope and intercept...")
-
-            res = self.lineIntersectionPolygon()
-            if res != None:
-                return res
-            else:
-                return self.findClosestObjectToLine()
+            return self.findObjectPointedByLine()
 
 
 
     def imgCallback(self, data):
-        try:
-            if self.readImgCompressed:
-                self.img = self.bridge.compressed_imgmsg_to_cv2(data, "bgr8")
-            else:
-                self.img = self.bridge.imgmsg_to_cv2(data, "bgr8")
-
+        img = self.decoder.decode(data)
+        if img is None:
+            return
 
-        except CvBridgeError as e:
-            print(e)
+        with self.condition:
+            self.img = img
+            self.condition.notify()
 
 
     def getPointingDirection(self, data):
-        self.pointingDirection = data.data
+        with self.condition:
+            self.pointingDirection = data.data
+            self.condition.notify()
 
     
     def getPointingSlope(self, data):
-        self.pointingSlope = data.data
+        with self.condition:
+            self.pointingSlope = data.data
+            self.condition.notify()
 
     
     def getPointingIntercept(self, data):
-        self.pointingIntercept = data.data
+        with self.condition:
+            self.pointingIntercept = data.data
+            self.condition.notify()
 
 
     def readDetectedObjects(self, data):
+        detectedObjects = []
         if self.useFilteredObjects:
             for obj in data.objects.objects:
                 if obj.class_name == self.classNameToBeDetected:
-                    self.detectedObjects.append(obj)
+                    detectedObjects.append(obj)
         else:
             for obj in data.objects.objects:    
-                self.detectedObjects.append(obj)
+                detectedObjects.append(obj)
 
-        self.readObj = True
+        with self.condition:
+            self.detectionHistory.add(messageStamp(data, rospy.get_time()), detectedObjects)
+            self.detectedObjects = self.detectionHistory.latest()[1]
+            self.readObj = True
+            self.condition.notify()
 
     
     def findObjectSimplifiedVersion(self):
@@ -163,70 +176,18 @@ class Perception:
         return None
 
 
-    def lineIntersectionPolygon(self):
-        if self.pointingSlope != None and self.pointingIntercept != None:
-            h, w, c = self.img.shape
-            x1, x2 = 0, w
-            y1, y2 = self.pointingIntercept * x1 + self.pointingIntercept, self.pointingSlope * x2 + self.pointingIntercept
-            line = Line(Point(x1, y1), Point(x2, y2))
-            for obj in self.detectedObjects:
-                x_top_left = obj.bounding_box.x_offset
-                y_top_left = obj.bounding_box.y_offset
-
-                x_bottom_left = obj.bounding_box.x_offset
-                y_bottom_left = obj.bounding_box.y_offset + obj.bounding_box.height
-
-                x_top_right = obj.bounding_box.x_offset + obj.bounding_box.width
-                y_top_right = obj.bounding_box.y_offset
-
-                x_bottom_right = obj.bounding_box.x_offset + obj.bounding_box.width
-                y_bottom_right = obj.bounding_box.y_offset + obj.bounding_box.height
-        
-                p1, p2, p3, p4, p5 = map(Point, [(x_bottom_left, y_bottom_left), (x_bottom_right, y_bottom_right), (x_top_right, y_top_right), (x_top_left, y_top_left), (x_bottom_left, y_bottom_left)])
-                
-                poly = Polygon(p1, p2, p3, p4, p5)
+    def findObjectPointedByLine(self):
+        # Object crossed by the pointing line segment or, if none is crossed, the object closest to the line
+        if self.pointingSlope == None or self.pointingIntercept == None:
+            return None
 
-                isIntersection = poly.intersection(line)
+        h, w, c = self.img.shape
+        origin, direction, length = pointingLine(self.pointingSlope, self.pointingIntercept, width=w)
+        order, scores, intersects, distances = resolvePointingTarget(boundingBoxesToArray(self.detectedObjects), origin, direction, 0, length)
+        if len(order) == 0:
+            return None
 
-                if isIntersection != []:
-                    return obj
-
-        return None
-
-
-    def findClosestObjectToLine(self):
-        returnObject = None
-        returnDist = None
-        
-        if self.pointingSlope != None and self.pointingIntercept != None:
-            perpendicularLineSlope = -1 / self.pointingSlope
-
-            for idx, obj in enumerate(self.detectedObjects):
-                # Find Bounding Box Center
-                obj_boundingBoxCenter_x = obj.bounding_box.x_offset + obj.bounding_box.width / 2
-                obj_boundingBoxCenter_y = obj.bounding_box.y_offset + obj.bounding_box.height / 2
-
-                # Find Intercept of the perpendicular line
-                perpendicularLineIntercept = obj_boundingBoxCenter_y - perpendicularLineSlope * obj_boundingBoxCenter_x
-
-                # Find Intersection (Point)
-                inter_x = (perpendicularLineIntercept - self.pointingIntercept) / (self.pointingSlope - perpendicularLineSlope)
-                inter_y = self.pointingSlope * inter_x + self.pointingIntercept
-
-                # Compute Distance between those two points (intersection and bounding box center)
-                dx = math.pow(obj_boundingBoxCenter_x - inter_x, 2)
-                dy = math.pow(obj_boundingBoxCenter_y - inter_y, 2)
-                dist = math.sqrt(dx + dy)
-                
-                if idx == 0:
-                    returnObject = obj
-                    returnDist = dist
-                
-                if idx > 0 and returnDist > dist:
-                    returnObject = obj
-                    returnDist = dist
-
-        return returnObject
+        return self.detectedObjects[order[0]]
 
 
 
@@ -55,9 +55,9 @@ if __name__ == '__main__':
         welcoming_guest_sub_sm = WelcomeGuestSmach(success='success', failure='failure')
 
         #Add states to the container
-        smach.StateMachine.add('START_REID', send_event([('/perception/reid/event_in', 'e_start')]), transitions={'success': 'WAIT_FOR_REID_INIT'})
+        smach.StateMachine.add('START_REID', send_event([('/perception/reid/event_in', 'e_start')]), transitions={'success': 'WAIT_FOR_REID_INIT', 'failure': 'failure'})
 
-        smach.StateMachine.add('WAIT_FOR_REID_INIT', Sleep(0.5),transitions={'success': 'WELCOME_GUEST_1_SUB_SMACH'})
+        smach.StateMachine.add('WAIT_FOR_REID_INIT', WaitForNode('reid'),transitions={'success': 'WELCOME_GUEST_1_SUB_SMACH', 'failure': 'START_REID'})
 
         smach.StateMachine.add('WELCOME_GUEST_1_SUB_SMACH', welcoming_guest_sub_sm, transitions={'success': 'GET_OK_1', 'failure': 'failure'})
         
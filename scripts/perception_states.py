@@ -2,11 +2,17 @@
 
 import rospy
 import smach
-import std_msgs
 
 # perception.py script
 from perception import *
-perception_object = Perception() 
+from eventChannelModule import eventChannel, ackTopicFor
+
+
+def perception_object():
+    # The Perception singleton is created by the first state that uses it, not when the state machine is imported
+    if Perception._instance is None:
+        Perception()
+    return Perception._instance
 
 from perception_states_db import SemanticMapping, Person
 # Semantic Mapping Global Variable Initialization
@@ -30,7 +36,7 @@ class CurrentPeopleDetection(smach.State):
         self.genderList = ['Male', 'Female']
 
     def execute(self,userdata):
-        detectionList = perception_object.getPeopleDetection()
+        detectionList = perception_object().getPeopleDetection()
         if detectionList == 'None':
             self.return_phrase = "My eyes are not seeing anyone"
             return 'failute'
@@ -127,7 +133,7 @@ class DetectPointingDirection(smach.State):
         smach.State.__init__(self, outcomes=['left', 'right','failure'], input_keys=['in_data'])
 
     def execute(self,userdata):
-        pointingDirection = perception_object.getPointingDirection()
+        pointingDirection = perception_object().getPointingDirection()
 
         if pointingDirection == 'left':
             return 'left'
@@ -225,7 +231,7 @@ class SeeingPeople(smach.State):
 
     def execute(self,userdata):
         try:
-            detection = perception_object.getPeopleDetection()
+            detection = perception_object().getPeopleDetection()
         except:
             return 'failure'
 
@@ -248,7 +254,7 @@ class SavePersonInfo(smach.State):
 
     def execute(self,userdata):
         try:
-            detection = perception_object.getClosestPersonToCamera()
+            detection = perception_object().getClosestPersonToCamera()
         except:
             return 'failure'
 
@@ -262,6 +268,9 @@ class SavePersonInfo(smach.State):
         semanticMap.persons[len(semanticMap.persons) - 1].age_range = detection.ageRange
         semanticMap.persons[len(semanticMap.persons) - 1].gender = detection.gender
 
+        # Named guests must never be evicted from the reid gallery
+        perception_object().pinReidIdentity(detection.id)
+
         rospy.logwarn(str(semanticMap.persons[len(semanticMap.persons) - 1].name))
         rospy.logwarn(str(semanticMap.persons[len(semanticMap.persons) - 1].favorite_drink))
         rospy.logwarn(str(semanticMap.persons[len(semanticMap.persons) - 1].reid_id))
@@ -279,14 +288,15 @@ class send_event(smach.State):
     '''
     This state will take a list of event as input. Which are pair of name and value to publish.
     Output of this node is to publish the value in the provided topic name.
+    outcomes: 'success' or 'failure' (a node is not listening or did not acknowledge its event)
     '''
 
     def __init__(self, event_list):
-        smach.State.__init__(self, outcomes=['success'])
+        smach.State.__init__(self, outcomes=['success', 'failure'])
         self.event_publisher_list = []
         self.expected_return_values_ = []
         self.event_names_ = []
-        self.possible_event_values = ['e_start', 'e_stop', 'e_trigger', 'e_forget', 'e_take_photo']
+        self.possible_event_values = ['e_start', 'e_stop', 'e_trigger', 'e_forget', 'e_take_photo', 'e_on_demand', 'e_continuous']
         for event in event_list:
             if len(event) != 2:
                 rospy.logerr('The event list is malformed!!')
@@ -298,16 +308,40 @@ class send_event(smach.State):
             event_name = event[0]
             self.event_names_.append(event_name)
             self.expected_return_values_.append(event[1].lower())
-            self.event_publisher_list.append(rospy.Publisher(event_name, std_msgs.msg.String, queue_size=1))
-
-        # give some time for the publishers to register in the network
-        rospy.sleep(0.1)
+            self.event_publisher_list.append(eventChannel(event_name, ackTopicFor(event_name)))
 
     def execute(self, userdata):
+        # Each event waits for the node to be connected and to acknowledge it, instead of a fixed sleep
+        outcome = 'success'
         for index in range(len(self.event_publisher_list)):
-            self.event_publisher_list[index].publish(self.expected_return_values_[index])
+            if not self.event_publisher_list[index].send(self.expected_return_values_[index]):
+                rospy.logwarn('The event %s was not acknowledged on %s', self.expected_return_values_[index],
+                              self.event_names_[index])
+                outcome = 'failure'
+                continue
             rospy.logdebug('Published the event_name: %s event_value: %s', self.event_names_[index],
                            self.expected_return_values_[index])
+        return outcome
+
+
+class WaitForNode(smach.State):
+    '''
+    This state waits until a perception node is running (subscribed to the camera, with its models loaded) and, if newFrame is set,
+    until it has processed a frame stamped after the state started (plus adjustment seconds, e.g. to give a person time to move before the
+    frame is taken). It replaces fixed sleeps after sending e_start or asking a person to move.
+    outcomes: 'success' or 'failure' (timeout)
+    '''
+    def __init__(self, node, newFrame = True, timeout = 10.0, adjustment = 0.0):
+        smach.State.__init__(self, outcomes=['success', 'failure'])
+        self.node = node
+        self.newFrame = newFrame
+        self.timeout = timeout
+        self.adjustment = adjustment
+
+    def execute(self, userdata):
+        newerThan = rospy.Time.now() + rospy.Duration(self.adjustment) if self.newFrame else None
+        if perception_object().waitNodeRunning(self.node, newerThan, self.timeout) is None:
+            return 'failure'
         return 'success'
 
 
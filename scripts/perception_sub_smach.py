@@ -30,10 +30,10 @@ class WelcomeGuestSmach(smach.StateMachine):
 
             smach.StateMachine.add('TIAGO_CHECK_DETECTION_FAILURE', PrintMsg("I can not see your face properly. Please get in front of me"), transitions={'success': 'WAIT_FOR_PERSON_ADJUSTMENT', 'failure': 'TIAGO_CHECK_DETECTION_FAILURE'})
 
-            smach.StateMachine.add('WAIT_FOR_PERSON_ADJUSTMENT', Sleep(0.5),transitions={'success': 'TIAGO_CHECK_DETECTION_ATTEMPT'})
+            smach.StateMachine.add('WAIT_FOR_PERSON_ADJUSTMENT', WaitForNode('reid', adjustment = 0.5),transitions={'success': 'TIAGO_CHECK_DETECTION_ATTEMPT', 'failure': 'failure'})
 
             smach.StateMachine.add('TIAGO_CHECK_DETECTION_ATTEMPT', PrintMsg("Let's try again"), transitions={'success': 'TIAGO_CHECK_DETECTION', 'failure': 'TIAGO_CHECK_DETECTION_ATTEMPT'})
 
-            smach.StateMachine.add('TAKE_PHOTO_REID', send_event([('/perception/reid/event_in', 'e_take_photo')]), transitions={'success': 'SAVING_REID_INFO'})
+            smach.StateMachine.add('TAKE_PHOTO_REID', send_event([('/perception/reid/event_in', 'e_take_photo')]), transitions={'success': 'SAVING_REID_INFO', 'failure': 'failure'})
 
             smach.StateMachine.add('SAVING_REID_INFO', SavePersonInfo(), transitions={'success': 'success', 'failure': 'TIAGO_CHECK_DETECTION_FAILURE'})
\ No newline at end of file
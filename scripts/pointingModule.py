@@ -0,0 +1,88 @@
+import numpy as np
+
+
+def boundingBoxesToArray(objects):
+    # One row (x_min, y_min, x_max, y_max) per detected object
+    boxes = [[o.bounding_box.x_offset,
+              o.bounding_box.y_offset,
+              o.bounding_box.x_offset + o.bounding_box.width,
+              o.bounding_box.y_offset + o.bounding_box.height] for o in objects]
+    return np.array(boxes, dtype=np.float64).reshape(-1, 4)
+
+
+def pointingLine(slope, intercept, width = None, x = None):
+    """
+    It converts the pointing line published by the mediapipe holistic node (y = slope * x + intercept, in image coordinates) into an origin and a unit direction.
+
+    :param slope: (float) Slope of the line. None for vertical lines.
+    :param intercept: (float) Intercept of the line. None for vertical lines.
+    :param width: (int) Image width. If given, the line is clipped to the image, i.e., x in [0, width].
+    :param x: (float) Image column of a vertical line.
+
+    :return origin, direction, length: The line origin, its unit direction and the length of the segment (inf if not clipped).
+    """
+    if slope is None:
+        return np.array([x, 0.0]), np.array([0.0, 1.0]), np.inf
+
+    origin = np.array([0.0, intercept])
+    norm = np.hypot(1.0, slope)
+    direction = np.array([1.0, slope]) / norm
+    length = width * norm if width is not None else np.inf
+    return origin, direction, length
+
+
+def pointingRay(x1, y1, x2, y2):
+    # Ray starting at (x2, y2) (e.g., the wrist) pointing away from (x1, y1) (e.g., the elbow)
+    direction = np.array([x2 - x1, y2 - y1], dtype=np.float64)
+    norm = np.linalg.norm(direction)
+    if norm == 0:
+        return None, None
+    return np.array([x2, y2], dtype=np.float64), direction / norm
+
+
+def resolvePointingTarget(boxes, origin, direction, tMin = -np.inf, tMax = np.inf):
+    """
+    It ranks all the boxes at once against a pointing line, segment or ray (origin + t * direction, with t in [tMin, tMax]).
+    Boxes crossed by the line come first, then the remaining ones. Within each group, boxes closer to the line come first.
+
+    :param boxes: (np.array) Nx4 array with (x_min, y_min, x_max, y_max) per box.
+    :param origin: (np.array) Point of the line.
+    :param direction: (np.array) Unit direction of the line.
+    :param tMin, tMax: (float) Limits of the line parameter. Use tMin = 0 for a ray.
+
+    :return order, scores, intersects, distances: Box indices sorted by score, and the score, intersection flag and distance of each box (indexed by box).
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    if boxes.shape[0] == 0:
+        empty = np.zeros(0)
+        return np.zeros(0, dtype=int), empty, np.zeros(0, dtype=bool), empty
+
+    ox, oy = origin
+    dx, dy = direction
+
+    # Slab test, one axis at a time. A line parallel to an axis only crosses the slab when its origin is inside it
+    enter = np.full(boxes.shape[0], tMin)
+    leave = np.full(boxes.shape[0], tMax)
+    for o, d, lo, hi in ((ox, dx, boxes[:, 0], boxes[:, 2]), (oy, dy, boxes[:, 1], boxes[:, 3])):
+        if d != 0:
+            t1 = (lo - o) / d
+            t2 = (hi - o) / d
+            enter = np.maximum(enter, np.minimum(t1, t2))
+            leave = np.minimum(leave, np.maximum(t1, t2))
+        else:
+            outside = (o < lo) | (o > hi)
+            leave = np.where(outside, -np.inf, leave)
+    intersects = enter <= leave
+
+    # Distance between the box centers and the closest point of the line (clamped to the segment/ray)
+    cx = (boxes[:, 0] + boxes[:, 2]) / 2
+    cy = (boxes[:, 1] + boxes[:, 3]) / 2
+    t = np.clip((cx - ox) * dx + (cy - oy) * dy, tMin, tMax)
+    distances = np.hypot(cx - (ox + t * dx), cy - (oy + t * dy))
+
+    # Crossed boxes always score above 1, the others below 1
+    halfDiagonal = np.maximum(np.hypot(boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1]) / 2, 1.0)
+    scores = intersects + 1.0 / (1.0 + distances / halfDiagonal)
+
+    order = np.argsort(-scores, kind='stable')
+    return order, scores, intersects, distances
@@ -0,0 +1,54 @@
+import cProfile
+import io
+import os
+import pstats
+import time
+
+
+class loopProfiler():
+    '''
+    description: deterministic profile (cProfile) of a node loop, started and stopped at runtime. The profile only
+                 covers the thread calling start(), and nothing is installed while profiling is off
+    '''
+    def __init__(self, directory, name, top = 25):
+        self.directory = directory
+        self.name = name
+        self.top = top
+        self.profile = None
+        self.startTime = None
+
+
+    def isRunning(self):
+        return self.profile is not None
+
+
+    def start(self):
+        if self.profile is not None:
+            return False
+
+        self.profile = cProfile.Profile()
+        self.startTime = time.time()
+        self.profile.enable()
+        return True
+
+
+    def stop(self):
+        """
+        It stops profiling and saves the profile (pstats format, e.g. for snakeviz) with a timestamped name.
+
+        :return fileName, summary: (string) Path of the profile and the top functions by cumulative time, or None, None if profiling was off.
+        """
+        if self.profile is None:
+            return None, None
+
+        self.profile.disable()
+        profile, self.profile = self.profile, None
+
+        os.makedirs(self.directory, exist_ok=True)
+        fileName = os.path.join(self.directory, "%s_%s.prof" % (self.name, time.strftime("%Y%m%d-%H%M%S", time.localtime(self.startTime))))
+        profile.dump_stats(fileName)
+
+        summary = io.StringIO()
+        stats = pstats.Stats(profile, stream=summary)
+        stats.strip_dirs().sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top)
+        return fileName, "Profile of %.1f s\n" % (time.time() - self.startTime) + summary.getvalue()
@@ -3,7 +3,7 @@
 import cv2
 import rospy
 import face_recognition
-from cv_bridge import CvBridge, CvBridgeError
+from imageConversionModule import imageDecoder
 from sensor_msgs.msg import Image
 import rospkg
 
@@ -14,18 +14,21 @@ import rospkg
 # path_to_package = rospack.get_path("perception_tests")
 # print(path_to_package)
 
-bridge = CvBridge()
+# Frames are only displayed, so they are decoded into a reused buffer (or viewed, for bgr8 images)
+decoder = imageDecoder()
 
 class imageSubscriber(object):
-    def __init__(self, topic_name):
+    def __init__(self, topic_name, scale = 1):
+        # Downscale factor (1, 2, 4 or 8) of the displayed image
+        decoder.scale = scale
         self.sub = rospy.Subscriber(topic_name, Image, self.imgCallback)
 
 
     def imgCallback(self, topic_data):
-        # try:
-        cv_img = bridge.imgmsg_to_cv2(topic_data)
-        # except CvBridgeError:
-        #     rospy.logerr("CvBridge Error")
+        cv_img = decoder.decode(topic_data)
+        if cv_img is None:
+            rospy.logerr("Unsupported encoding: " + topic_data.encoding)
+            return
 
         # self.show_image(cv_img)
         cv2.imshow("Image Window", cv_img)
@@ -42,6 +45,6 @@ if __name__ == '__main__':
     rospy.init_node('read_image')
     # Initialize an OpenCV Window named "Image Window"
     cv2.namedWindow("Image Window", 1)
-    imgSubscriber = imageSubscriber("/camera/color/image_raw")
+    imgSubscriber = imageSubscriber("/camera/color/image_raw", rospy.get_param("~scale", 1))
     rospy.spin()
     cv2.destroyAllWindows()
\ No newline at end of file
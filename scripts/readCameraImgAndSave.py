@@ -1,59 +1,131 @@
 #!/usr/bin/env python3
 
+import os
+import threading
+import time
 import cv2
 import rospy
-import face_recognition
-from cv_bridge import CvBridge, CvBridgeError
+from imageConversionModule import imageDecoder
+from captureModule import frameWriter
 from sensor_msgs.msg import Image, CompressedImage
 import rospkg
-import time
-bridge = CvBridge()
 
 class imageSubscriber(object):
+    '''
+    description: saves the frames of a camera topic as a dataset (e.g., for benchmarkPipeline.py). The frames are sampled
+                 in the subscriber callback, by wall-clock period and/or every N frames, and only the sampled frames are
+                 decoded. Encoding and writing run in the background threads of a frameWriter
+    '''
     def __init__(self):
         node_name = "read_save_img"
         rospy.init_node(node_name, anonymous=False)
         rospy.loginfo("%s node created" % node_name)
-        
-        self.img = None
-        self.readImgCompressed = False
-        self.lastClockReading = None
-        self.imgCounter = 0
-        self.savingPeriod = 2
-        self.saveDir = "/home/rodrigo/ros_ws/src/perception_tests/images/dataset/"
 
-        self.topic_name = "/camera/color/image_raw"
+        self.topic_name = rospy.get_param("~camera_topic", "/camera/color/image_raw")
+        self.readImgCompressed = rospy.get_param("~img_compressed", False)
+        self.saveDir = rospy.get_param("~path", os.path.join(rospkg.RosPack().get_path("perception_tests"), "images", "dataset"))
+        # Frames saved per second (wall clock). 0 saves every sampled frame
+        self.rate = rospy.get_param("~rate", 0.5)
+        # Only one frame out of every_n is considered
+        self.everyN = max(1, rospy.get_param("~every_n", 1))
+        self.imageFormat = rospy.get_param("~format", "jpg")
+        self.visualization = rospy.get_param("~visualization", True)
 
-        self.bridge = CvBridge()
+        self.writer = frameWriter(self.saveDir,
+                                  self.imageFormat,
+                                  quality=rospy.get_param("~quality", 95 if self.imageFormat != "png" else 3),
+                                  workers=rospy.get_param("~workers", 2),
+                                  queueSize=rospy.get_param("~queue_size", 32),
+                                  shardSize=rospy.get_param("~shard_size", 0))
+
+        self.lock = threading.Lock()
+        self.img = None
+        self.frameCounter = 0
+        self.lastSaveTime = None
 
-        self.sub = rospy.Subscriber(self.topic_name, Image, self.imgCallback)
+        # Frames are decoded in the subscriber thread and kept by the writer queue, so they can not share a buffer
+        self.decoder = imageDecoder(reuseBuffer=False)
+
+        msgType = CompressedImage if self.readImgCompressed else Image
+        self.sub = rospy.Subscriber(self.topic_name, msgType, self.imgCallback, queue_size=1, buff_size=2**24)
+        rospy.loginfo("Saving %s frames of %s in %s" % (self.imageFormat, self.topic_name, self.saveDir))
 
 
     def imgCallback(self, data):
-        try:
-            if self.readImgCompressed:
-                self.img = self.bridge.compressed_imgmsg_to_cv2(data, "bgr8")
-            else:
-                self.img = self.bridge.imgmsg_to_cv2(data, "bgr8")
-        except CvBridgeError as e:
-            print(e)
+        save = self.__sample()
+        if not save and not self.visualization:
+            return
+
+        stamp = time.time() if data.header.stamp.is_zero() else data.header.stamp.to_sec()
+        img = None
+        if save and self.readImgCompressed and self.__sameFormat(data.format):
+            # Already encoded in the capture format, saved as is
+            self.writer.submitEncoded(bytes(data.data), stamp)
+            save = False
+
+        if save or self.visualization:
+            img = self.decoder.decode(data)
+            if img is None:
+                rospy.logerr("Unsupported encoding: " + (data.format if self.readImgCompressed else data.encoding))
+                return
+
+        if save:
+            self.writer.submit(img, stamp)
+        if self.visualization:
+            with self.lock:
+                self.img = img
 
 
     def run(self):
-         while not rospy.is_shutdown():
-            if self.img is not None:
-                cv2.imshow("RealSense", self.img)
+        # Frames are shown from the main thread, at most at display rate
+        rate = rospy.Rate(15)
+        lastDropped = 0
+        while not rospy.is_shutdown():
+            with self.lock:
+                img, self.img = self.img, None
+            if img is not None:
+                cv2.imshow("RealSense", img)
                 cv2.waitKey(1)
-                currentClockReading = time.process_time()
-                if self.lastClockReading == None or currentClockReading - self.lastClockReading > self.savingPeriod:
-                    rospy.logwarn("SAVING IMG!")
-                    cv2.imwrite(self.saveDir + "img_" + str(self.imgCounter) + ".png", self.img)
-                    self.imgCounter += 1
-                    self.lastClockReading = currentClockReading
+
+            if self.writer.dropped > lastDropped:
+                rospy.logwarn_throttle(5, "%d frames dropped, the writers can not keep up (see ~workers, ~queue_size and ~format)" % self.writer.dropped)
+                lastDropped = self.writer.dropped
+            try:
+                rate.sleep()
+            except rospy.ROSInterruptException:
+                break
+
+        self.sub.unregister()
+        self.writer.close()
+        rospy.loginfo("%d frames saved in %s, %d dropped" % (self.writer.written, self.saveDir, self.writer.dropped))
+        if self.visualization:
+            cv2.destroyAllWindows()
+
+
+    def __sample(self):
+        self.frameCounter += 1
+        if (self.frameCounter - 1) % self.everyN != 0:
+            return False
+        if self.rate <= 0:
+            return True
+
+        now = time.monotonic()
+        if self.lastSaveTime is not None and now - self.lastSaveTime < 1.0 / self.rate:
+            return False
+        self.lastSaveTime = now
+        return True
+
+
+    def __sameFormat(self, msgFormat):
+        msgFormat = msgFormat.lower()
+        if self.imageFormat == "jpg":
+            return "jpeg" in msgFormat or "jpg" in msgFormat
+        return self.imageFormat in msgFormat and "compresseddepth" not in msgFormat
+
 
 def main():
     c = imageSubscriber()
     c.run()
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
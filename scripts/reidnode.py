@@ -5,16 +5,24 @@ import rospkg
 import cv2
 import numpy as np
 import os
+from collections import deque
 
-from std_msgs.msg import String
+from std_msgs.msg import String, Bool
 from sensor_msgs.msg import Image, CompressedImage
-from perception_tests.msg import ReidInfo, ReidInfoArray
-from cv_bridge import CvBridge, CvBridgeError
-from PIL import Image as imgPil
+from perception_tests.msg import ReidInfo, ReidInfoArray, ReidAlias, ReidAliasArray
+from perception_tests.srv import TriggerProcessing, TriggerProcessingResponse
+from imageConversionModule import imageDecoder
 from facerecModule import *
-from holisticDetectorModule import *
-from PIL import ImageDraw
-from scipy.spatial import ConvexHull
+from eventChannelModule import ackFor
+from faceTrackerModule import *
+from enrollmentModule import *
+from galleryModule import *
+from modelLoaderModule import modelLoader
+from nodeStatusModule import nodeStatus
+from triggerModule import processingTrigger
+from profilingModule import loopProfiler
+from csvModule import columnarLogger
+from motionGateModule import motionGate
 
 
 
@@ -38,18 +46,21 @@ class Reid:
         self.img = None
         self.personCounter = 0
         self.ctr = True
-        self.detector = holisticDetector()
         self.cropOffset = 50
         self.currentEvent = "e_stop"
+        self.events = deque()
         self.takePhoto = False
         self.runAutomatic = False
-        self.bridge = CvBridge()
+        # Frames are decoded by the run loop into a reused buffer, so the frames that are never processed are never decoded.
+        # The frame is drawn on, hence writable
+        self.decoder = imageDecoder(writable=True)
+        self.imgMsg = None
+        # Header of the decoded image
+        self.imgHeader = None
         
 
-        # Create arrays of known face encodings and their names
-        self.known_face_encodings = []
-        self.known_face_names = []
-        self.detection_record = []
+        # Known face encodings grouped by identity, together with the detection record
+        self.gallery = faceGallery()
 
         # Model Params
         self.faceProto = self.models_directory + "opencv_face_detector.pbtxt"
@@ -61,9 +72,10 @@ class Reid:
         self.genderProto = self.models_directory + "gender_deploy.prototxt"
         self.genderModel = self.models_directory + "gender_net.caffemodel"
 
-        self.faceNet = cv2.dnn.readNet(self.faceModel, self.faceProto)
-        self.ageNet = cv2.dnn.readNet(self.ageModel, self.ageProto)
-        self.genderNet = cv2.dnn.readNet(self.genderModel, self.genderProto)
+        # Loaded in the background (see loadModels)
+        self.faceNet = None
+        self.ageNet = None
+        self.genderNet = None
 
         self.ageList = ['(0-2)', '(4-6)', '(8-12)', '(15-20)', '(25-32)', '(38-43)', '(48-53)', '(60-100)']
         self.genderList = ['Male', 'Female']
@@ -77,24 +89,90 @@ class Reid:
         self.readImgCompressed = rospy.get_param("~img_compressed")
         self.draw = rospy.get_param("~visualization")
         self.extractFaceBoundaryOnly = rospy.get_param("~extract_face_boundary_only")
+        self.useTracker = rospy.get_param("~use_tracker")
+        self.trackReencodePeriod = rospy.get_param("~track_reencode_period")
+        self.compactionPeriod = rospy.get_param("~compaction_period")
+        self.gallery.mergeDistance = rospy.get_param("~compaction_distance")
+        self.gallery.maxEmbeddingsPerIdentity = rospy.get_param("~max_embeddings_per_identity")
+        self.gallery.maxIdentities = rospy.get_param("~max_identities")
+        self.gallery.maxImageBytes = int(rospy.get_param("~max_images_size_mb") * 1e6)
+        self.logPath = rospy.get_param("~log_path")
+        self.useMotionGate = rospy.get_param("~motion_gate")
+
+        # Track faces across frames so encodings are not recomputed every frame
+        self.tracker = faceTracker(reencodePeriod=self.trackReencodePeriod)
+
+        # Photos of enrolled persons are processed and saved in the background
+        self.enrollment = enrollmentWorker(onDone=self.enrollmentDone)
+
+        # Publish the node state and frame rates on ~status
+        self.status = nodeStatus()
 
         # Subscribe to Camera Topic
-        if self.readImgCompressed:
-            self.image_sub = rospy.Subscriber(self.camera_topic, CompressedImage, self.imgCallback)
-        else:
-            self.image_sub = rospy.Subscriber(self.camera_topic, Image, self.imgCallback)
+        self.image_sub = None
+        self.subscribeCamera()
 
         # Subscribe to Event and perform accordingly (start, stop, restart, automatic or non-automatic modes, take photo)
         self.event_sub = rospy.Subscriber("~event_in", String, self.eventCallback)
 
+        # Acknowledge the handled events
+        self.eventOut_pub = rospy.Publisher("~event_out", String, queue_size=10)
+
+        # Subscribe to Ids that must never be evicted (e.g., guests saved in the semantic map)
+        self.pin_sub = rospy.Subscriber("~pin_identity", String, self.pinCallback)
+
         # Publish Detected Faces
         self.reid_pub = rospy.Publisher("~current_detection", ReidInfoArray, queue_size=10)
 
         # Publish Record of Detected Faces
         self.reidRecord_pub = rospy.Publisher("~detection_record", ReidInfoArray, queue_size=10)
 
+        # Publish Ids of merged identities and the id they were merged into
+        self.reidAliases_pub = rospy.Publisher("~identity_aliases", ReidAliasArray, queue_size=1, latch=True)
+
+        # Publish whether the models are loaded (latched)
+        self.ready_pub = rospy.Publisher("~ready", Bool, queue_size=1, latch=True)
+        self.ready_pub.publish(False)
+
+        # On demand mode: the frames are only processed when requested through ~trigger
+        self.trigger = processingTrigger()
+        self.trigger_srv = rospy.Service("~trigger", TriggerProcessing, self.triggerCallback)
+
+        # Profile of the run loop between e_profile_start and e_profile_stop, saved in ~/.ros/profiles
+        self.profiler = loopProfiler(os.path.join(rospkg.get_ros_home(), "profiles"), node_name)
+
+        # Detections of every processed frame, one row per face, saved in the background (disabled if ~log_path is empty)
+        self.logger = None
+        if self.logPath != "":
+            self.logger = columnarLogger(self.logPath)
+            self.logger.addStream("reid", [("id", "U32", ()),
+                                           ("gender", "U16", ()),
+                                           ("age_range", "U16", ()),
+                                           ("box", "int32", (4,))])
+
+        # Frames without relevant change since the last processed frame reuse its results (disabled if ~motion_gate is false)
+        self.gate = None
+        if self.useMotionGate:
+            self.gate = motionGate(rospy.get_param("~motion_threshold"), rospy.get_param("~motion_region_threshold"), maxInterval=rospy.get_param("~motion_max_interval"))
+        # Detections of the last processed frame, published again for the reused frames
+        self.lastDetections = None
+
+        # Merge duplicated identities in the background
+        if self.compactionPeriod > 0:
+            self.compaction_timer = rospy.Timer(rospy.Duration(self.compactionPeriod), self.compactionCallback)
+
+        # The networks are read and warmed up in the background, events are handled in the meantime
+        self.models = modelLoader(self.loadModels, onDone=self.modelsLoaded)
+
     def run(self):
         while not rospy.is_shutdown():
+            # Events are handled one per cycle, in the order they were received, and acknowledged on ~event_out
+            ack = None
+            self.status.eventsPending = len(self.events)
+            if self.currentEvent is None and len(self.events) > 0:
+                self.currentEvent = self.events.popleft()
+                ack = ackFor(self.currentEvent)
+
             if self.currentEvent is not None:
                 if self.currentEvent == "e_take_photo":
                     self.takePhoto = True
@@ -111,60 +189,134 @@ class Reid:
                     self.currentEvent = None
                     rospy.loginfo("Disabling automatic mode!")
 
+                if self.currentEvent == "e_on_demand":
+                    self.trigger.onDemand = True
+                    self.currentEvent = None
+                    rospy.loginfo("Processing frames on demand!")
+
+                if self.currentEvent == "e_continuous":
+                    self.trigger.onDemand = False
+                    self.currentEvent = None
+                    rospy.loginfo("Processing frames continuously!")
+
+                if self.currentEvent == "e_profile_start":
+                    self.currentEvent = None
+                    if self.profiler.start():
+                        rospy.loginfo("Profiling started!")
+                    else:
+                        rospy.logwarn("Profiling is already running!")
+
+                if self.currentEvent == "e_profile_stop":
+                    self.currentEvent = None
+                    self.stopProfiling()
+
                 if self.currentEvent == "e_stop":
                     self.currentEvent = None
                     self.img = None
-                    self.image_sub.unregister()
+                    self.imgMsg = None
+                    self.unsubscribeCamera()
                     cv2.destroyAllWindows()
                     rospy.loginfo("Stopping detection!")
 
                 if self.currentEvent == "e_start":
                     self.currentEvent = None
-                    if self.readImgCompressed:
-                        self.image_sub = rospy.Subscriber(self.camera_topic, CompressedImage, self.imgCallback)
-                    else:
-                        self.image_sub = rospy.Subscriber(self.camera_topic, Image, self.imgCallback)
+                    self.resetGate()
+                    self.subscribeCamera()
                     rospy.loginfo("Starting detection!")
 
                 if self.currentEvent == "e_reset":
-                    self.deleteAllImgs()
+                    # Only the session state is cleared, the networks stay loaded. The photos are deleted in the background
+                    self.enrollment.clear(self.directory)
                     self.img = None
+                    self.imgMsg = None
                     self.personCounter = 0
                     self.ctr = True
-                    self.detector = holisticDetector()
                     self.cropOffset = 50
                     self.currentEvent = None
                     self.takePhoto = False
                     self.runAutomatic = False
+                    self.tracker.reset()
+                    self.resetGate()
+                    self.subscribeCamera()
 
-                    if self.readImgCompressed:
-                        self.image_sub = rospy.Subscriber(self.camera_topic, CompressedImage, self.imgCallback)
-                    else:
-                        self.image_sub = rospy.Subscriber(self.camera_topic, Image, self.imgCallback)
-
-                    # Create arrays of known face encodings and their names
-                    self.known_face_encodings = []
-                    self.known_face_names = []
-                    self.detection_record = []
+                    # Forget known face encodings and their names
+                    self.gallery.reset()
+                    self.reidAliases_pub.publish([])
                     
                     rospy.loginfo("Reseting!")
 
+                # Unknown events are dropped
+                self.currentEvent = None
+
+            if ack is not None:
+                self.eventOut_pub.publish(ack)
+
+            if not self.models.isReady():
+                # Frames are not decoded until the models are loaded, the latest one is processed then
+                self.rate.sleep()
+                continue
+
+            if self.trigger.start():
+                # Only the frames received after the request are processed
+                self.imgMsg = None
+                self.ctr = False
+
+            if not self.trigger.shouldProcess():
+                # On demand mode without pending request, the models stay loaded but no frame is processed
+                self.rate.sleep()
+                continue
+
+            if self.ctr and self.imgMsg is not None:
+                imgMsg, self.imgMsg = self.imgMsg, None
+                self.img = self.decoder.decode(imgMsg)
+                self.imgHeader = imgMsg.header
+                if self.img is None:
+                    rospy.logerr("Could not decode img from: " + self.camera_topic)
+
+            if self.img is not None and self.ctr and self.gate is not None and not self.trigger.isActive() and not self.takePhoto:
+                # The frames requested through ~trigger (or in on demand mode) and the photos are always processed
+                process = self.gate.check(self.img)
+                self.status.sceneChange = self.gate.lastChange
+                if not process:
+                    # Nothing relevant changed since the last processed frame, its detections are published again for this frame
+                    if self.lastDetections is not None:
+                        self.reid_pub.publish(self.lastDetections)
+                    detection_record = self.gallery.records()
+                    if detection_record != []:
+                        self.reidRecord_pub.publish(detection_record)
+                    self.ctr = False
+                    self.status.frameReused(self.imgHeader.stamp)
+
             if self.img is not None:
                 if self.ctr:
-                    face_locations, face_names = faceRecognition(self.img, self.known_face_encodings, self.known_face_names)
+                    known_face_encodings, known_face_names = self.gallery.getEncodings()
+                    if self.useTracker:
+                        face_locations, face_names, face_tracks = faceRecognitionTracked(self.img, self.tracker, known_face_encodings, known_face_names)
+                        face_encodings = [t.encoding for t in face_tracks]
+                    else:
+                        face_locations, face_names, face_encodings = faceRecognition(self.img, known_face_encodings, known_face_names, return_encodings=True)
+                        face_tracks = [None] * len(face_locations)
+
                     res = None
                     if face_names != []:
                         if self.extractFaceBoundaryOnly:
-                            res = self.lookIntoDetectPeopleHolistic(face_locations, face_names)
+                            res = self.lookIntoDetectPeopleHolistic(face_locations, face_names, face_encodings, face_tracks)
                         else:
-                            res = self.lookIntoDetectPeople(face_locations, face_names)
+                            res = self.lookIntoDetectPeople(face_locations, face_names, face_encodings, face_tracks)
 
                         self.reid_pub.publish(res)
+                        if self.logger is not None:
+                            self.logDetections(res)
 
-                    if self.known_face_names != []:
-                        self.reidRecord_pub.publish(self.detection_record)
+                    self.lastDetections = res
+
+                    detection_record = self.gallery.records()
+                    if detection_record != []:
+                        self.reidRecord_pub.publish(detection_record)
                     
                     self.ctr = False
+                    self.status.frameProcessed(self.imgHeader.stamp)
+                    self.trigger.frameProcessed(self.imgHeader.stamp)
                     
                 if self.draw:
                     if res is not None:
@@ -178,33 +330,118 @@ class Reid:
             
             self.rate.sleep()
 
+        if self.profiler.isRunning():
+            self.stopProfiling()
+        if self.logger is not None:
+            self.logger.close()
+        self.enrollment.stop()
         if self.draw:
             cv2.destroyAllWindows()
         rospy.loginfo('Shutting Down Reid Node')
 
 
-    def getFaceMask(self, img):
-        height, width, c = img.shape
-        mask_img = imgPil.new('L', (width, height), 0)
+    def loadModels(self):
+        faceNet = cv2.dnn.readNet(self.faceModel, self.faceProto)
+        ageNet = cv2.dnn.readNet(self.ageModel, self.ageProto)
+        genderNet = cv2.dnn.readNet(self.genderModel, self.genderProto)
+
+        # The first forward pass allocates the network buffers, so it is done here instead of on the first detected face
+        blob = cv2.dnn.blobFromImage(np.zeros((227, 227, 3), dtype=np.uint8), 1.0, (227,227), self.MODEL_MEAN_VALUES, swapRB=False)
+        for net in (ageNet, genderNet):
+            net.setInput(blob)
+            net.forward()
+        faceRecognition(np.zeros((120, 160, 3), dtype=np.uint8), [], [])
+
+        self.faceNet, self.ageNet, self.genderNet = faceNet, ageNet, genderNet
+        return faceNet, ageNet, genderNet
+
+
+    def modelsLoaded(self, models, error):
+        if error is not None:
+            rospy.logerr("Could not load the reid models: " + str(error))
+            return
+
+        rospy.loginfo("Reid models loaded!")
+        self.ready_pub.publish(True)
+        self.status.setModelsLoaded(True)
+
+
+    def stopProfiling(self):
+        fileName, summary = self.profiler.stop()
+        if fileName is None:
+            rospy.logwarn("Profiling is not running!")
+            return
+        rospy.loginfo("Profile saved to " + fileName + "\n" + summary)
+
 
-        points = np.array(self.detector.faceCoordinates)
+    def triggerCallback(self, req):
+        if self.status.state() != "running":
+            # Stopped or models not loaded, no frame would be processed
+            rospy.logwarn("Trigger request rejected, the node is " + self.status.state() + "!")
+            return TriggerProcessingResponse(success=False, stamp=rospy.Time(), frames_processed=0)
 
-        hull = ConvexHull(points)
-        polygon = []
-        for v in hull.vertices:
-            polygon.append((points[v, 0], points[v, 1]))
+        success, stamp, processed = self.trigger.request(req.frames, req.timeout)
+        return TriggerProcessingResponse(success=success, stamp=stamp, frames_processed=processed)
 
-        ImageDraw.Draw(mask_img).polygon(polygon, outline=1, fill=1)
-        mask = np.array(mask_img)
+
+    def subscribeCamera(self):
+        # Idempotent, so repeated e_start or e_reset events never duplicate the image callbacks
+        if self.image_sub is not None:
+            return
+
+        if self.readImgCompressed:
+            self.image_sub = rospy.Subscriber(self.camera_topic, CompressedImage, self.imgCallback)
+        else:
+            self.image_sub = rospy.Subscriber(self.camera_topic, Image, self.imgCallback)
+        self.status.setRunning(True)
+
+
+    def unsubscribeCamera(self):
+        if self.image_sub is not None:
+            self.image_sub.unregister()
+            self.image_sub = None
+        self.status.setRunning(False)
+        self.trigger.cancel()
+
+
+    def getGenderAndAge(self, top, bottom, left, right, track):
+        # Tracked faces keep their attributes until their encoding is recomputed
+        if track is not None and not track.updated and track.gender is not None:
+            return track.gender, track.ageRange
+
+        face = self.img[top:bottom, left:right]
+        blob = cv2.dnn.blobFromImage(face, 1.0, (227,227), self.MODEL_MEAN_VALUES, swapRB=False)
         
-        color_image = cv2.bitwise_and(img, img, mask=mask)
+        self.genderNet.setInput(blob)
+        genderPred = self.genderNet.forward()
+        gender = self.genderList[genderPred[0].argmax()]
+
+        self.ageNet.setInput(blob)
+        agePred = self.ageNet.forward()
+        age = self.ageList[agePred[0].argmax()]
+
+        if track is not None:
+            track.gender = gender
+            track.ageRange = age
 
-        return color_image
+        return gender, age
 
 
-    def lookIntoDetectPeopleHolistic(self, face_locations, face_names):
+    def resetGate(self):
+        self.lastDetections = None
+        if self.gate is not None:
+            self.gate.reset()
+
+
+    def logDetections(self, detections):
+        stamp = self.imgHeader.stamp.to_sec()
+        for d in detections:
+            self.logger.log("reid", stamp, id=d.id, gender=d.gender, age_range=d.ageRange, box=(d.top, d.right, d.bottom, d.left))
+
+
+    def lookIntoDetectPeopleHolistic(self, face_locations, face_names, face_encodings, face_tracks):
         detectionResult = []
-        for (top, right, bottom, left), name in zip(face_locations, face_names):
+        for (top, right, bottom, left), name, face_encoding, track in zip(face_locations, face_names, face_encodings, face_tracks):
             d = ReidInfo()
             
             left -= self.cropOffset
@@ -217,27 +454,26 @@ class Reid:
                 continue
             
             # Gender and Age Detection
-            face = self.img[top:bottom, left:right]
-            blob = cv2.dnn.blobFromImage(face, 1.0, (227,227), self.MODEL_MEAN_VALUES, swapRB=False)
-            
-            self.genderNet.setInput(blob)
-            genderPred = self.genderNet.forward()
-            gender = self.genderList[genderPred[0].argmax()]
-
-            self.ageNet.setInput(blob)
-            agePred = self.ageNet.forward()
-            age = self.ageList[agePred[0].argmax()]
+            gender, age = self.getGenderAndAge(top, bottom, left, right, track)
+
+            # Identities merged by the compaction are published with the id they were merged into
+            name = self.gallery.resolve(name)
+            person = self.gallery.getRecord(name)
+            if person is None:
+                # The identity was evicted from the gallery
+                name = "Unknown"
+            else:
+                self.gallery.touch(name)
+            if track is not None:
+                track.name = name
 
             d.id = name
-            if name == "Unknown":
+            if person is None:
                 d.gender = gender
                 d.ageRange = age
             else:
-                for person in self.detection_record:
-                    if person.id == name:
-                        d.gender = person.gender
-                        d.ageRange = person.ageRange
-                        break
+                d.gender = person.gender
+                d.ageRange = person.ageRange
             
             d.top = top
             d.bottom = bottom
@@ -245,31 +481,7 @@ class Reid:
             d.right = right
 
             if (name == "Unknown" and self.takePhoto) or (name == "Unknown" and self.runAutomatic):
-                # Draw Mask
-                mask = np.zeros(self.img.shape[:2], dtype="uint8")
-                cv2.rectangle(mask, (left, top), (right, bottom), 255, -1)
-                img_masked = cv2.bitwise_and(self.img, self.img, mask=mask)
-                img_masked = self.detector.find(img_masked, False, False, False, False)
-                isFaceLandmarks = self.detector.getFaceLandmarks(img_masked)
-
-                if isFaceLandmarks:
-                    img_masked = self.getFaceMask(img_masked)
-                    # Save Img and Add to Enconder
-                    imageRGB = cv2.cvtColor(img_masked, cv2.COLOR_BGR2RGB)
-                    # Save new image of Person (not required)
-                    im = imgPil.fromarray(imageRGB)
-                    im_name = self.directory + "h" + str(self.personCounter) + ".png"
-                    im.save(im_name)
-                    # Load new Person to enconder
-                    faceEnconder = face_recognition.face_encodings(imageRGB)
-                    if len(faceEnconder) > 0:
-                        self.known_face_encodings.append(faceEnconder[0])
-                        d.id = "H" + str(self.personCounter)
-                        self.known_face_names.append(d.id)
-                        self.detection_record.append(d)
-                        self.personCounter += 1
-                        self.takePhoto = False
-                        rospy.loginfo("Photo saved and added to enconder!")
+                self.enrollPerson(d, face_encoding, self.img[top:bottom, left:right], track)
            
             
             detectionResult.append(d)
@@ -277,9 +489,9 @@ class Reid:
         return detectionResult
 
 
-    def lookIntoDetectPeople(self, face_locations, face_names):
+    def lookIntoDetectPeople(self, face_locations, face_names, face_encodings, face_tracks):
         detectionResult = []
-        for (top, right, bottom, left), name in zip(face_locations, face_names):
+        for (top, right, bottom, left), name, face_encoding, track in zip(face_locations, face_names, face_encodings, face_tracks):
             d = ReidInfo()
 
             if top < 0 or bottom > self.img.shape[0] or left < 0 or right > self.img.shape[1]:
@@ -287,27 +499,26 @@ class Reid:
                 continue
             
             # Gender and Age Detection
-            face = self.img[top:bottom, left:right]
-            blob = cv2.dnn.blobFromImage(face, 1.0, (227,227), self.MODEL_MEAN_VALUES, swapRB=False)
-            
-            self.genderNet.setInput(blob)
-            genderPred = self.genderNet.forward()
-            gender = self.genderList[genderPred[0].argmax()]
-
-            self.ageNet.setInput(blob)
-            agePred = self.ageNet.forward()
-            age = self.ageList[agePred[0].argmax()]
+            gender, age = self.getGenderAndAge(top, bottom, left, right, track)
+
+            # Identities merged by the compaction are published with the id they were merged into
+            name = self.gallery.resolve(name)
+            person = self.gallery.getRecord(name)
+            if person is None:
+                # The identity was evicted from the gallery
+                name = "Unknown"
+            else:
+                self.gallery.touch(name)
+            if track is not None:
+                track.name = name
 
             d.id = name
-            if name == "Unknown":
+            if person is None:
                 d.gender = gender
                 d.ageRange = age
             else:
-                for person in self.detection_record:
-                    if person.id == name:
-                        d.gender = person.gender
-                        d.ageRange = person.ageRange
-                        break
+                d.gender = person.gender
+                d.ageRange = person.ageRange
             
             d.top = top
             d.bottom = bottom
@@ -315,27 +526,7 @@ class Reid:
             d.right = right
 
             if (name == "Unknown" and self.takePhoto) or (name == "Unknown" and self.runAutomatic):
-                # Draw Mask
-                mask = np.zeros(self.img.shape[:2], dtype="uint8")
-                cv2.rectangle(mask, (left, top), (right, bottom), 255, -1)
-                # cv2.imshow("Rectangular Mask", mask)
-                img_masked = cv2.bitwise_and(self.img, self.img, mask=mask)
-                # Save Img and Add to Enconder
-                imageRGB = cv2.cvtColor(img_masked, cv2.COLOR_BGR2RGB)
-                # Save new image of Person (not required)
-                im = imgPil.fromarray(imageRGB)
-                im_name = self.directory + "h" + str(self.personCounter) + ".png"
-                im.save(im_name)
-                # Load new Person to enconder
-                faceEnconder = face_recognition.face_encodings(imageRGB)
-                if len(faceEnconder) > 0:
-                    self.known_face_encodings.append(faceEnconder[0])
-                    d.id = "H" + str(self.personCounter)
-                    self.known_face_names.append(d.id)
-                    self.detection_record.append(d)
-                    self.personCounter += 1
-                    self.takePhoto = False
-                    rospy.loginfo("Photo saved and added to enconder!")
+                self.enrollPerson(d, face_encoding, self.img[top:bottom, left:right], track)
             
             
             detectionResult.append(d)
@@ -344,28 +535,97 @@ class Reid:
 
 
 
+    def enrollPerson(self, d, face_encoding, face, track):
+        # The encoding computed by the recognition step is reused, so the face is not detected again
+        if face_encoding is None:
+            return
+
+        d.id = "H" + str(self.personCounter)
+        im_name = self.directory + "h" + str(self.personCounter) + ".png"
+
+        # Load new Person to enconder
+        self.gallery.add(d.id, face_encoding, d, im_name)
+        self.enforceGalleryLimits()
+        if track is not None:
+            track.name = d.id
+        self.personCounter += 1
+        self.takePhoto = False
+        rospy.loginfo("Person " + d.id + " added to enconder!")
+
+        # Save new image of Person (not required)
+        if not self.enrollment.submit(d.id, face, im_name, self.extractFaceBoundaryOnly):
+            rospy.logwarn("Enrollment queue is full, the photo of " + d.id + " will not be saved!")
+
+
+    def compactionCallback(self, event):
+        merges = self.gallery.compact()
+        if merges == []:
+            return
+
+        for mergedId, survivorId in merges:
+            rospy.loginfo("Merged duplicated identity " + mergedId + " into " + survivorId)
+
+        self.publishAliases()
+
+
+    def publishAliases(self):
+        aliases = []
+        for alias, personId in self.gallery.getAliases().items():
+            a = ReidAlias()
+            a.alias = alias
+            a.id = personId
+            aliases.append(a)
+        self.reidAliases_pub.publish(aliases)
+
+
+    def enrollmentDone(self, personId, fileName, faceBoundaryFound):
+        if self.gallery.getRecord(personId) is None:
+            # The identity was evicted while its photo was queued, the file is not tracked by the gallery anymore
+            try:
+                if os.path.isfile(fileName):
+                    os.remove(fileName)
+            except OSError as e:
+                rospy.logerr("Could not delete " + fileName + ": " + str(e))
+            return
+
+        if self.extractFaceBoundaryOnly and not faceBoundaryFound:
+            rospy.logwarn("Could not extract the face boundary of " + personId + ", saved the rectangular photo instead")
+        rospy.loginfo("Photo of " + personId + " saved to " + fileName)
+        self.enforceGalleryLimits()
+
+
+    def enforceGalleryLimits(self):
+        stats = self.gallery.stats()
+        evicted = self.gallery.enforceLimits()
+        newStats = self.gallery.stats()
+
+        for personId in evicted:
+            rospy.loginfo("Evicted identity " + personId + " (least recently seen)")
+        if evicted != []:
+            self.publishAliases()
+
+        if evicted != [] or newStats['evicted_images'] != stats['evicted_images']:
+            rospy.loginfo("Gallery: %d identities (%d pinned), %d embeddings. Evicted so far: %d identities, %d images (%.1f MB)" % (
+                newStats['identities'], newStats['pinned'], newStats['embeddings'],
+                newStats['evicted_identities'], newStats['evicted_images'], newStats['evicted_bytes'] / 1e6))
+
+
+    def pinCallback(self, data):
+        if self.gallery.pin(data.data):
+            rospy.loginfo("Identity " + data.data + " pinned, it will not be evicted")
+        else:
+            rospy.logwarn("Could not pin unknown identity " + data.data)
+
+
     def imgCallback(self, data):
-        try:
-            if self.readImgCompressed:
-                self.img = self.bridge.compressed_imgmsg_to_cv2(data, "bgr8")
-            else:
-                self.img = self.bridge.imgmsg_to_cv2(data, "bgr8")
-                
-            self.ctr = True
-        except CvBridgeError as e:
-            print(e)
+        self.status.frameReceived(dropped=self.imgMsg is not None)
+        self.imgMsg = data
+        self.ctr = True
 
 
     def eventCallback(self, data):
         # rospy.loginfo("Got new event: " + str(data.data))
-        self.currentEvent = data.data
-
-
-    def deleteAllImgs(self):
-        for file_name in os.listdir(self.directory):
-            file = self.directory + file_name
-            if os.path.isfile(file):
-                os.remove(file)
+        self.events.append(data.data)
 
 
 
@@ -2,11 +2,152 @@ import cv2
 import numpy as np
 
 
-# Initialize SIFT
-sift = cv2.SIFT_create()
-
-# Feature Matching
-bf = cv2.BFMatcher(cv2.NORM_L2, crossCheck = True)
+# FLANN index parameters: KD-trees for float descriptors (SIFT), LSH for binary descriptors (ORB, AKAZE)
+FLANN_INDEX_KDTREE = 1
+FLANN_INDEX_LSH = 6
+
+
+def createDetector(name, maxFeatures = 0):
+    if name == "sift":
+        return cv2.SIFT_create(nfeatures=maxFeatures)
+    if name == "orb":
+        return cv2.ORB_create(nfeatures=maxFeatures if maxFeatures > 0 else 500)
+    if name == "akaze":
+        # Moved to the contrib modules in OpenCV 5
+        create = getattr(cv2, "AKAZE_create", None) or getattr(getattr(cv2, "xfeatures2d", None), "AKAZE_create", None)
+        if create is None:
+            raise ValueError("AKAZE is not available in this OpenCV build")
+        return create()
+    raise ValueError("Unknown detector: " + str(name))
+
+
+def toGray(image):
+    if image.ndim == 2:
+        return image
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY if image.shape[2] == 3 else cv2.COLOR_BGRA2GRAY)
+
+
+class featureMatcher():
+    '''
+    description: detects keypoints on the grayscale image and matches them with the two nearest neighbours and Lowe's
+                 ratio test (FLANN KD-trees for SIFT, FLANN LSH for the binary ORB/AKAZE descriptors, or brute force).
+                 The matches can be verified geometrically (RANSAC homography or partial affine transform)
+    '''
+    def __init__(self, detector = "sift", matcher = "flann", ratio = 0.75, verify = None, ransacThreshold = 3.0, maxFeatures = 0):
+        """
+        :param detector: (string) sift, orb or akaze.
+        :param matcher: (string) flann (KD-trees or LSH, depending on the descriptors) or bf (brute force).
+        :param ratio: (float) Maximum ratio between the distances of the best and second best neighbours.
+        :param verify: (string) None, homography or affine.
+        :param ransacThreshold: (float) Maximum reprojection error in pixels of the inliers.
+        :param maxFeatures: (int) Maximum number of keypoints per image (0 keeps the detector default).
+        """
+        self.detectorName = detector
+        self.detector = createDetector(detector, maxFeatures)
+        self.binary = detector != "sift"
+        self.ratio = ratio
+        self.verify = verify
+        self.ransacThreshold = ransacThreshold
+
+        if matcher == "flann":
+            if self.binary:
+                indexParams = dict(algorithm=FLANN_INDEX_LSH, table_number=6, key_size=12, multi_probe_level=1)
+            else:
+                indexParams = dict(algorithm=FLANN_INDEX_KDTREE, trees=5)
+            self.matcher = cv2.FlannBasedMatcher(indexParams, dict(checks=50))
+        elif matcher == "bf":
+            self.matcher = cv2.BFMatcher(cv2.NORM_HAMMING if self.binary else cv2.NORM_L2)
+        else:
+            raise ValueError("Unknown matcher: " + str(matcher))
+
+
+    def detect(self, image, mask = None):
+        """
+        :param image: (np.array) BGR or grayscale image.
+        :param mask: (np.array) Optional uint8 mask of the region where keypoints are detected.
+
+        :return keypoints, descriptors: Keypoints and their descriptors (None if no keypoint was found).
+        """
+        return self.detector.detectAndCompute(toGray(image), mask)
+
+
+    def match(self, descriptors, prev_descriptors):
+        """
+        It matches the descriptors of an image (query) with the ones of a previous image (train).
+
+        :return matches: (list) DMatch that pass the ratio test, sorted by distance.
+        """
+        if descriptors is None or prev_descriptors is None or len(descriptors) == 0 or len(prev_descriptors) < 2:
+            return []
+
+        pairs = self.matcher.knnMatch(descriptors, prev_descriptors, k=2)
+        # LSH may return less than two neighbours for some descriptors
+        matches = [p[0] for p in pairs if len(p) == 2 and p[0].distance < self.ratio * p[1].distance]
+        matches.sort(key=lambda m: m.distance)
+        return matches
+
+
+    def matchKeypoints(self, keypoints, descriptors, prev_keypoints, prev_descriptors):
+        """
+        It matches two images and, if enabled, keeps only the matches consistent with a homography or affine transform.
+
+        :return matches, model: (list) Matches (inliers when verified) and (np.array) 3x3 or 2x3 transform from the
+                                current to the previous image, or None if not verified or not enough matches.
+        """
+        matches = self.match(descriptors, prev_descriptors)
+        if self.verify is None:
+            return matches, None
+
+        minMatches = 4 if self.verify == "homography" else 3
+        if len(matches) < minMatches:
+            return [], None
+
+        pts1, pts2 = matchedPoints(matches, keypoints, prev_keypoints)
+        if self.verify == "homography":
+            model, inliers = cv2.findHomography(pts1, pts2, cv2.RANSAC, self.ransacThreshold)
+        elif self.verify == "affine":
+            model, inliers = cv2.estimateAffinePartial2D(pts1, pts2, method=cv2.RANSAC, ransacReprojThreshold=self.ransacThreshold)
+        else:
+            raise ValueError("Unknown verification: " + str(self.verify))
+
+        if model is None:
+            return [], None
+        return [m for m, keep in zip(matches, inliers.ravel()) if keep], model
+
+
+def matchedPoints(matches, keypoints, prev_keypoints):
+    # Coordinates of the matched keypoints, (N, 2) float32 arrays, without a Python loop over the coordinates
+    queryIdx = np.fromiter((m.queryIdx for m in matches), dtype=np.int32, count=len(matches))
+    trainIdx = np.fromiter((m.trainIdx for m in matches), dtype=np.int32, count=len(matches))
+    return cv2.KeyPoint_convert(keypoints)[queryIdx], cv2.KeyPoint_convert(prev_keypoints)[trainIdx]
+
+
+def keypointStats(matches, prev_keypoints, keypoints):
+    """
+    Statistics of the displacement of the matched keypoints between the previous and the current image, in O(N).
+
+    :return stats: (dict) Number of matches, mean and median displacement (px), mean displacement vector (px) and scale
+                   change (spread of the current keypoints around their centroid over the previous one).
+    """
+    if len(matches) == 0:
+        return {'matches': 0}
+
+    pts1, pts2 = matchedPoints(matches, keypoints, prev_keypoints)
+    displacement = pts1 - pts2
+    distances = np.hypot(displacement[:, 0], displacement[:, 1])
+    spread1 = np.sqrt(pts1.var(axis=0).sum())
+    spread2 = np.sqrt(pts2.var(axis=0).sum())
+    return {
+        'matches': len(matches),
+        'mean_distance': float(distances.mean()),
+        'median_distance': float(np.median(distances)),
+        'mean_displacement': displacement.mean(axis=0).tolist(),
+        'scale': float(spread1 / spread2) if spread2 > 0 else 1.0,
+    }
+
+
+# Engine used by the functions below
+defaultMatcher = featureMatcher("sift", "flann")
 
 
 def applySift(color_image, applyCrop, ux, uy, r):
@@ -14,9 +155,9 @@ def applySift(color_image, applyCrop, ux, uy, r):
         # Crop Image
         color_image = color_image[uy - r:uy + r, ux - r:ux + r, :]  
     # Convert image to grayscale for SIFT
-    gray_image = cv2.cvtColor(color_image, cv2.COLOR_BGR2RGB)
+    gray_image = toGray(color_image)
     # Extract SIFT features
-    keypoints, descriptors = sift.detectAndCompute(gray_image, None)
+    keypoints, descriptors = defaultMatcher.detect(gray_image)
     return color_image, gray_image, keypoints, descriptors
 
 
@@ -28,34 +169,19 @@ def drawKeypointsImg(gray_image, keypoints, color_image):
 
 
 def computeDistanceBetweenKeypoints(matches, prev_keypoints, keypoints):
-    # Featured matched keypoints from images 1 and 2
-    pts1 = np.float32([keypoints[m.queryIdx].pt for m in matches])
-    pts2 = np.float32([prev_keypoints[m.trainIdx].pt for m in matches])
-
-    # Convert x, y coordinates into complex numbers
-    # so that the distances are much easier to compute
-    z1 = np.array([[complex(c[0],c[1]) for c in pts1]])
-    z2 = np.array([[complex(c[0],c[1]) for c in pts2]])
-
-    # Computes the intradistances between keypoints for each image
-    KP_dist1 = abs(z1.T - z1)
-    KP_dist2 = abs(z2.T - z2)
-
     # Distance between featured matched keypoints
-    FM_dist = abs(z2 - z1)
+    stats = keypointStats(matches, prev_keypoints, keypoints)
     print("Num of Matches: ")
-    print(FM_dist.shape[1])
-    print("Avg Distance Between Features (px): ")
-    print(np.sum(FM_dist) / FM_dist.shape[1])
+    print(stats['matches'])
+    if stats['matches'] > 0:
+        print("Avg Distance Between Features (px): ")
+        print(stats['mean_distance'])
+    return stats
 
 
 def applyMatching(descriptors, prev_descriptors, keypoints, prev_keypoints):
-    # Match descriptors
-    matches = bf.match(descriptors, prev_descriptors)
-    # Sort them in the order of their distance
-    matches = sorted(matches, key = lambda x:x.distance)
-
-    return matches
+    # Match descriptors (two nearest neighbours and ratio test), sorted by distance
+    return defaultMatcher.match(descriptors, prev_descriptors)
 
 
 def siftKeypointsMatching(ux, uy, color_image, prev_descriptors, prev_keypoints, i, drawKeypoints, cropImg, radius):
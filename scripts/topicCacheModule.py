@@ -0,0 +1,248 @@
+import rospy
+import threading
+from collections import deque
+from waitModule import waitCondition
+from historyModule import stampedHistory, messageStamp
+from lazyImportModule import lazyModule
+
+# Only needed by synchronizedTopics
+message_filters = lazyModule("message_filters")
+
+
+class cachedTopic():
+    def __init__(self, topic, msgType, condition):
+        self.topic = topic
+        self.msgType = msgType
+        self.msg = None
+        self.receiptTime = None
+        # Optional stamped history of the topic (see topicCache.getHistory)
+        self.history = None
+        # Condition shared by all the topics of the cache, so several topics can be waited on at once
+        self.condition = condition
+        # Large buffer so big messages (images, masks) are not delayed by the default socket buffer
+        self.subscriber = rospy.Subscriber(topic, msgType, self.__callback, queue_size=1, buff_size=2**24)
+
+
+    def __callback(self, msg):
+        with self.condition:
+            self.msg = msg
+            self.receiptTime = rospy.get_time()
+            if self.history is not None:
+                self.history.add(messageStamp(msg, self.receiptTime), msg)
+            self.condition.notify()
+
+
+class synchronizedTopics():
+    '''
+    description: persistent time synchronizer that keeps a small buffer of matched messages indexed by their header stamp
+    '''
+    def __init__(self, topics, msgTypes, condition, slop = None, bufferSize = 10):
+        self.topics = topics
+        self.buffer = deque(maxlen=bufferSize)
+        # Condition of the topic cache, so the matched messages can be waited on together with other topics
+        self.condition = condition
+
+        self.subscribers = [message_filters.Subscriber(topic, msgType, buff_size=2**24) for topic, msgType in zip(topics, msgTypes)]
+        if slop is None:
+            self.synchronizer = message_filters.TimeSynchronizer(self.subscribers, 10)
+        else:
+            # Approximate matching for topics whose stamps are not exactly equal
+            self.synchronizer = message_filters.ApproximateTimeSynchronizer(self.subscribers, 10, slop)
+        self.synchronizer.registerCallback(self.__callback)
+
+
+    def __callback(self, *msgs):
+        with self.condition:
+            self.buffer.append((msgs[0].header.stamp, msgs))
+            self.condition.notify()
+
+
+    def waitNewer(self, stamp, timeout = 3.0):
+        """
+        It returns the latest matched messages stamped after the given time, waiting for them if needed.
+
+        :param stamp: (rospy.Time) Oldest stamp accepted.
+        :param timeout: (float) Maximum time in seconds to wait.
+
+        :return msgs: (tuple) One message per topic, or None on timeout.
+        """
+        return self.condition.waitFor(lambda: self.latest(stamp), timeout)
+
+
+    def latest(self, stamp):
+        # Latest matched messages stamped after the given time, or None. The condition must be held
+        if len(self.buffer) > 0 and self.buffer[-1][0] >= stamp:
+            return self.buffer[-1][1]
+        return None
+
+
+    def unregister(self):
+        for sub in self.subscribers:
+            sub.unregister()
+
+
+class topicCache():
+    '''
+    description: keeps one long-lived subscriber per topic with the latest message and its receipt time.
+                 Subscribers are only created the first time a topic is read
+    '''
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.condition = waitCondition()
+        self.topics = {}
+        self.synchronized = {}
+
+
+    def getSynchronized(self, topics, msgTypes, slop = None):
+        with self.lock:
+            key = (tuple(topics), slop)
+            sync = self.synchronized.get(key)
+            if sync is None:
+                sync = synchronizedTopics(topics, msgTypes, self.condition, slop)
+                self.synchronized[key] = sync
+            return sync
+
+
+    def getTopic(self, topic, msgType):
+        with self.lock:
+            cached = self.topics.get(topic)
+            if cached is None:
+                cached = cachedTopic(topic, msgType, self.condition)
+                self.topics[topic] = cached
+            elif cached.msgType is not msgType:
+                raise ValueError("Topic %s is already read as %s, not %s" % (topic, cached.msgType.__name__, msgType.__name__))
+            return cached
+
+
+    def getHistory(self, topic, msgType, size = 100):
+        """
+        It returns the stamped history of a topic, starting to record it on the first call.
+        Messages without header are stamped with their receipt time.
+
+        :param topic: (string) Topic name.
+        :param msgType: Message class of the topic.
+        :param size: (int) Maximum number of messages kept.
+
+        :return history: (stampedHistory) The history, filled by the topic subscriber.
+        """
+        cached = self.getTopic(topic, msgType)
+        with self.condition:
+            if cached.history is None:
+                cached.history = stampedHistory(size)
+                if cached.msg is not None:
+                    cached.history.add(messageStamp(cached.msg, cached.receiptTime), cached.msg)
+            return cached.history
+
+
+    def get(self, topic, msgType, max_age = None, timeout = 3.0, block = True):
+        """
+        It returns the latest message of a topic. If the cached message is older than max_age, it waits for a new one.
+
+        :param topic: (string) Topic name.
+        :param msgType: Message class of the topic.
+        :param max_age: (float) Maximum age in seconds of the returned message. If None, any cached message is returned.
+        :param timeout: (float) Maximum time in seconds to wait for a fresh message.
+        :param block: (bool) If set to false, it never waits and raises straight away when the cached message is stale.
+
+        :return msg: The latest message. It raises rospy.ROSException (same as rospy.wait_for_message) when there is no fresh message.
+        """
+        if not block:
+            timeout = 0
+        return self.gather([(topic, msgType)], max_age, timeout)[0]
+
+
+    def gather(self, requests, max_age = None, timeout = 3.0, stamp_tolerance = None, synchronized = None, newerThan = None):
+        """
+        It waits on several topics at once with a single deadline, so the worst case latency is the slowest topic instead of the sum of all of them.
+
+        :param requests: (list) (topic, msgType) pairs.
+        :param max_age: (float) Maximum age in seconds of the returned messages. If None, any cached message is returned.
+        :param timeout: (float) Maximum time in seconds to wait for all the messages.
+        :param stamp_tolerance: (float) If given, the messages are only accepted when their stamps (header stamp, or receipt time for messages without header) are within this tolerance of each other.
+        :param synchronized: (synchronizedTopics) If given, its latest matched messages stamped after newerThan are waited on too, with the same deadline.
+        :param newerThan: (rospy.Time) Oldest stamp of the matched messages.
+
+        :return msgs: (list) One message per request, preceded by the tuple of matched messages if synchronized is given. It raises rospy.ROSException when the messages are not available before the deadline.
+        """
+        cachedTopics = [self.getTopic(topic, msgType) for topic, msgType in requests]
+        stale = [c.topic for c in cachedTopics]
+
+        def ready():
+            stale[:] = [c.topic for c in cachedTopics if not self.__isFresh(c, max_age)]
+            matched = synchronized.latest(newerThan) if synchronized is not None else None
+            if synchronized is not None and matched is None:
+                stale.extend(synchronized.topics)
+            if stale != []:
+                return None
+
+            msgs = [c.msg for c in cachedTopics]
+            if synchronized is not None:
+                msgs = [matched] + msgs
+            if stamp_tolerance is None:
+                return msgs
+
+            topics = [c.topic for c in cachedTopics]
+            stamps = [self.stamp(c) for c in cachedTopics]
+            if synchronized is not None:
+                topics.insert(0, ", ".join(synchronized.topics))
+                stamps.insert(0, matched[0].header.stamp.to_sec())
+            if max(stamps) - min(stamps) <= stamp_tolerance:
+                return msgs
+            # Wait for newer messages of the topics lagging behind
+            stale[:] = [t for t, st in zip(topics, stamps) if max(stamps) - st > stamp_tolerance]
+            return None
+
+        msgs = self.condition.waitFor(ready, timeout)
+        if msgs is None:
+            raise rospy.ROSException("timeout exceeded while waiting for message on topics %s" % ", ".join(stale))
+        return msgs
+
+
+    def waitFor(self, topic, msgType, predicate, timeout = 3.0):
+        """
+        It waits until the latest message of a topic satisfies a predicate.
+
+        :param topic: (string) Topic name.
+        :param msgType: Message class of the topic.
+        :param predicate: (function) Function of the message.
+        :param timeout: (float) Maximum time in seconds to wait.
+
+        :return msg: The message, or None on timeout.
+        """
+        cached = self.getTopic(topic, msgType)
+
+        def satisfied():
+            if cached.msg is not None and predicate(cached.msg):
+                return cached.msg
+            return None
+
+        return self.condition.waitFor(satisfied, timeout)
+
+
+    def stamp(self, cached):
+        return messageStamp(cached.msg, cached.receiptTime)
+
+
+    def age(self, topic):
+        cached = self.topics.get(topic)
+        if cached is None or cached.receiptTime is None:
+            return None
+        return rospy.get_time() - cached.receiptTime
+
+
+    def close(self):
+        with self.lock:
+            for cached in self.topics.values():
+                cached.subscriber.unregister()
+            for sync in self.synchronized.values():
+                sync.unregister()
+            self.topics = {}
+            self.synchronized = {}
+
+
+    def __isFresh(self, cached, max_age):
+        if cached.msg is None:
+            return False
+        if max_age is None:
+            return True
+        return rospy.get_time() - cached.receiptTime <= max_age
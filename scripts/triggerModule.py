@@ -0,0 +1,89 @@
+import rospy
+import threading
+from waitModule import waitCondition
+
+
+class processingTrigger():
+    '''
+    description: frame budget of a node running on demand. The node keeps its models loaded but only processes frames
+                 while a request is pending. Requests come from a service thread and wait until the node run loop has
+                 processed the requested frames
+    '''
+    def __init__(self, maxTimeout = 30.0):
+        self.onDemand = False
+        # Upper bound of the waits, so a request never holds the service (and the next requests) forever
+        self.maxTimeout = maxTimeout
+        self.cancelled = False
+        self.condition = waitCondition()
+        # One request at a time
+        self.requestLock = threading.Lock()
+        # Frames of the request not yet taken by the run loop, frames still to process and frames processed
+        self.requested = 0
+        self.remaining = 0
+        self.processed = 0
+        self.stamp = rospy.Time()
+
+
+    def request(self, frames, timeout = None):
+        """
+        It asks the node to process the next frames and waits until they are processed. Called from the service thread.
+
+        :param frames: (int) Number of frames, at least 1.
+        :param timeout: (float) Maximum wait in seconds. If None (or 0), it waits until the frames are processed, at most maxTimeout.
+
+        :return success, stamp, processed: Whether all the frames were processed, the stamp of the last one and the number of frames processed.
+        """
+        frames = max(1, int(frames))
+        with self.requestLock:
+            with self.condition:
+                self.requested = frames
+                self.remaining = 0
+                self.processed = 0
+                self.cancelled = False
+
+            timeout = min(timeout, self.maxTimeout) if timeout else self.maxTimeout
+            self.condition.waitFor(lambda: self.processed >= frames or self.cancelled, timeout)
+
+            with self.condition:
+                # Frames not processed in time are cancelled
+                self.requested = 0
+                self.remaining = 0
+                return self.processed >= frames, self.stamp, self.processed
+
+
+    def cancel(self):
+        # Called when the node stops (e.g., e_stop), the pending request fails straight away
+        with self.condition:
+            if self.requested > 0 or self.remaining > 0:
+                self.cancelled = True
+                self.requested = 0
+                self.remaining = 0
+                self.condition.notify()
+
+
+    def start(self):
+        # Called by the run loop. It returns True when a new request starts in on demand mode, the frame already buffered
+        # must then be dropped. In continuous mode it is a frame received after the last processed one, so it is kept
+        with self.condition:
+            if self.requested == 0:
+                return False
+            self.remaining, self.requested = self.requested, 0
+            return self.onDemand
+
+
+    def shouldProcess(self):
+        return not self.onDemand or self.remaining > 0
+
+
+    def isActive(self):
+        # On demand mode or a request pending, the frames must not be skipped (e.g., by the motion gate)
+        return self.onDemand or self.remaining > 0
+
+
+    def frameProcessed(self, stamp):
+        with self.condition:
+            if self.remaining > 0:
+                self.remaining -= 1
+                self.processed += 1
+                self.stamp = stamp
+                self.condition.notify()
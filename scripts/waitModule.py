@@ -0,0 +1,75 @@
+import rospy
+import threading
+import time
+import weakref
+
+
+# Conditions woken up when ROS shuts down, so no wait outlives the node
+_conditions = weakref.WeakSet()
+_conditionsLock = threading.Lock()
+_shutdownHookRegistered = False
+
+
+def _wakeUpAll():
+    with _conditionsLock:
+        conditions = list(_conditions)
+    for condition in conditions:
+        condition.notify()
+
+
+class waitCondition():
+    '''
+    description: condition variable to wait for a predicate with a timeout. The waits never spin, they sleep until
+                 notify() is called, the timeout expires or ROS shuts down
+    '''
+    def __init__(self):
+        global _shutdownHookRegistered
+        # Reentrant, so waitFor can be called while already holding the condition
+        self.condition = threading.Condition(threading.RLock())
+        with _conditionsLock:
+            _conditions.add(self)
+            if not _shutdownHookRegistered:
+                rospy.on_shutdown(_wakeUpAll)
+                _shutdownHookRegistered = True
+
+
+    def __enter__(self):
+        self.condition.acquire()
+        return self
+
+
+    def __exit__(self, *args):
+        self.condition.release()
+
+
+    def notify(self):
+        with self.condition:
+            self.condition.notify_all()
+
+
+    def waitFor(self, predicate, timeout = None, poll = None):
+        """
+        It waits until the predicate returns a truthy value. The predicate is evaluated holding the condition.
+
+        :param predicate: (function) Function without arguments.
+        :param timeout: (float) Maximum time in seconds to wait. If None, it waits until ROS shuts down.
+        :param poll: (float) If given, the predicate is also evaluated every poll seconds. Only needed for states that can not call notify() when they change.
+
+        :return result: The last value returned by the predicate, falsy on timeout or shutdown.
+        """
+        # Wall clock deadline, so the wait also ends when the simulated clock is paused
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            while True:
+                result = predicate()
+                if result or rospy.is_shutdown():
+                    return result
+
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return result
+                if poll is not None:
+                    remaining = poll if remaining is None else min(remaining, poll)
+                self.condition.wait(remaining)